@@ -32,20 +32,24 @@ Contributors:
 
 """
 
-from gevent import monkey
-monkey.patch_all()
+if __name__ == "__main__":
+    from gevent import monkey
+    monkey.patch_all()
 
+import ipaddress
 import json
-import psutil
 import signal
 import sys
+import time
 
-from bson import json_util
 from datetime import datetime
 from flask import Flask, request, Response
 from threading import Thread
 
 from modules.AbstractAgent import AbstractAgent
+from modules.bci import MAGIC as BCI_MAGIC, BCIPayloadException
+from modules.bci import decode as decode_bci
+from modules.resilience import CircuitOpenException
 
 
 class agent(AbstractAgent):
@@ -70,34 +74,33 @@ class agent(AbstractAgent):
         entity_type, entity, location, zone, bch = self.process_request(
             split_topic)
 
-        if not self.hiasbch.iotjumpway_access_check(bch):
-            return
-        
-        update_response = self.hiascdi.update_online_status(
-            entity, entity_type, status)
+        with self.tracer.span("access_check"):
+            allowed = self.hiasbch.iotjumpway_access_check(bch)
 
-        if update_response == False:
-            self.helpers.logger.error(
-                entity_type + " " + entity + " status update KO")
+        if not allowed:
             return
 
+        def cdi_update(results):
+            update_response = self.hiascdi.update_online_status(
+                entity, entity_type, status)
+
+            if update_response == False:
+                self.helpers.logger.error(
+                    entity_type + " " + entity + " status update KO")
+
+            return update_response
+
         update_data = self.hiashdi.entity_status_data(
             entity, entity_type, location, zone, status)
-        
-        _id = self.hiashdi.insert_data(
-            "Statuses", update_data)
-            
-        if _id == False:
-            self.helpers.logger.error(
-                entity_type + " " + entity + " status data update KO")
-            return
-            
-        update_data["_id"] = _id
-        self.mqtt.publish(
-            "Integrity", update_data)
-        
-        self.helpers.logger.info(
-            entity_type + " " + entity + " status data update OK")
+
+        results = self.history(
+            self.stages.graph().add("cdi_update", cdi_update),
+            "Statuses", update_data,
+            entity_type + " " + entity + " status data update KO").run()
+
+        if "integrity_publish" in results:
+            self.helpers.logger.info(
+                entity_type + " " + entity + " status data update OK")
 
     def life_callback(self, topic, payload):
         """Called in the event of a life payload
@@ -108,45 +111,47 @@ class agent(AbstractAgent):
         """
 
         data, split_topic = self.parse_payload(
-            payload, topic)
+            payload, topic, "Life")
 
         entity_type, entity, location, zone, bch = self.process_request(
             split_topic)
 
-        if not self.hiasbch.iotjumpway_access_check(bch):
+        with self.tracer.span("access_check"):
+            allowed = self.hiasbch.iotjumpway_access_check(bch)
+
+        if not allowed:
             return
 
-        update_response = self.hiascdi.update_entity(
-            entity, entity_type, self.hiascdi.entity_life_data(data))
+        def cdi_update(results):
+            update_response = self.hiascdi.update_entity(
+                entity, entity_type, self.hiascdi.entity_life_data(data))
+
+            if update_response == False:
+                self.helpers.logger.error(
+                    entity_type + " " + entity + " life update KO")
+
+            return update_response
 
-        if update_response == False:
-            self.helpers.logger.error(
-                entity_type + " " + entity + " life update KO")
-            return
-        
         update_data = self.hiashdi.entity_life_data(
             entity, entity_type, location, zone, data)
-        
-        _id = self.hiashdi.insert_data(
-            "Life", update_data)
-        
-        if _id == False:
-            self.helpers.logger.error(
-                entity_type + " " + entity + " life update KO")
-            return
-
-        self.mqtt.publish("Integrity", {
-            "_id": str(_id),
-            "CPU": str(data["CPU"]),
-            "Memory": str(data["Memory"]),
-            "Diskspace": str(data["Diskspace"]),
-            "Temperature": str(data["Temperature"]),
-            "Latitude": str(data["Latitude"]),
-            "Longitude": str(data["Longitude"])
-        })
 
-        self.helpers.logger.info(
-            entity_type + " " + entity + " life update OK")
+        results = self.history(
+            self.stages.graph().add("cdi_update", cdi_update),
+            "Life", update_data,
+            entity_type + " " + entity + " life update KO",
+            integrity=lambda _id: {
+                "_id": str(_id),
+                "CPU": str(data["CPU"]),
+                "Memory": str(data["Memory"]),
+                "Diskspace": str(data["Diskspace"]),
+                "Temperature": str(data["Temperature"]),
+                "Latitude": str(data["Latitude"]),
+                "Longitude": str(data["Longitude"])
+            }).run()
+
+        if "integrity_publish" in results:
+            self.helpers.logger.info(
+                entity_type + " " + entity + " life update OK")
 
     def comands_callback(self, topic, payload):
         """
@@ -157,12 +162,15 @@ class agent(AbstractAgent):
         """
 
         data, split_topic = self.parse_payload(
-            payload, topic)
+            payload, topic, "Commands")
 
         entity_type, entity, location, zone, bch = self.process_request(
             split_topic)
 
-        if not self.hiasbch.iotjumpway_access_check(bch):
+        with self.tracer.span("access_check"):
+            allowed = self.hiasbch.iotjumpway_access_check(bch)
+
+        if not allowed:
             return
         
         if "Use" not in data:
@@ -175,8 +183,9 @@ class agent(AbstractAgent):
                 "Command not supported yet")
             return
 
-        entity_data = self.hiascdi.get_entity(
-            data["Use"], data["To"])
+        with self.tracer.span("cdi_get"):
+            entity_data = self.hiascdi.get_entity(
+                data["Use"], data["To"])
         
         if data["Property"] not in entity_data:
             self.helpers.logger.error(
@@ -196,38 +205,109 @@ class agent(AbstractAgent):
         actuator_data = self.hiascdi.entity_actuator_data(
             entity_data, data)
 
-        self.hiascdi.update_entity(
+        if self.fastlane is not None:
+            with self.tracer.span("device_publish"):
+                self.command_publish(location, data)
+            self.fastlane.submit(
+                data["To"], "Commands", self.command_persist,
+                entity, entity_type, location, zone, data, actuator_data)
+            return
+
+        def cdi_update(results):
+            self.command_update(data, actuator_data)
+            # The command is published whether or not the update succeeded
+            return True
+
+        graph = self.stages.graph()
+        graph.add("cdi_update", cdi_update)
+        graph.add("device_publish",
+                  lambda results: self.command_publish(location, data),
+                  after=("cdi_update",))
+
+        results = self.command_history(
+            graph, entity, entity_type, location, zone, data).run()
+
+        if "integrity_publish" in results:
+            self.helpers.logger.info(
+                entity_type + " " + entity + " command data update OK")
+
+    def command_update(self, data, actuator_data):
+        """Updates the commanded actuator of a device in HIASCDI
+
+        Args:
+            data (dict): The command.
+            actuator_data (dict): The actuator attribute.
+        """
+
+        return self.hiascdi.update_entity(
             data["To"], data["Use"], {
                 data["Type"]: actuator_data,
                 "dateModified": {"value": datetime.now().isoformat()}
             })
 
+    def command_publish(self, location, data):
+        """Publishes a command to its device
+
+        Args:
+            location (str): The location of the device.
+            data (dict): The command.
+        """
+
         pathto = location + "/Devices/" +  data["Zone"] \
             + "/" + data["To"] + "/Commands"
 
-        self.mqtt.publish("Custom", {
+        return self.mqtt.publish("Custom", {
             "Type": data["Type"],
             "Property": data["Property"],
             "Value": data["Value"],
             "Message": data["Message"]
         }, pathto)
 
+    def command_history(self, graph, entity, entity_type, location, zone,
+                        data):
+        """Adds the stages storing a command in HIASHDI
+
+        Args:
+            graph (:obj:`graph`): The callback's stages.
+            entity (str): The commanding entity.
+            entity_type (str): The commanding entity type.
+            location (str): The entity location.
+            zone (str): The entity zone.
+            data (dict): The command.
+        """
+
         update_data = self.hiashdi.entity_actuator_command_data(
             entity, entity_type, location, zone, data)
-        
-        _id = self.hiashdi.insert_data("Commands", update_data)
-            
-        if _id == False:
-            self.helpers.logger.error(
-                entity_type + " " + entity + " command data update KO")
-            return
-        
-        update_data["_id"] = _id
-        self.mqtt.publish("Integrity", update_data)
+
+        return self.history(
+            graph, "Commands", update_data,
+            entity_type + " " + entity + " command data update KO")
+
+    def command_persist(self, entity, entity_type, location, zone, data,
+                        actuator_data):
+        """Writes a command that was already published to its device
+
+        Takes the arguments of command_history and the actuator attribute.
+
+        Returns:
+            bool: False if the HIASCDI update or HIASHDI insert failed.
+        """
+
+        graph = self.stages.graph().add(
+            "cdi_update",
+            lambda results: self.command_update(data, actuator_data) != False)
+
+        results = self.command_history(
+            graph, entity, entity_type, location, zone, data).run()
+
+        if "integrity_publish" not in results:
+            return False
 
         self.helpers.logger.info(
             entity_type + " " + entity + " command data update OK")
 
+        return results["cdi_update"]
+
     def notifications_callback(self, topic, payload):
         """Called in the event of an notifications payload
 
@@ -236,16 +316,20 @@ class agent(AbstractAgent):
             payload (:obj:`str`): The payload.
         """
 
-        data = json.loads(payload.decode("utf-8"))
+        data = self.decode_payload(payload, topic, "Notifications")
 
         self.helpers.logger.info(
             "Received " + data["Use"]  + " notifications data payload")
 
-        attrs = self.get_attributes(
-            data["FromType"], data["From"])
+        with self.tracer.span("get_attributes"):
+            attrs = self.get_attributes(
+                data["FromType"], data["From"])
         bch = attrs["blockchain"]
 
-        if not self.hiasbch.iotjumpway_access_check(bch):
+        with self.tracer.span("access_check"):
+            allowed = self.hiasbch.iotjumpway_access_check(bch)
+
+        if not allowed:
             return
 
         entity = attrs["id"]
@@ -254,8 +338,9 @@ class agent(AbstractAgent):
         update_data = self.hiashdi.entity_notification_data(
             location, data)
 
-        _id = self.hiashdi.insert_data(
-            "Notifications", update_data)
+        with self.tracer.span("hdi_insert"):
+            _id = self.hiashdi.insert_data(
+                "Notifications", update_data)
             
         if _id == False:
             self.helpers.logger.error(
@@ -263,7 +348,8 @@ class agent(AbstractAgent):
             return
 
         update_data["_id"] = _id
-        self.mqtt.publish("Integrity", update_data)
+        with self.tracer.span("integrity_publish"):
+            self.integrity(update_data)
 
         self.helpers.logger.info(
             data["Use"] + " " + data["To"] + " notification update OK")
@@ -277,57 +363,101 @@ class agent(AbstractAgent):
         """
 
         data, split_topic = self.parse_payload(
-            payload, topic)
+            payload, topic, "Actuators")
 
         entity_type, entity, location, zone, bch = self.process_request(
             split_topic)
 
-        if not self.hiasbch.iotjumpway_access_check(bch):
+        with self.tracer.span("access_check"):
+            allowed = self.hiasbch.iotjumpway_access_check(bch)
+
+        if not allowed:
             return
 
-        entity_data = self.hiascdi.get_entity(
-            entity_type, entity)
-        
-        if data["Type"] not in entity_data:
-            self.helpers.logger.error(
-                entity_type + " " + entity + " actuators not found")
-            return 
+        if self.fastlane is not None:
+            self.fastlane.submit(
+                entity, "Actuators", self.actuator_persist,
+                entity, entity_type, location, zone, data)
+            return
 
-        actuator_data = self.hiascdi.entity_actuator_data(
-            entity_data, data)
+        self.actuator_persist(entity, entity_type, location, zone, data)
 
-        update_response = self.hiascdi.update_entity(
-            entity, entity_type, {
-                "networkStatus": {"value": "ONLINE"},
-                "networkStatus.metadata": {"timestamp":  {
-                    "value": datetime.now().isoformat()
-                }},
-                data["Type"]: actuator_data,
-                "dateModified": {"value": datetime.now().isoformat()}
-            })
+    def actuator_persist(self, entity, entity_type, location, zone, data):
+        """Writes an actuator state to HIASCDI and HIASHDI
 
-        if update_response == False:
-            self.helpers.logger.error(
-                entity_type + " " + entity + " actuators update KO")
-            return
+        Args:
+            entity (str): The entity id.
+            entity_type (str): The entity type.
+            location (str): The entity location.
+            zone (str): The entity zone.
+            data (dict): The actuator state.
+
+        Returns:
+            bool: False if a write failed.
+        """
+
+        name = (data["Type"], data["Property"])
+
+        def cdi_get(results):
+            cached = self.hiascdi.metadata_cached(entity_type, entity, name)
+            if cached is not None:
+                return self.hiascdi.entity_value_data(cached, "Processing")
+
+            entity_data = self.hiascdi.get_entity(
+                entity_type, entity)
+
+            if data["Type"] not in entity_data:
+                self.helpers.logger.error(
+                    entity_type + " " + entity + " actuators not found")
+                return False
+
+            actuator_data = self.hiascdi.entity_actuator_data(
+                entity_data, data)
+
+            if not self.hiascdi.metadata_changed(
+                    entity_type, entity, name, actuator_data):
+                actuator_data = self.hiascdi.entity_value_data(
+                    actuator_data, actuator_data["value"])
+
+            return actuator_data
+
+        def cdi_update(results):
+            update_response = self.hiascdi.update_entity(
+                entity, entity_type, {
+                    "networkStatus": {"value": "ONLINE"},
+                    "networkStatus.metadata": {"timestamp":  {
+                        "value": datetime.now().isoformat()
+                    }},
+                    data["Type"]: results["cdi_get"],
+                    "dateModified": {"value": datetime.now().isoformat()}
+                })
+
+            if update_response == False:
+                self.helpers.logger.error(
+                    entity_type + " " + entity + " actuators update KO")
+
+            return update_response
 
         update_data = self.hiashdi.entity_actuator_data(
             entity, entity_type, location, zone, data)
-        
-        _id = self.hiashdi.insert_data("Actuators", update_data)
-            
-        if _id == False:
-            self.helpers.logger.error(
-                entity_type + " " + entity + " actuators update KO")
-            return
 
-        update_data["_id"] = _id
-        self.mqtt.publish(
-            "Integrity", update_data)
-        
+        graph = self.stages.graph()
+        graph.add("cdi_get", cdi_get)
+        graph.add("cdi_update", cdi_update, after=("cdi_get",))
+
+        results = self.history(
+            graph, "Actuators", update_data,
+            entity_type + " " + entity + " actuators update KO",
+            after=("cdi_get",)).run()
+
+        if "integrity_publish" not in results:
+            return False
+
         self.helpers.logger.info(
             entity_type + " " + entity + " actuators update OK")
 
+        return results["cdi_update"] != False
+
     def sensors_callback(self, topic, payload):
         """Called in the event of a sensor payload
 
@@ -337,56 +467,84 @@ class agent(AbstractAgent):
         """
 
         data, split_topic = self.parse_payload(
-            payload, topic)
+            payload, topic, "Sensors")
 
         entity_type, entity, location, zone, bch = self.process_request(
             split_topic)
 
-        if not self.hiasbch.iotjumpway_access_check(bch):
+        with self.tracer.span("access_check"):
+            allowed = self.hiasbch.iotjumpway_access_check(bch)
+
+        if not allowed:
             return
 
-        entity_data = self.hiascdi.get_entity(
-            entity_type, entity)
-        
-        if data["Type"] not in entity_data:
-            self.helpers.logger.error(
-                entity_type + " " + entity + " sensors not found")
-            return 
+        def cdi_get(results):
+            cached = self.hiascdi.metadata_cached(
+                entity_type, entity, data["Type"])
+            if cached is not None:
+                return self.hiascdi.entity_value_data(cached, data["Value"])
 
-        sensor_data = self.hiascdi.entity_sensor_data(
-            entity_data, data)
+            entity_data = self.hiascdi.get_entity(
+                entity_type, entity)
 
-        update_response = self.hiascdi.update_entity(
-            entity, entity_type, {
-                "networkStatus": {"value": "ONLINE"},
-                "networkStatus.metadata": {"timestamp":  {
-                    "value": datetime.now().isoformat()
-                }},
-                "dateModified": {"value": datetime.now().isoformat()},
-                data["Type"]: sensor_data
-            })
+            if data["Type"] not in entity_data:
+                self.helpers.logger.error(
+                    entity_type + " " + entity + " sensors not found")
+                return False
 
-        if update_response == False:
-            self.helpers.logger.error(
-                entity_type + " " + entity + " sensors update KO")
-            return
+            sensor_data = self.hiascdi.entity_sensor_data(
+                entity_data, data)
+
+            if not self.hiascdi.metadata_changed(
+                    entity_type, entity, data["Type"], sensor_data):
+                sensor_data = self.hiascdi.entity_value_data(
+                    sensor_data, data["Value"])
+
+            return sensor_data
+
+        def cdi_update(results):
+            update_response = self.hiascdi.update_entity(
+                entity, entity_type, {
+                    "networkStatus": {"value": "ONLINE"},
+                    "networkStatus.metadata": {"timestamp":  {
+                        "value": datetime.now().isoformat()
+                    }},
+                    "dateModified": {"value": datetime.now().isoformat()},
+                    data["Type"]: results["cdi_get"]
+                })
+
+            if update_response == False:
+                self.helpers.logger.error(
+                    entity_type + " " + entity + " sensors update KO")
+
+            return update_response
 
         update_data = self.hiashdi.entity_sensor_data(
             entity, entity_type, location, zone, data)
-        
-        _id = self.hiashdi.insert_data("Sensors", update_data)
-            
-        if _id == False:
-            self.helpers.logger.error(
-                entity_type + " " + entity + " sensors update KO")
+
+        graph = self.stages.graph()
+        graph.add("cdi_get", cdi_get)
+        graph.add("cdi_update", cdi_update, after=("cdi_get",))
+
+        results = self.history(
+            graph, "Sensors", update_data,
+            entity_type + " " + entity + " sensors update KO",
+            after=("cdi_get",)).run()
+
+        if results["cdi_get"] == False:
             return
-        
-        update_data["_id"] = _id
-        self.mqtt.publish("Integrity", update_data)
-        
-        self.helpers.logger.info(
-            entity_type + " " + entity + " sensors data update OK")
-            
+
+        if self.rollups is not None:
+            self.rollups.add(entity, entity_type, location, zone,
+                             data["Sensor"], data["Type"], data["Value"])
+
+        if self.recent is not None:
+            self.recent.add(entity, data["Sensor"], data["Type"], data["Value"])
+
+        if "integrity_publish" in results:
+            self.helpers.logger.info(
+                entity_type + " " + entity + " sensors data update OK")
+
     def state_callback(self, topic, payload):
         """Called in the event of a state payload
 
@@ -396,54 +554,62 @@ class agent(AbstractAgent):
         """
 
         data, split_topic = self.parse_payload(
-            payload, topic)
+            payload, topic, "State")
 
         entity_type, entity, location, zone, bch = self.process_request(
             split_topic)
 
-        if not self.hiasbch.iotjumpway_access_check(bch):
-            return
-        
-        update_response = self.hiascdi.update_online_status(
-            entity, entity_type, "ONLINE")
+        with self.tracer.span("access_check"):
+            allowed = self.hiasbch.iotjumpway_access_check(bch)
 
-        entity_data = self.hiascdi.get_entity(
-            entity_type, entity)
-        
-        if data["State"] not in entity_data["states"]["value"]:
-            self.helpers.logger.error(
-                entity_type + " " + entity + " state update KO")
+        if not allowed:
             return
-        
-        update_response = self.hiascdi.update_entity(
-            entity, entity_type, {
-                "state": {"value": data["State"]},
-                "dateModified": {"value": datetime.now().isoformat()}
-            })
 
-        if update_response == False:
-            self.helpers.logger.error(
-                entity_type + " " + entity + " state update KO")
-            return
-        
+        def cdi_online(results):
+            return self.hiascdi.update_online_status(
+                entity, entity_type, "ONLINE")
+
+        def cdi_get(results):
+            entity_data = self.hiascdi.get_entity(
+                entity_type, entity)
+
+            if data["State"] not in entity_data["states"]["value"]:
+                self.helpers.logger.error(
+                    entity_type + " " + entity + " state update KO")
+                return False
+
+            return True
+
+        def cdi_update(results):
+            update_response = self.hiascdi.update_entity(
+                entity, entity_type, {
+                    "state": {"value": data["State"]},
+                    "dateModified": {"value": datetime.now().isoformat()}
+                })
+
+            if update_response == False:
+                self.helpers.logger.error(
+                    entity_type + " " + entity + " state update KO")
+
+            return update_response
+
         update_data = self.hiashdi.entity_state_data(
             entity, entity_type, location, zone, data)
-        
-        _id = self.hiashdi.insert_data(
-            "State", update_data)
-        
-        if _id == False:
-            self.helpers.logger.error(
-                entity_type + " " + entity + " state update KO")
-            return
-        
-        update_data["_id"] = _id
-        self.mqtt.publish(
-            "Integrity", update_data)
-        
-        self.helpers.logger.info(
-            entity_type + " " + entity + " state update OK")
-            
+
+        graph = self.stages.graph()
+        graph.add("cdi_online", cdi_online)
+        graph.add("cdi_get", cdi_get)
+        graph.add("cdi_update", cdi_update, after=("cdi_get",))
+
+        results = self.history(
+            graph, "State", update_data,
+            entity_type + " " + entity + " state update KO",
+            after=("cdi_get",)).run()
+
+        if "integrity_publish" in results:
+            self.helpers.logger.info(
+                entity_type + " " + entity + " state update OK")
+
     def classification_callback(self, topic, payload):
         """Called in the event of a classification payload
 
@@ -453,128 +619,292 @@ class agent(AbstractAgent):
         """
 
         data, split_topic = self.parse_payload(
-            payload, topic)
+            payload, topic, "Classification")
 
         entity_type, entity, location, zone, bch = self.process_request(
             split_topic)
 
-        if not self.hiasbch.iotjumpway_access_check(bch):
-            return
-        
-        update_response = self.hiascdi.update_online_status(
-            entity, entity_type, "ONLINE")
+        with self.tracer.span("access_check"):
+            allowed = self.hiasbch.iotjumpway_access_check(bch)
 
-        if update_response == False:
-            self.helpers.logger.error(
-                entity_type + " " + entity + " AI model update KO")
+        if not allowed:
             return
 
-        models = self.hiascdi.get_ai_models(
-            entity, entity_type)
-        
-        model_data = models["models"]["value"]
-        modelExists = False
+        def cdi_online(results):
+            update_response = self.hiascdi.update_online_status(
+                entity, entity_type, "ONLINE")
+
+            if update_response == False:
+                self.helpers.logger.error(
+                    entity_type + " " + entity + " AI model update KO")
+
+            return update_response
+
+        def cdi_get(results):
+            models = self.hiascdi.get_ai_models(
+                entity, entity_type)
+
+            model_data = models["models"]["value"]
+            modelExists = False
+
+            newModelData = []
+
+            if model_data is None:
+                self.helpers.logger.error(
+                    entity_type + " " + entity + " does not have any models")
+                return False
+
+            for model in model_data:
+                modelExists = True
+                if model["model"] == data["Model"]:
+                    if "State" in data and data["State"] in model["context"]["states"]["value"]:
+                        model["context"]["state"] = {
+                            "value": data["State"],
+                            "timestamp": datetime.now().isoformat()
+                        }
+                    if "Type" in data and data["Type"] in model["context"]["properties"]["value"]:
+                        model["context"]["properties"]["value"][data["Type"]] = {
+                            "value": data["Value"],
+                            "timestamp": datetime.now().isoformat()
+                        }
+                    newModelData.append(model)
+
+            if modelExists == False:
+                self.helpers.logger.error(
+                    entity_type + " " + entity + " does not have a " + data["Model"] + " model")
+                return False
+
+            return newModelData
+
+        def cdi_update(results):
+            update_response = self.hiascdi.update_entity(
+                entity, entity_type, {
+                    "models": {"value": results["cdi_get"]},
+                    "dateModified": {"value": datetime.now().isoformat()}
+                })
+
+            if update_response == False:
+                self.helpers.logger.error(
+                    entity_type + " " + entity + " AI model update KO")
+
+            return update_response
 
-        newModelData = []
-        
-        if model_data is None:
-            self.helpers.logger.error(
-                entity_type + " " + entity + " does not have any models")
-            return
+        update_data = self.hiashdi.entity_ai_model_data(
+            entity, entity_type, location, zone, data)
 
-        for model in model_data:
-            modelExists = True
-            if model["model"] == data["Model"]:
-                if "State" in data and data["State"] in model["context"]["states"]["value"]:
-                    model["context"]["state"] = {
-                        "value": data["State"],
-                        "timestamp": datetime.now().isoformat()
-                    }
-                if "Type" in data and data["Type"] in model["context"]["properties"]["value"]:
-                    model["context"]["properties"]["value"][data["Type"]] = {
-                        "value": data["Value"],
-                        "timestamp": datetime.now().isoformat()
-                    }
-                newModelData.append(model)
-        
-        if modelExists == False:
-            self.helpers.logger.error(
-                entity_type + " " + entity + " does not have a " + data["Model"] + " model")
-            return
+        graph = self.stages.graph()
+        graph.add("cdi_online", cdi_online)
+        graph.add("cdi_get", cdi_get)
+        graph.add("cdi_update", cdi_update, after=("cdi_get",))
 
-        update_response = self.hiascdi.update_entity(
-            entity, entity_type, {
-                "models": {"value": newModelData},
-                "dateModified": {"value": datetime.now().isoformat()}
-            })
+        results = self.history(
+            graph, "Classification", update_data,
+            entity_type + " " + entity + " AI model update KO",
+            after=("cdi_get",)).run()
 
-        if update_response == False:
-            self.helpers.logger.error(
-                entity_type + " " + entity + " AI model update KO")
-            return
-        
-        update_data = self.hiashdi.entity_ai_model_data(
-            entity, entity_type, location, zone, data)
-        
-        _id = self.hiashdi.insert_data(
-            "Classification", update_data)
-        
-        if _id == False:
-            self.helpers.logger.error(
-                entity_type + " " + entity + " AI model update KO")
-            return
-        
-        update_data["_id"] = _id
-        self.mqtt.publish("Integrity", update_data)
-        self.helpers.logger.info(
-            entity_type + " " + entity + " AI model update OK")
+        if "integrity_publish" in results:
+            self.helpers.logger.info(
+                entity_type + " " + entity + " AI model update OK")
 
     def bci_callback(self, topic, payload):
         """Called in the event of a BCI payload
 
+        Binary BCI frame payloads are passed to bci_frames_callback.
+
         Args:
             topic (str): The topic the payload was sent to.
             payload (:obj:`str`): The payload.
         """
 
+        if payload[:4] == BCI_MAGIC:
+            self.bci_frames_callback(topic, payload)
+            return
+
         data, split_topic = self.parse_payload(
-            payload, topic)
+            payload, topic, "BCI")
 
         entity_type, entity, location, zone, bch = self.process_request(
             split_topic)
 
-        if not self.hiasbch.iotjumpway_access_check(bch):
+        with self.tracer.span("access_check"):
+            allowed = self.hiasbch.iotjumpway_access_check(bch)
+
+        if not allowed:
             return
-        
+
+        def cdi_update(results):
+            update_response = self.hiascdi.update_online_status(
+                entity, entity_type, "ONLINE")
+
+            if update_response == False:
+                self.helpers.logger.error(
+                    entity_type + " " + entity + " AI model update KO")
+
+            return update_response
+
+        update_data = self.hiashdi.entity_bci_data(
+            entity, entity_type, location, zone, data)
+
+        results = self.history(
+            self.stages.graph().add("cdi_update", cdi_update),
+            "Sensors", update_data,
+            entity_type + " " + entity + " BCI update KO").run()
+
+        if "integrity_publish" in results:
+            self.helpers.logger.info(
+                entity_type + " " + entity + " BCI update OK")
+
+    def bci_frames_callback(self, topic, payload):
+        """Called in the event of a binary BCI frame payload
+
+        The frame is decoded into a NumPy array and added to the entity's
+        BCI chunk, which is written by bci_chunk_callback once complete.
+
+        Args:
+            topic (str): The topic the payload was sent to.
+            payload (:obj:`bytes`): The payload.
+        """
+
+        try:
+            with self.tracer.span("decode"):
+                frame = decode_bci(payload)
+        except BCIPayloadException as e:
+            self.helpers.logger.error(
+                topic + " invalid BCI frame: " + str(e))
+            return
+
+        self.deduplicate(topic, payload)
+
+        split_topic = topic.split("/")
+
+        entity_type, entity, location, zone, bch = self.process_request(
+            split_topic)
+
+        with self.tracer.span("access_check"):
+            allowed = self.hiasbch.iotjumpway_access_check(bch)
+
+        if not allowed:
+            return
+
+        self.bci.add(entity, entity_type, location, zone, frame)
+
+    def bci_chunk_callback(self, chunk):
+        """Called when a chunk of binary BCI frames is complete
+
+        Args:
+            chunk (dict): The chunk, see modules.bci.
+        """
+
+        entity = chunk["Entity"]
+        entity_type = chunk["EntityType"]
+
         update_response = self.hiascdi.update_online_status(
             entity, entity_type, "ONLINE")
 
         if update_response == False:
             self.helpers.logger.error(
-                entity_type + " " + entity + " AI model update KO")
-            return
+                entity_type + " " + entity + " status update KO")
+
+        update_data = self.hiashdi.entity_bci_frames_data(
+            entity, entity_type, chunk["Location"], chunk["Zone"], chunk)
 
-        update_data = self.hiashdi.entity_bci_data(
-            entity, entity_type, location, zone, data)
-        
         _id = self.hiashdi.insert_data(
-            "Sensors", update_data)
-        
+            self.confs["agent"]["bci"]["collection"], update_data)
+
         if _id == False:
             self.helpers.logger.error(
-                entity_type + " " + entity + " BCI update KO")
+                entity_type + " " + entity + " BCI frames update KO")
             return
-        
+
         update_data["_id"] = _id
-        self.mqtt.publish(
-            "Integrity", update_data)
-        
+        self.integrity(update_data)
+
+        self.helpers.logger.info(
+            entity_type + " " + entity + " BCI frames update OK (" +
+            str(update_data["Samples"]) + " samples)")
+
+    def rollups_callback(self, records):
+        """Called with the rollups of closed sensor windows
+
+        Args:
+            records (list): The rollups, see modules.rollups.
+        """
+
+        collection = self.confs["agent"]["rollups"]["collection"]
+        stored = 0
+
+        for rollup in records:
+            _id = self.hiashdi.insert_data(
+                collection, self.hiashdi.entity_rollup_data(rollup))
+            if _id != False:
+                stored += 1
+
         self.helpers.logger.info(
-            entity_type + " " + entity + " BCI update OK")
+            "Sensor rollups stored: " + str(stored) + "/" + str(len(records)))
+
+    def history(self, graph, collection, update_data, failed, after=(),
+                integrity=None):
+        """Adds the stages storing a record in HIASHDI and publishing its
+        integrity record
+
+        Args:
+            graph (:obj:`graph`): The callback's stages.
+            collection (str): The HIASHDI collection.
+            update_data (dict): The HIASHDI record.
+            failed (str): Logged if the insert fails.
+            after (tuple): The stages the insert depends on.
+            integrity (function): Builds the record published in integrity
+                mode record from the record id, defaults to the record with
+                its _id. Merkle windows always hash the record itself.
+        """
+
+        def hdi_insert(results):
+            _id = self.hiashdi.insert_data(collection, update_data)
+
+            if _id == False:
+                self.helpers.logger.error(failed)
+
+            return _id
+
+        def integrity_publish(results):
+            update_data["_id"] = results["hdi_insert"]
+            self.integrity(update_data, None if integrity is None
+                           else integrity(update_data["_id"]))
+
+        graph.add("hdi_insert", hdi_insert, after)
+        graph.add("integrity_publish", integrity_publish, ("hdi_insert",))
+
+        return graph
+
+    def callbacks(self):
+        """Returns the MQTT channel callbacks, wrapped by the dispatcher. """
+
+        return {
+            "actuators_callback": self.dispatcher(
+                "Actuators", self.actuators_callback),
+            "bci_callback": self.dispatcher(
+                "BCI", self.bci_callback),
+            "comands_callback": self.dispatcher(
+                "Commands", self.comands_callback),
+            "classification_callback": self.dispatcher(
+                "Classification", self.classification_callback),
+            "life_callback": self.dispatcher(
+                "Life", self.life_callback),
+            "notifications_callback": self.dispatcher(
+                "Notifications", self.notifications_callback),
+            "sensors_callback": self.dispatcher(
+                "Sensors", self.sensors_callback),
+            "state_callback": self.dispatcher(
+                "State", self.state_callback),
+            "status_callback": self.dispatcher(
+                "Status", self.status_callback)
+        }
 
     def signal_handler(self, signal, frame):
         self.helpers.logger.info("Disconnecting")
-        self.mqtt.disconnect()
+        self.shutdown()
+        if self.mqtt is not None:
+            self.mqtt.disconnect()
         sys.exit(1)
 
 app = Flask(__name__)
@@ -587,6 +917,8 @@ def about():
     Responds to GET requests sent to the North Port About API endpoint.
     """
 
+    import psutil
+
     return agent.respond(200, {
         "Identifier": agent.credentials["iotJumpWay"]["entity"],
         "Host": agent.credentials["server"]["ip"],
@@ -672,19 +1004,233 @@ def rules():
                     "Message": rule["action"]["command"].capitalize() + " " + rule["action"]["value"]
                 }, pathto), daemon=True).start()
 
+    from bson import json_util
+
     return agent.respond(
         200, json.dumps(json.loads(
                 json_util.dumps(entity))), accepted)
 
+@app.errorhandler(CircuitOpenException)
+def backend_unavailable(e):
+    """
+    Responds 503 when a request needs a backend whose circuit is open.
+    """
+
+    return agent.respond(
+        503, json.dumps(agent.confs["errorMessages"]["503"]),
+        "application/json")
+
+@app.route('/Entities/<entity>/Recent', methods=['GET'])
+def entity_recent(entity):
+    """
+    Returns the recent readings of an entity
+    Responds to GET requests sent to the North Port Recent API endpoint with
+    the last readings of each of the entity's sensors. The sensor, type,
+    since, until and limit parameters filter the readings; a negative since
+    or until is relative to now in seconds.
+    """
+
+    if agent.recent is None:
+        return agent.respond(
+            404, json.dumps({"Error": "Recent readings are disabled"}),
+            "application/json")
+
+    now = time.time()
+    since = request.args.get("since", default=None, type=float)
+    until = request.args.get("until", default=None, type=float)
+
+    series = agent.recent.query(
+        entity,
+        request.args.get("sensor"),
+        request.args.get("type"),
+        now + since if since is not None and since < 0 else since,
+        now + until if until is not None and until < 0 else until,
+        request.args.get("limit", default=None, type=int))
+
+    if series is None:
+        return agent.respond(
+            404, json.dumps({"Error": entity + " has no recent readings"}),
+            "application/json")
+
+    return agent.respond(
+        200, json.dumps({"Entity": entity, "Series": series}),
+        "application/json")
+
+@app.route('/Metrics', methods=['GET'])
+def metrics():
+    """
+    Returns Agent metrics
+    Responds to GET requests sent to the North Port Metrics API endpoint.
+    """
+
+    return agent.respond(
+        200, json.dumps(agent.helpers.metrics.snapshot()), "application/json")
+
+@app.route('/Memory', methods=['GET'])
+def memory():
+    """
+    Returns Agent memory usage
+    Responds to GET requests sent to the North Port Memory API endpoint with
+    the estimated size of each cache, queue and buffer, the process RSS and,
+    when tracemalloc is enabled, the top allocation sites.
+    """
+
+    top = request.args.get("top", type=int)
+
+    return agent.respond(
+        200, json.dumps(agent.memory.report(top)), "application/json")
+
+@app.route('/Ready', methods=['GET'])
+def ready():
+    """
+    Returns Agent readiness
+    Responds to GET requests sent to the North Port Ready API endpoint with
+    200 once every dependency is connected, otherwise 503.
+    """
+
+    return agent.respond(
+        200 if agent.ready() else 503, json.dumps({
+            "Ready": agent.ready(),
+            "Dependencies": agent.readiness
+        }), "application/json")
+
+@app.route('/Throttled', methods=['GET'])
+def throttled():
+    """
+    Returns the throttled entities
+    Responds to GET requests sent to the North Port Throttled API endpoint
+    with the entities whose messages were rate limited.
+    """
+
+    if agent.ratelimit is None:
+        return agent.respond(
+            404, json.dumps({"Error": "Rate limiting is disabled"}),
+            "application/json")
+
+    return agent.respond(
+        200, json.dumps(agent.ratelimit.report()), "application/json")
+
+@app.route('/FastLane', methods=['GET'])
+def fast_lane():
+    """
+    Returns the fast lane writes
+    Responds to GET requests sent to the North Port FastLane API endpoint
+    with the counts and most recent failures of the writes made after
+    publishing commands.
+    """
+
+    if agent.fastlane is None:
+        return agent.respond(
+            404, json.dumps({"Error": "Ordering is persist-first"}),
+            "application/json")
+
+    return agent.respond(
+        200, json.dumps(agent.fastlane.report()), "application/json")
+
+@app.route('/Traces', methods=['GET'])
+def traces():
+    """
+    Returns recent message traces
+    Responds to GET requests sent to the North Port Traces API endpoint.
+    """
+
+    limit = request.args.get("limit", default=100, type=int)
+
+    return agent.respond(
+        200, json.dumps(agent.tracer.recent(limit)), "application/json")
+
+def profiler_allowed():
+    """
+    Checks a Profiler request
+    Profiling is only allowed when enabled, and only from the agent's own
+    host.
+    """
+
+    if not agent.confs["agent"]["profiler"]["enabled"]:
+        return False
+
+    if request.remote_addr == agent.helpers.credentials["server"]["ip"]:
+        return True
+
+    try:
+        return ipaddress.ip_address(request.remote_addr).is_loopback
+    except (TypeError, ValueError):
+        return False
+
+@app.route('/Profiler/<profile>/<action>', methods=['POST'])
+def profiler_control(profile, action):
+    """
+    Starts or stops a profiling session
+    Responds to POST requests sent to the North Port Profiler API endpoints
+    from the agent's host. CPU sessions use cProfile and Memory sessions use
+    tracemalloc.
+    """
+
+    if not profiler_allowed() \
+            or profile not in ["CPU", "Memory"] \
+            or action not in ["Start", "Stop"]:
+        return agent.respond(
+            404, json.dumps(agent.confs["errorMessages"]["404"]),
+            "application/json")
+
+    duration = request.args.get("duration", default=None, type=float)
+    top = request.args.get("top", default=None, type=int)
+
+    if action == "Start":
+        if profile == "CPU":
+            started = agent.profiler.cpu_start(duration)
+        else:
+            started = agent.profiler.memory_start(
+                duration, request.args.get("frames", default=None, type=int))
+
+        if started is False:
+            return agent.respond(
+                409, json.dumps({
+                    "Error": "AlreadyRunning",
+                    "Description": "409 " + profile + " profiling session already running"
+                }), "application/json")
+
+        return agent.respond(
+            200, json.dumps({"Profile": profile, "Duration": started}),
+            "application/json")
+
+    if profile == "CPU":
+        report = agent.profiler.cpu_stop(
+            top, request.args.get("sort", default="cumulative"))
+    else:
+        report = agent.profiler.memory_stop(top)
+
+    return agent.respond(200, json.dumps(report), "application/json")
+
+@app.route('/Profiler/<profile>', methods=['GET'])
+def profiler_report(profile):
+    """
+    Returns the results of the last profiling session
+    Responds to GET requests sent to the North Port Profiler API endpoints
+    from the agent's host.
+    """
+
+    if not profiler_allowed() or profile not in ["CPU", "Memory"]:
+        return agent.respond(
+            404, json.dumps(agent.confs["errorMessages"]["404"]),
+            "application/json")
+
+    top = request.args.get("top", default=None, type=int)
+
+    if profile == "CPU":
+        report = agent.profiler.cpu_report(
+            top, request.args.get("sort", default="cumulative"))
+    else:
+        report = agent.profiler.memory_report(top)
+
+    return agent.respond(200, json.dumps(report), "application/json")
+
 def main():
 
     signal.signal(signal.SIGINT, agent.signal_handler)
     signal.signal(signal.SIGTERM, agent.signal_handler)
 
-    agent.hiascdi_connection()
-    agent.hiashdi_connection()
-    agent.hiasbch_connection()
-    agent.mqtt_connection({
+    Thread(target=agent.connect, args=({
         "host": agent.credentials["iotJumpWay"]["host"],
         "port": agent.credentials["iotJumpWay"]["port"],
         "security": agent.confs["agent"]["secure"],
@@ -694,22 +1240,17 @@ def main():
         "name": agent.credentials["iotJumpWay"]["name"],
         "un": agent.credentials["iotJumpWay"]["un"],
         "up": agent.credentials["iotJumpWay"]["up"]
-    })
-
-    agent.mqtt.actuators_callback = agent.actuators_callback
-    agent.mqtt.bci_callback = agent.bci_callback
-    agent.mqtt.comands_callback = agent.comands_callback
-    agent.mqtt.classification_callback = agent.classification_callback 
-    agent.mqtt.life_callback = agent.life_callback
-    agent.mqtt.notifications_callback = agent.notifications_callback
-    agent.mqtt.sensors_callback = agent.sensors_callback
-    agent.mqtt.state_callback = agent.state_callback
-    agent.mqtt.status_callback = agent.status_callback
+    }, agent.callbacks()), daemon=True).start()
 
-    agent.threading()
+    if agent.confs["agent"]["server"]["mode"] == "gevent":
+        from modules.server import server
 
-    app.run(host=agent.helpers.credentials["server"]["ip"],
-            port=agent.helpers.credentials["server"]["port"])
+        server(agent.helpers, app).serve(
+            agent.helpers.credentials["server"]["ip"],
+            agent.helpers.credentials["server"]["port"])
+    else:
+        app.run(host=agent.helpers.credentials["server"]["ip"],
+                port=agent.helpers.credentials["server"]["port"])
 
 if __name__ == "__main__":
     main()
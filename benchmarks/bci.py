@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+""" HIAS BCI Ingestion Benchmark
+
+Compares the cost and size of ingesting BCI samples as one JSON payload and
+HIASHDI record per sample against packed binary frames stored as chunked
+frame records.
+
+MIT License
+
+Copyright (c) 2023 Peter Moss Leukaemia MedTech Research CIC
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files(the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and / or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+
+Contributors:
+- Adam Milton-Barker
+
+"""
+
+
+import argparse
+import json
+import logging
+import os
+import sys
+import time
+
+from types import SimpleNamespace
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)) + "/..")
+
+from modules.bci import bci, decode, encode
+from modules.hiashdi import hiashdi
+
+
+def json_path(samples):
+    """ Decodes one JSON payload and builds one record per sample. """
+
+    payloads = [json.dumps({
+        "Sensor": "EEG", "Type": "EEG", "Value": row,
+        "Message": "EEG sample"}).encode("utf-8") for row in samples.tolist()]
+
+    start = time.perf_counter()
+    sent = 0
+    for payload in payloads:
+        data = json.loads(payload.decode("utf-8"))
+        sent += len(json.dumps(hiashdi.entity_bci_data(
+            None, "Device", "Device", "Location", "Zone", data)))
+    elapsed = time.perf_counter() - start
+
+    return elapsed, sum(len(p) for p in payloads), sent, len(payloads)
+
+
+def binary_path(samples, frame, chunk):
+    """ Decodes binary frames into the agent's chunks and builds one record
+    per chunk.
+    """
+
+    payloads = [encode("EEG", samples[i:i + frame], 256.0, 0.0)
+                for i in range(0, len(samples), frame)]
+
+    with open(os.path.dirname(os.path.abspath(__file__)) +
+              "/../configuration/config.json") as confs:
+        confs = json.loads(confs.read())
+    confs["agent"]["bci"]["chunkSamples"] = chunk
+
+    sent = []
+    chunks = bci(
+        SimpleNamespace(confs=confs, logger=logging.getLogger("Benchmark")),
+        lambda finished: sent.append(len(json.dumps(
+            hiashdi.entity_bci_frames_data(
+                None, finished["Entity"], finished["EntityType"],
+                finished["Location"], finished["Zone"], finished)))))
+
+    start = time.perf_counter()
+    for payload in payloads:
+        chunks.add("Device", "Device", "Location", "Zone", decode(payload))
+    chunks.stop()
+    elapsed = time.perf_counter() - start
+
+    return elapsed, sum(len(p) for p in payloads), sum(sent), len(sent)
+
+
+def main():
+
+    parser = argparse.ArgumentParser(
+        description="HIAS MQTT IoT Agent BCI ingestion benchmark")
+    parser.add_argument("--samples", type=int, default=25600)
+    parser.add_argument("--channels", type=int, default=8)
+    parser.add_argument("--frame", type=int, default=32,
+                        help="Samples per binary frame")
+    parser.add_argument("--chunk", type=int, default=256,
+                        help="Samples per HIASHDI frame record")
+    args = parser.parse_args()
+
+    samples = np.random.default_rng(0).standard_normal(
+        (args.samples, args.channels)).astype("<f4")
+
+    print("%d samples x %d channels" % (args.samples, args.channels))
+    print("%-8s %12s %14s %14s %10s" % (
+        "path", "us/sample", "MQTT bytes", "HDI bytes", "records"))
+
+    for name, result in [
+            ("json", json_path(samples)),
+            ("binary", binary_path(samples, args.frame, args.chunk))]:
+        elapsed, received, sent, records = result
+        print("%-8s %12.3f %14d %14d %10d" % (
+            name, elapsed / args.samples * 1e6, received, sent, records))
+
+
+if __name__ == "__main__":
+    main()
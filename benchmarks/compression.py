@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+""" HIAS Compression Benchmark
+
+Measures the bytes saved and the CPU time spent compressing HIASHDI sensor
+records and HIASCDI batch updates with gzip and zstd.
+
+MIT License
+
+Copyright (c) 2023 Peter Moss Leukaemia MedTech Research CIC
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files(the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and / or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+
+Contributors:
+- Adam Milton-Barker
+
+"""
+
+
+import argparse
+import gzip
+import json
+import os
+import random
+import sys
+import time
+
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)) + "/..")
+
+from modules.hiashdi import hiashdi
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+def hdi_bodies(count):
+    """ Builds HIASHDI sensor record bodies. """
+
+    builder = hiashdi.entity_sensor_data
+    bodies = []
+    for i in range(count):
+        bodies.append(json.dumps(builder(
+            None, "device-" + str(i % 10), "Device", "location-1", "zone-1", {
+                "Sensor": "Temperature",
+                "Type": "Temperature",
+                "Value": round(random.uniform(18, 30), 2),
+                "Message": "Temperature reading"
+            })).encode("utf-8"))
+
+    return bodies
+
+
+def cdi_bodies(count, size):
+    """ Builds HIASCDI batch update bodies of size entities. """
+
+    bodies = []
+    for i in range(count):
+        bodies.append(json.dumps({
+            "actionType": "append",
+            "entities": [{
+                "id": "device-" + str(j),
+                "type": "Device",
+                "networkStatus": {"value": "ONLINE"},
+                "networkStatus.metadata": {"timestamp": {
+                    "value": datetime.now().isoformat()}},
+                "dateModified": {"value": datetime.now().isoformat()},
+                "temperature": {"value": round(random.uniform(18, 30), 2)}
+            } for j in range(size)]
+        }).encode("utf-8"))
+
+    return bodies
+
+
+def codecs():
+    """ Returns the codecs to compare. """
+
+    found = [("gzip-" + str(level), lambda body, level=level:
+              gzip.compress(body, compresslevel=level)) for level in (1, 6, 9)]
+
+    if zstandard is not None:
+        for level in (1, 3, 9):
+            compressor = zstandard.ZstdCompressor(level=level)
+            found.append(("zstd-" + str(level), compressor.compress))
+
+    return found
+
+
+def measure(name, bodies):
+    """ Prints the size and CPU cost of each codec on bodies. """
+
+    raw = sum(len(body) for body in bodies)
+    print("%s: %d bodies, %d bytes" % (name, len(bodies), raw))
+    print("  %-8s %12s %8s %14s" % ("codec", "bytes", "ratio", "us/body"))
+
+    for codec, compress in codecs():
+        start = time.process_time()
+        sent = sum(len(compress(body)) for body in bodies)
+        elapsed = time.process_time() - start
+        print("  %-8s %12d %7.1f%% %14.1f" % (
+            codec, sent, 100.0 * sent / raw, elapsed / len(bodies) * 1e6))
+
+
+def main():
+
+    parser = argparse.ArgumentParser(
+        description="HIAS MQTT IoT Agent compression benchmark")
+    parser.add_argument("--records", type=int, default=5000,
+                        help="HIASHDI sensor records")
+    parser.add_argument("--batches", type=int, default=200,
+                        help="HIASCDI batch updates")
+    parser.add_argument("--size", type=int, default=100,
+                        help="Entities per HIASCDI batch update")
+    args = parser.parse_args()
+
+    random.seed(0)
+
+    measure("HIASHDI sensor records", hdi_bodies(args.records))
+    measure("HIASCDI batch updates", cdi_bodies(args.batches, args.size))
+
+
+if __name__ == "__main__":
+    main()
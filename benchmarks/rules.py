@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+""" HIAS North Port Rules Load Test
+
+Sends concurrent HIASCDI subscription notifications to the North Port /Rules
+endpoint of a running HIAS MQTT IoT Agent and reports throughput and latency.
+
+MIT License
+
+Copyright (c) 2023 Peter Moss Leukaemia MedTech Research CIC
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files(the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and / or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+
+Contributors:
+- Adam Milton-Barker
+
+"""
+
+
+import argparse
+import json
+import threading
+import time
+
+import requests
+
+
+def percentile(values, pct):
+    """ Returns the pct percentile of a sorted list. """
+
+    if not values:
+        return 0.0
+    index = min(len(values) - 1, int(round(pct / 100.0 * (len(values) - 1))))
+    return values[index]
+
+
+def worker(args, body, count, latencies, errors, lock):
+    """ Sends count requests on one keep-alive session. """
+
+    session = requests.Session()
+    headers = {
+        "Accept": "application/json",
+        "Content-Type": "application/json"
+    }
+
+    local_latencies = []
+    local_errors = 0
+
+    for i in range(count):
+        start = time.perf_counter()
+        try:
+            response = session.post(
+                args.url, data=body, headers=headers, timeout=args.timeout)
+            if response.status_code != 200:
+                local_errors += 1
+        except requests.exceptions.RequestException:
+            local_errors += 1
+        local_latencies.append(time.perf_counter() - start)
+
+    with lock:
+        latencies.extend(local_latencies)
+        errors.append(local_errors)
+
+
+def main():
+
+    parser = argparse.ArgumentParser(
+        description="HIAS MQTT IoT Agent /Rules load test")
+    parser.add_argument("--url", required=True,
+                        help="North Port /Rules URL of the agent")
+    parser.add_argument("--entity", required=True,
+                        help="Id of an entity with rules in HIASCDI")
+    parser.add_argument("--type", default="Device",
+                        help="Type of the entity")
+    parser.add_argument("--subscription", required=True,
+                        help="Subscription id of one of the entity rules")
+    parser.add_argument("--requests", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--timeout", type=float, default=30.0)
+    args = parser.parse_args()
+
+    body = json.dumps({
+        "subscriptionId": args.subscription,
+        "data": [{"id": args.entity, "type": args.type}]
+    })
+
+    latencies = []
+    errors = []
+    lock = threading.Lock()
+
+    per_worker = args.requests // args.concurrency
+    threads = [threading.Thread(target=worker, args=(
+        args, body, per_worker, latencies, errors, lock))
+        for i in range(args.concurrency)]
+
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    total = len(latencies)
+
+    print("Requests:    %d (%d errors)" % (total, sum(errors)))
+    print("Concurrency: %d" % args.concurrency)
+    print("Elapsed:     %.2f s" % elapsed)
+    print("Throughput:  %.1f req/s" % (total / elapsed))
+    for pct in (50, 90, 95, 99):
+        print("p%d latency: %.2f ms" % (pct, percentile(latencies, pct) * 1000))
+    print("max latency: %.2f ms" % (latencies[-1] * 1000 if total else 0.0))
+
+
+if __name__ == "__main__":
+    main()
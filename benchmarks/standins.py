@@ -0,0 +1,229 @@
+#!/usr/bin/env python3
+""" HIAS Stand-ins
+
+In-process stand-ins for HIASCDI, HIASHDI, HIASBCH and the iotJumpWay MQTT
+broker, used to run the agent's message handling without any backend (for
+benchmarks and message replay).
+
+MIT License
+
+Copyright (c) 2023 Peter Moss Leukaemia MedTech Research CIC
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files(the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and / or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+
+Contributors:
+- Adam Milton-Barker
+
+"""
+
+
+import itertools
+import threading
+import time
+
+from modules.hiascdi import hiascdi as hiascdi_client
+from modules.hiashdi import hiashdi as hiashdi_client
+
+
+class attribute(dict):
+    """ An entity attribute that has every metadata field. """
+
+    def __init__(self, name):
+        super().__init__({
+            "value": name,
+            "type": "Property",
+            "metadata": {
+                "property": {"value": name},
+                "propertyId": {"value": name},
+                "propertyType": {"value": name},
+                "propertyName": {"value": name},
+                "commands": {"value": {}},
+                "description": {"value": name}
+            }
+        })
+
+
+class entity(dict):
+    """ A HIASCDI entity that has every attribute it is asked for. """
+
+    def __contains__(self, name):
+        return True
+
+    def __missing__(self, name):
+        return attribute(name)
+
+
+class standin():
+    """ Counts the calls made to a stand-in and simulates their latency. """
+
+    def __init__(self, latency=0):
+        """ Initializes the stand-in.
+
+        Args:
+            latency (float): Seconds each backend call takes.
+        """
+
+        self.latency = latency
+        self.calls = {}
+        self.lock = threading.Lock()
+
+    def call(self, operation):
+        """ Counts a call and waits for the simulated latency. """
+
+        with self.lock:
+            self.calls[operation] = self.calls.get(operation, 0) + 1
+
+        if self.latency:
+            time.sleep(self.latency)
+
+
+class hiascdi(standin, hiascdi_client):
+    """ HIASCDI stand-in. Entities exist with every attribute. """
+
+    def __init__(self, helpers, latency=0):
+        standin.__init__(self, latency)
+
+        self.helpers = helpers
+        self.batch = None
+        self.retry = None
+
+        self.delta = helpers.confs["agent"]["hiascdi"]["delta"]
+        self.metadata = {}
+        self.written = {}
+        self.lock = threading.Lock()
+
+    def ping(self):
+        return True
+
+    def get_attributes(self, entity_type, _id):
+        self.call("get_attributes")
+
+        return {
+            "id": _id,
+            "type": entity_type,
+            "authenticationBlockchainUser": {"value": _id},
+            "networkLocation": {"value": "Location"},
+            "networkZone": {"value": "Zone"}
+        }
+
+    def get_entity(self, entity_type, _id):
+        self.call("get_entity")
+
+        return entity(id=_id, type=entity_type, states={"value": []})
+
+    def get_sensors(self, _id, typeof):
+        self.call("get_sensors")
+
+        return {"sensors": {"value": []}}
+
+    def get_actuators(self, _id, typeof):
+        self.call("get_actuators")
+
+        return {"actuators": {"value": []}}
+
+    def get_ai_models(self, _id, typeof):
+        self.call("get_ai_models")
+
+        return {"models": {"value": []}}
+
+    def send_update(self, _id, typer, data, retry=True, sent=None):
+        self.call("update_entity")
+        self.wrote(_id, data, time.time() if sent is None else sent)
+
+        return True
+
+    def batch_update(self, entities, action="append"):
+        self.call("batch_update")
+
+        return True
+
+
+class hiashdi(standin, hiashdi_client):
+    """ HIASHDI stand-in. Inserts are counted and given sequential ids. """
+
+    def __init__(self, helpers, latency=0):
+        standin.__init__(self, latency)
+
+        self.helpers = helpers
+        self.retry = None
+        self.ids = itertools.count(1)
+
+    def ping(self):
+        return True
+
+    def insert_data(self, typeof, data, retry=True):
+        self.call("insert_data")
+
+        return str(next(self.ids))
+
+
+class hiasbch(standin):
+    """ HIASBCH stand-in. Every address is allowed. """
+
+    def __init__(self, helpers, latency=0):
+        standin.__init__(self, latency)
+
+        self.helpers = helpers
+        self.batch = None
+        self.mirror = None
+
+    def ping(self):
+        return True
+
+    def iotjumpway_access_check(self, address):
+        self.call("access_check")
+
+        return True
+
+
+class mqtt(standin):
+    """ iotJumpWay MQTT stand-in. Publishes are counted, not sent. """
+
+    def __init__(self, helpers, latency=0):
+        standin.__init__(self, latency)
+
+        self.helpers = helpers
+
+    def publish(self, channel, data, channel_path=""):
+        self.call("publish")
+
+        return True
+
+    def disconnect(self):
+        pass
+
+
+def attach(agent, latency=0):
+    """ Replaces the backends of an agent with stand-ins.
+
+    Args:
+        agent (:obj:`AbstractAgent`): The agent.
+        latency (float): Seconds each backend call takes.
+    """
+
+    agent.hiascdi = hiascdi(agent.helpers, latency)
+    agent.hiashdi = hiashdi(agent.helpers, latency)
+    agent.hiasbch = hiasbch(agent.helpers, latency)
+    agent.mqtt = mqtt(agent.helpers, latency)
+
+    for name in ["HIASCDI", "HIASHDI", "HIASBCH", "MQTT"]:
+        agent.readiness[name] = {
+            "Ready": True, "Attempts": 0, "Seconds": 0, "Error": None}
+
+    return agent
@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+""" HIAS Startup Benchmark
+
+Measures the import time of each module the agent loads and the time from
+process start to the first processed message, with the backends replaced by
+stand-ins.
+
+MIT License
+
+Copyright (c) 2023 Peter Moss Leukaemia MedTech Research CIC
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files(the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and / or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+
+Contributors:
+- Adam Milton-Barker
+
+"""
+
+
+import argparse
+import os
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.abspath(__file__)) + "/.."
+
+FIRST_MESSAGE = """
+import time
+start = time.perf_counter()
+import agent
+imported = time.perf_counter()
+from benchmarks.standins import attach
+attach(agent.agent)
+agent.agent.dispatcher("Sensors", agent.agent.sensors_callback)(
+    "Location/Devices/Zone/Device/Sensors",
+    b'{"Sensor": "DHT22", "Type": "Temperature", "Value": 21.5, '
+    b'"Message": "Temperature reading"}')
+done = time.perf_counter()
+assert agent.agent.hiashdi.calls.get("insert_data") == 1
+print("RESULT", imported - start, done - imported)
+"""
+
+
+def import_times(module):
+    """ Returns the cumulative import time in seconds of each package
+    imported by module, taken where the package was first imported. """
+
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import " + module],
+        cwd=ROOT, capture_output=True, text=True)
+
+    times = {}
+    depths = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        self_us, cumulative, name = line[12:].split("|")
+        if not cumulative.strip().isdigit():
+            continue
+        depth = len(name) - len(name.lstrip())
+        package = name.strip().split(".")[0]
+        if package != module and depth <= depths.get(package, depth):
+            depths[package] = depth
+            times[package] = int(cumulative) / 1e6
+
+    return times
+
+
+def first_message():
+    """ Returns the seconds to start the interpreter, import the agent and
+    process one message. """
+
+    start = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, "-c", FIRST_MESSAGE], cwd=ROOT,
+        capture_output=True, text=True)
+    total = time.perf_counter() - start
+
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr)
+
+    line = [line for line in result.stdout.splitlines()
+            if line.startswith("RESULT")][-1]
+    imported, processed = [float(value) for value in line.split()[1:]]
+
+    return total, imported, processed
+
+
+def main():
+
+    parser = argparse.ArgumentParser(
+        description="HIAS MQTT IoT Agent startup benchmark")
+    parser.add_argument("--module", default="agent",
+                        help="Module to measure the imports of")
+    parser.add_argument("--top", type=int, default=15)
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    times = import_times(args.module)
+    print("Slowest imports of " + args.module + ":")
+    for name, seconds in sorted(
+            times.items(), key=lambda item: -item[1])[:args.top]:
+        print("  %-40s %8.3fs" % (name, seconds))
+
+    runs = [first_message() for _ in range(args.runs)]
+    runs.sort()
+    total, imported, processed = runs[len(runs) // 2]
+    print("First message (median of %d runs): %.3fs total, %.3fs import, "
+          "%.4fs processing" % (args.runs, total, imported, processed))
+
+
+if __name__ == "__main__":
+    main()
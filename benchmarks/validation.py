@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+""" HIAS Validation Benchmark
+
+Measures the cost of validating each channel's decoded payloads.
+
+MIT License
+
+Copyright (c) 2023 Peter Moss Leukaemia MedTech Research CIC
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files(the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and / or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+
+Contributors:
+- Adam Milton-Barker
+
+"""
+
+
+import argparse
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)) + "/..")
+
+from modules.validation import ValidationException, validators
+
+PAYLOADS = {
+    "Sensors": {
+        "Sensor": "DHT22", "Type": "Temperature", "Value": 21.5,
+        "Message": "Temperature reading"
+    },
+    "Actuators": {
+        "Name": "LED", "Type": "Switch", "Property": "switch",
+        "Value": "ON", "Message": "Switched on"
+    },
+    "Commands": {
+        "Use": "Device", "To": "device-1", "Zone": "zone-1",
+        "Property": "switch", "Type": "Switch", "Value": "ON",
+        "Message": "Switch on"
+    },
+    "State": {
+        "State": "Idle", "Type": "State", "Message": "Idle"
+    },
+    "Classification": {
+        "Model": "ALL", "Type": "Diagnosis", "Value": "Negative",
+        "Message": "Classified"
+    },
+    "BCI": {
+        "Sensor": "EEG", "Type": "EEG", "Value": [0.1, 0.2, 0.3],
+        "Message": "EEG sample"
+    },
+    "Life": {
+        "CPU": 12.5, "Memory": 40.1, "Diskspace": 61.0, "Temperature": 48.2,
+        "Latitude": 41.4, "Longitude": 2.17
+    },
+    "Notifications": {
+        "Use": "Application", "From": "device-1", "FromType": "Device",
+        "To": "application-1", "Message": "Alert"
+    }
+}
+
+
+def invalid(validator, payload):
+    """ Validates a payload that is missing its last field. """
+
+    try:
+        validator(payload)
+    except ValidationException:
+        pass
+
+
+def main():
+
+    parser = argparse.ArgumentParser(
+        description="HIAS MQTT IoT Agent payload validation benchmark")
+    parser.add_argument("--number", type=int, default=1000000)
+    args = parser.parse_args()
+
+    print("%-16s %12s %12s" % ("channel", "valid ns", "invalid ns"))
+
+    for channel, payload in PAYLOADS.items():
+        validator = validators[channel]
+        broken = dict(payload)
+        broken.pop(list(broken)[-1])
+
+        valid = min(timeit.repeat(
+            lambda: validator(payload), number=args.number, repeat=3))
+        rejected = min(timeit.repeat(
+            lambda: invalid(validator, broken), number=args.number // 10,
+            repeat=3))
+
+        print("%-16s %12.0f %12.0f" % (
+            channel, valid / args.number * 1e9,
+            rejected / (args.number // 10) * 1e9))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,327 @@
+#!/usr/bin/env python3
+""" HIAS MQTT IoT Agent CLI
+
+Command line tools for the HIAS MQTT IoT Agent.
+
+Usage:
+    python3 cli.py deadletter list [--backend hiascdi|hiashdi] [--limit N]
+    python3 cli.py deadletter replay [--backend hiascdi|hiashdi]
+    python3 cli.py deadletter purge --backend hiascdi|hiashdi
+    python3 cli.py integrity proof --id ID [--window WINDOW]
+    python3 cli.py integrity verify --record FILE [--window WINDOW] [--root ROOT]
+    python3 cli.py capture info --file FILE
+    python3 cli.py capture replay --file FILE [--speed N|max] [--backends standin|real]
+
+MIT License
+
+Copyright (c) 2023 Peter Moss Leukaemia MedTech Research CIC
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files(the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and / or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+
+Contributors:
+- Adam Milton-Barker
+
+"""
+
+
+import argparse
+import json
+import types
+
+from modules import capture as recorder
+from modules import merkle as tree
+from modules.deadletter import deadletter
+from modules.helpers import helpers
+from modules.merkle import merkle
+
+
+def deadletter_list(helper, store, args):
+    """ Prints the dead letters of one or all backends. """
+
+    backends = [args.backend] if args.backend else store.backends()
+
+    for backend in backends:
+        records = store.read(backend)
+        print(backend + ": " + str(len(records)) + " dead letters")
+        for record in records[:args.limit]:
+            print(json.dumps(record))
+
+
+def deadletter_replay(helper, store, args):
+    """ Replays the dead letters of one or all backends.
+
+    HIASCDI letters are sent now, without the attributes HIASCDI has
+    modified since the letter's update was sent. HIASHDI letters are
+    spilled to the agent, which inserts them and publishes their Integrity
+    records like any retried insert when it next starts.
+    """
+
+    from modules.hiascdi import hiascdi
+    from modules.spill import spill
+
+    writers = {}
+    handed = []
+    superseded = []
+
+    def handler(record):
+        if record["backend"] == "hiashdi":
+            handed.append(record)
+            return True
+
+        if "hiascdi" not in writers:
+            writers["hiascdi"] = hiascdi(helper)
+        _id, typer, data = record["args"][:3]
+        sent = record["args"][3] if len(record["args"]) > 3 \
+            else record["created"]
+
+        try:
+            data = writers["hiascdi"].unmodified(_id, typer, data, sent)
+        except Exception as e:
+            print(_id + ": " + str(e))
+            return False
+
+        if not data:
+            superseded.append(record)
+            return True
+
+        return writers["hiascdi"].send_update(_id, typer, data, False)
+
+    backends = [args.backend] if args.backend else store.backends()
+
+    for backend in backends:
+        replayed, failed = store.replay(backend, handler)
+        if backend == "hiashdi":
+            spill(helper).add("writes", handed)
+            print(backend + ": " + str(replayed) + " handed to the agent, "
+                  "replayed when it next starts")
+            continue
+        print(backend + ": " + str(replayed) + " replayed (" +
+              str(len(superseded)) + " superseded by newer data), " +
+              str(failed) + " failed")
+
+
+def deadletter_purge(helper, store, args):
+    """ Deletes the dead letters of a backend. """
+
+    print(args.backend + ": " + str(store.purge(args.backend)) + " purged")
+
+
+def integrity_proof(helper, store, args):
+    """ Prints the inclusion proof of a record id. """
+
+    stored, index = store.find(args.id, args.window)
+    if stored is None:
+        print(args.id + ": not found in any integrity window")
+        raise SystemExit(1)
+
+    leaves = [bytes.fromhex(digest) for digest in stored["Leaves"]]
+    print(json.dumps({
+        "Window": stored["Window"],
+        "Root": stored["Root"],
+        "Index": index,
+        "Leaf": stored["Leaves"][index],
+        "Proof": tree.proof(leaves, index)
+    }, indent=4))
+
+
+def integrity_verify(helper, store, args):
+    """ Verifies that a HIASHDI record was included in its window. """
+
+    with open(args.record) as record:
+        record = json.load(record)
+
+    _id = tree.identifier(record)
+    stored, index = store.find(_id, args.window)
+    if stored is None:
+        print(_id + ": not found in any integrity window")
+        raise SystemExit(1)
+
+    expected = bytes.fromhex(args.root or stored["Root"])
+    leaves = [bytes.fromhex(digest) for digest in stored["Leaves"]]
+    verified = tree.verify(
+        tree.leaf(record), tree.proof(leaves, index), expected)
+
+    print(_id + ": window " + stored["Window"] + " leaf " +
+          str(index) + " root " + expected.hex() + " " +
+          ("verified" if verified else "NOT verified"))
+
+    if not verified:
+        raise SystemExit(1)
+
+
+def capture_info(helper, store, args):
+    """ Prints the message count, time span and size of a capture. """
+
+    print(json.dumps(recorder.summary(args.file), indent=4))
+
+
+def capture_replay(helper, store, args):
+    """ Replays a capture through the agent's message handling.
+
+    The MQTT publishes of the agent are counted by a stand-in, never sent.
+    HIASCDI, HIASHDI and HIASBCH are stand-ins unless --backends real.
+    """
+
+    import agent as hias
+    from benchmarks import standins
+    from modules.mqtt import mqtt
+
+    node = hias.agent
+    node.capture = None
+
+    if args.backends == "real":
+        node.backends()
+        node.mqtt = standins.mqtt(node.helpers)
+    else:
+        standins.attach(node, args.latency)
+
+    # Only routes messages, it never connects to the broker
+    router = mqtt(node.helpers, "Replay", {})
+    router.configs = dict.fromkeys(router.agent, "Replay")
+    router.configs["security"] = False
+    router.configure()
+
+    for name, callback in node.callbacks().items():
+        setattr(router, name, callback)
+
+    if node.ratelimit is not None:
+        router.ratelimit = node.ratelimit
+        node.ratelimit.start(
+            lambda entity_type, entity, channel, topic, payload:
+                router.route(entity_type, channel, topic, payload))
+
+    node.bci.start()
+    if node.rollups is not None:
+        node.rollups.start()
+    if node.merkle is not None:
+        node.merkle.start()
+
+    errors = []
+
+    def deliver(topic, payload):
+        try:
+            router.on_message(None, None, types.SimpleNamespace(
+                topic=topic, payload=payload))
+        except Exception as e:
+            errors.append(topic + ": " + type(e).__name__ + ": " + str(e))
+
+    report = recorder.replay(
+        args.file, deliver, 0 if args.speed == "max" else float(args.speed),
+        args.start, args.end)
+
+    if node.ratelimit is not None:
+        report["Coalesced"] = len(node.ratelimit.stop())
+    node.bci.stop()
+    if node.rollups is not None:
+        node.rollups.stop()
+    if node.merkle is not None:
+        node.merkle.stop()
+    if node.hiascdi.batch is not None:
+        node.hiascdi.batch.stop()
+
+    report["Errors"] = len(errors)
+    report["Calls"] = {
+        backend: getattr(node, backend).calls
+        for backend in ["hiascdi", "hiashdi", "hiasbch", "mqtt"]
+        if hasattr(getattr(node, backend), "calls")}
+
+    for error in errors[:args.limit]:
+        print(error)
+    print(json.dumps(report, indent=4))
+
+
+def main():
+
+    parser = argparse.ArgumentParser(
+        description="HIAS MQTT IoT Agent command line tools")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    letters = commands.add_parser(
+        "deadletter", help="Inspect and replay failed HIASCDI/HIASHDI writes")
+    letters.set_defaults(store=deadletter)
+    actions = letters.add_subparsers(dest="action", required=True)
+
+    action = actions.add_parser("list", help="List dead letters")
+    action.add_argument("--backend", choices=["hiascdi", "hiashdi"])
+    action.add_argument("--limit", type=int, default=20)
+    action.set_defaults(run=deadletter_list)
+
+    action = actions.add_parser("replay", help="Replay dead letters")
+    action.add_argument("--backend", choices=["hiascdi", "hiashdi"])
+    action.set_defaults(run=deadletter_replay)
+
+    action = actions.add_parser("purge", help="Delete dead letters")
+    action.add_argument("--backend", choices=["hiascdi", "hiashdi"],
+                        required=True)
+    action.set_defaults(run=deadletter_purge)
+
+    integrity = commands.add_parser(
+        "integrity", help="Prove records were included in integrity windows")
+    integrity.set_defaults(store=merkle)
+    actions = integrity.add_subparsers(dest="action", required=True)
+
+    action = actions.add_parser("proof", help="Print a record's proof")
+    action.add_argument("--id", required=True, help="HIASHDI record _id")
+    action.add_argument("--window")
+    action.set_defaults(run=integrity_proof)
+
+    action = actions.add_parser("verify", help="Verify a record")
+    action.add_argument("--record", required=True,
+                        help="JSON file of the HIASHDI record with its _id")
+    action.add_argument("--window")
+    action.add_argument("--root",
+                        help="Published root to verify against, defaults "
+                             "to the stored window root")
+    action.set_defaults(run=integrity_verify)
+
+    captures = commands.add_parser(
+        "capture", help="Inspect and replay captured MQTT traffic")
+    captures.set_defaults(store=None)
+    actions = captures.add_subparsers(dest="action", required=True)
+
+    action = actions.add_parser("info", help="Summarize a capture")
+    action.add_argument("--file", required=True, help="Capture .bin file")
+    action.set_defaults(run=capture_info)
+
+    action = actions.add_parser(
+        "replay", help="Replay a capture through the agent")
+    action.add_argument("--file", required=True, help="Capture .bin file")
+    action.add_argument("--speed", default="1",
+                        help="Replay speed, 1 is real time, max is as "
+                             "fast as possible")
+    action.add_argument("--backends", choices=["standin", "real"],
+                        default="standin")
+    action.add_argument("--latency", type=float, default=0,
+                        help="Seconds each stand-in backend call takes")
+    action.add_argument("--start", type=float,
+                        help="Skip messages received before this time")
+    action.add_argument("--end", type=float,
+                        help="Stop at messages received after this time")
+    action.add_argument("--limit", type=int, default=20,
+                        help="Errors to print")
+    action.set_defaults(run=capture_replay)
+
+    args = parser.parse_args()
+
+    helper = helpers("Cli", False)
+    args.run(helper, args.store and args.store(helper), args)
+
+
+if __name__ == "__main__":
+    main()
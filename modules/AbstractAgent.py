@@ -31,20 +31,37 @@ Contributors:
 
 """
 
+import base64
 import json
-import psutil
-import requests
 import ssl
 import threading
+import time
 
 from datetime import datetime
-from flask import Response
 
+from modules.bci import bci
+from modules.capture import capture
+from modules.deadletter import deadletter
+from modules.dedup import DuplicateException, dedup
+from modules.fastlane import fastlane
 from modules.helpers import helpers
 from modules.hiasbch import hiasbch
+from modules.hiasbchbatch import hiasbchbatch
+from modules.hiasbchmirror import hiasbchmirror
 from modules.hiascdi import hiascdi
+from modules.hiascdibatch import hiascdibatch
 from modules.hiashdi import hiashdi
+from modules.memory import combine, estimate, memory
+from modules.merkle import merkle
 from modules.mqtt import mqtt
+from modules.profiler import profiler
+from modules.ratelimit import ratelimit
+from modules.resilience import CircuitOpenException
+from modules.retry import retry
+from modules.spill import spill
+from modules.stages import stages
+from modules.tracer import tracer
+from modules.validation import ValidationException, validate
 
 from abc import ABC, abstractmethod
 
@@ -62,8 +79,18 @@ class AbstractAgent(ABC):
 
         self.hiascdi = None
         self.hiashdi = None
+        self.hiasbch = None
         self.mqtt = None
 
+        self.readiness = {}
+        self.started = time.monotonic()
+
+        self.dispatchers = {}
+        self.inflight = threading.Condition()
+        self.handling = 0
+        self.draining = False
+        self.held = []
+
         self.app_types = [
             "Robotics",
             "Application",
@@ -80,13 +107,129 @@ class AbstractAgent(ABC):
         self.confs = self.helpers.confs
         self.credentials = self.helpers.credentials
 
+        self.tracer = tracer(self.helpers)
+        self.stages = stages(self.helpers, self.tracer)
+        self.profiler = profiler(self.helpers)
+
+        self.bci = bci(self.helpers, self.bci_chunk_callback)
+
+        self.rollups = None
+        if self.confs["agent"]["rollups"]["enabled"]:
+            from modules.rollups import rollups
+
+            self.rollups = rollups(self.helpers, self.rollups_callback)
+
+        self.recent = None
+        if self.confs["agent"]["recent"]["enabled"]:
+            from modules.recent import recent
+
+            self.recent = recent(self.helpers)
+
+        self.ratelimit = None
+        if self.confs["agent"]["ratelimit"]["enabled"]:
+            self.ratelimit = ratelimit(self.helpers)
+
+        self.dedup = None
+        if self.confs["agent"]["dedup"]["enabled"]:
+            self.dedup = dedup(self.helpers)
+
+        self.fastlane = None
+        if self.confs["agent"]["fastlane"]["ordering"] == "publish-first":
+            self.fastlane = fastlane(self.helpers)
+
+        self.merkle = None
+        if self.confs["agent"]["integrity"]["mode"] == "merkle":
+            self.merkle = merkle(self.helpers, self.integrity_root)
+
+        self.capture = None
+        if self.confs["agent"]["capture"]["enabled"]:
+            self.capture = capture(self.helpers)
+
+        self.spill = spill(self.helpers)
+        self.deadletter = deadletter(self.helpers)
+        self.retry = retry(self.helpers, self.deadletter)
+        self.retry.register(
+            "hiascdi", "update_entity", self.retry_cdi_update)
+        self.retry.register(
+            "hiashdi", "insert_data", self.retry_hdi_insert)
+        self.retry.register(
+            "fastlane", "Commands", self.command_persist)
+        self.retry.register(
+            "fastlane", "Actuators", self.actuator_persist)
+
+        self.memory = memory(self.helpers)
+        self.accounting()
+
         self.helpers.logger.info("Agent initialization complete.")
 
+    def accounting(self):
+        """Registers the agent's caches, queues and buffers with the memory
+        budget. """
+
+        self.memory.register(
+            "BCI", lambda: estimate(self.bci.chunks),
+            lambda: self.bci.flush(0))
+        self.memory.register(
+            "Held", lambda: estimate(self.held))
+        self.memory.register(
+            "Retry", lambda: estimate(self.retry.heap))
+        self.memory.register(
+            "Traces", lambda: estimate(self.tracer.ring))
+
+        if self.rollups is not None:
+            self.memory.register(
+                "Rollups", lambda: combine(
+                    estimate(self.rollups.slots), estimate(self.rollups.pending),
+                    (self.rollups.min.nbytes + self.rollups.max.nbytes +
+                     self.rollups.sum.nbytes + self.rollups.count.nbytes +
+                     self.rollups.last.nbytes, 0)),
+                self.rollups.evict)
+
+        if self.recent is not None:
+            self.memory.register("Recent", self.recent.size)
+
+        if self.ratelimit is not None:
+            self.memory.register(
+                "RateLimit", lambda: combine(
+                    estimate(self.ratelimit.entities),
+                    estimate(self.ratelimit.types),
+                    estimate(self.ratelimit.throttled),
+                    estimate(self.ratelimit.coalesced)),
+                self.ratelimit.evict)
+
+        if self.dedup is not None:
+            self.memory.register(
+                "Dedup", lambda: (
+                    len(self.dedup.current.array) +
+                    len(self.dedup.previous.array),
+                    self.dedup.current.count + self.dedup.previous.count))
+
+        if self.merkle is not None:
+            self.memory.register(
+                "Integrity", lambda: combine(
+                    estimate(self.merkle.leaves),
+                    (estimate(self.merkle.ids)[0], 0)),
+                self.merkle.close)
+
     def hiascdi_connection(self):
         """Instantiates the HIASCDI Contextual Data Interface connection. """
 
         self.hiascdi = hiascdi(self.helpers)
 
+        self.memory.register(
+            "HIASCDI Metadata", lambda: estimate(self.hiascdi.metadata),
+            self.hiascdi.metadata_evict)
+
+        if self.confs["agent"]["hiascdi"]["batch"]["enabled"]:
+            self.hiascdi.batch = hiascdibatch(self.helpers, self.hiascdi)
+            self.hiascdi.batch.start()
+            self.memory.register(
+                "HIASCDI Batch", lambda: estimate(self.hiascdi.batch.pending),
+                self.hiascdi.batch.flush)
+
+        if self.confs["agent"]["retry"]["enabled"]:
+            self.hiascdi.retry = self.retry
+
         self.helpers.logger.info(
             "HIASCDI Contextual Data Interface connection instantiated.")
 
@@ -95,15 +238,37 @@ class AbstractAgent(ABC):
 
         self.hiashdi = hiashdi(self.helpers)
 
+        if self.confs["agent"]["retry"]["enabled"]:
+            self.hiashdi.retry = self.retry
+
         self.helpers.logger.info(
             "HIASHDI Historical Data Interface connection instantiated.")
 
-    def mqtt_connection(self, credentials):
-        """Initializes the HIAS MQTT connection. """
+    def mqtt_connection(self, credentials, callbacks=None):
+        """Initializes the HIAS MQTT connection.
+
+        Args:
+            credentials (dict): The iotJumpWay MQTT credentials.
+            callbacks (dict): The channel callbacks, set before the
+                connection subscribes.
+        """
 
         self.mqtt = mqtt(
             self.helpers, "Agent", credentials)
         self.mqtt.configure()
+
+        for name, callback in (callbacks or {}).items():
+            setattr(self.mqtt, name, callback)
+
+        self.mqtt.capture = self.capture
+        self.mqtt.dedup = self.dedup
+
+        if self.ratelimit is not None:
+            self.mqtt.ratelimit = self.ratelimit
+            self.ratelimit.start(
+                lambda entity_type, entity, channel, topic, payload:
+                    self.mqtt.route(entity_type, channel, topic, payload))
+
         self.mqtt.start()
 
         self.helpers.logger.info(
@@ -119,9 +284,253 @@ class AbstractAgent(ABC):
                 self.credentials["hiasbch"]["un"]),
                 self.credentials["hiasbch"]["up"], 0)
 
+        if self.confs["agent"]["hiasbch"]["batch"]["enabled"]:
+            self.hiasbch.batch = hiasbchbatch(self.helpers, self.hiasbch)
+            self.hiasbch.batch.start()
+            self.memory.register(
+                "HIASBCH Batch", lambda: estimate(self.hiasbch.batch.pending),
+                self.hiasbch.batch.flush)
+
+        if self.confs["agent"]["hiasbch"]["mirror"]["enabled"]:
+            self.hiasbch.mirror = hiasbchmirror(self.helpers, self.hiasbch)
+            self.hiasbch.mirror.start()
+            self.memory.register(
+                "HIASBCH Mirror", lambda: combine(
+                    estimate(self.hiasbch.mirror.allowed),
+                    estimate(self.hiasbch.mirror.revoked)))
+
         self.helpers.logger.info(
             "HIAS HIASBCH Blockchain connection created.")
 
+    def dependency(self, name, connect, probe=None):
+        """Connects to a dependency, retrying until it is ready
+
+        The dependency is ready once connect has succeeded and probe, if
+        given, returns True. The time taken is kept in the readiness
+        report.
+
+        Args:
+            name (str): The dependency name.
+            connect (function): Creates the connection.
+            probe (function): Checks the dependency is answering.
+        """
+
+        confs = self.confs["agent"]["startup"]
+        status = self.readiness[name] = {
+            "Ready": False,
+            "Attempts": 0,
+            "Seconds": None,
+            "Error": None
+        }
+        start = time.monotonic()
+
+        while True:
+            status["Attempts"] += 1
+            try:
+                if connect is not None:
+                    connect()
+                    connect = None
+                if probe is None or probe():
+                    break
+                status["Error"] = "Probe failed"
+            except Exception as e:
+                status["Error"] = type(e).__name__ + ": " + str(e)
+
+            self.helpers.logger.error(
+                name + " not ready (attempt " + str(status["Attempts"]) +
+                "): " + status["Error"])
+            time.sleep(min(confs["maxRetryDelay"], confs["retryDelay"] *
+                           2 ** (status["Attempts"] - 1)))
+
+        status["Ready"] = True
+        status["Error"] = None
+        status["Seconds"] = round(time.monotonic() - start, 3)
+
+        self.helpers.logger.info(
+            name + " ready in " + str(status["Seconds"]) + " seconds.")
+
+    def connect(self, credentials, callbacks):
+        """Connects to the backends concurrently, then to MQTT
+
+        The MQTT connection, which subscribes to the iotJumpWay channels,
+        and the module threads are only started once HIASCDI, HIASHDI and
+        HIASBCH are ready.
+
+        Args:
+            credentials (dict): The iotJumpWay MQTT credentials.
+            callbacks (dict): The MQTT channel callbacks.
+        """
+
+        for name in ["HIASCDI", "HIASHDI", "HIASBCH", "MQTT"]:
+            self.readiness[name] = {
+                "Ready": False, "Attempts": 0, "Seconds": None, "Error": None}
+
+        self.backends()
+
+        self.dependency("MQTT", lambda: self.mqtt_connection(
+            credentials, callbacks))
+
+        self.threading()
+        self.replay()
+
+        self.helpers.logger.info(
+            "Agent ready in " + str(round(
+                time.monotonic() - self.started, 3)) + " seconds.")
+
+    def backends(self):
+        """Connects to HIASCDI, HIASHDI and HIASBCH concurrently
+
+        Returns once every backend is connected.
+        """
+
+        threads = [
+            threading.Thread(target=self.dependency, args=(
+                "HIASCDI", self.hiascdi_connection,
+                lambda: self.hiascdi.ping()), daemon=True),
+            threading.Thread(target=self.dependency, args=(
+                "HIASHDI", self.hiashdi_connection,
+                lambda: self.hiashdi.ping()), daemon=True),
+            threading.Thread(target=self.dependency, args=(
+                "HIASBCH", self.hiasbch_connection,
+                lambda: self.hiasbch.ping()), daemon=True)
+        ]
+
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    def shutdown(self):
+        """Stops the agent without losing work
+
+        Stops consuming MQTT messages, waits for the messages being
+        handled, the HIASBCH access checks and the fast lane writes, flushes
+        the BCI chunks, closed rollups and HIASCDI batch, and retries the
+        queued writes once, all within the shutdown deadline.
+        The writes, messages and open rollup windows left are spilled to
+        disk and replayed when the agent next starts.
+
+        Returns:
+            dict: What was drained and what was spilled.
+        """
+
+        start = time.monotonic()
+        deadline = start + self.confs["agent"]["shutdown"]["deadline"]
+        report = {"Drained": {}, "Spilled": {}}
+
+        with self.inflight:
+            self.draining = True
+        self.memory.stop()
+
+        if self.mqtt is not None:
+            self.mqtt.unsubscribe()
+
+        with self.inflight:
+            while self.handling and time.monotonic() < deadline:
+                self.inflight.wait(deadline - time.monotonic())
+            report["Unfinished"] = self.handling
+
+        if self.hiasbch is not None and self.hiasbch.batch is not None:
+            report["Drained"]["HIASBCH"] = self.hiasbch.batch.stop()
+
+        unstarted = []
+        if self.fastlane is not None:
+            report["Drained"]["FastLane"], unstarted = self.fastlane.stop(
+                deadline)
+        report["Drained"]["BCI"] = self.bci.stop()
+        if self.rollups is not None:
+            report["Drained"]["Rollups"], windows = self.rollups.stop()
+            report["Spilled"]["Rollups"] = self.spill.add("rollups", windows)
+        if self.hiascdi is not None and self.hiascdi.batch is not None:
+            report["Drained"]["HIASCDI"] = self.hiascdi.batch.stop()
+
+        retried, left = self.retry.drain(deadline)
+        report["Drained"]["Retry"] = retried
+
+        if self.merkle is not None:
+            report["Drained"]["Integrity"] = self.merkle.stop()
+
+        with self.inflight:
+            held = self.held
+            self.held = []
+
+        if self.ratelimit is not None:
+            for entity_type, entity, channel, topic, payload in \
+                    self.ratelimit.stop():
+                held.append({
+                    "channel": channel,
+                    "topic": topic,
+                    "payload": base64.b64encode(payload).decode("ascii")
+                })
+
+        if self.capture is not None:
+            self.capture.stop()
+
+        report["Spilled"]["Writes"] = self.spill.add(
+            "writes", unstarted + left + self.retry.leftover())
+        report["Spilled"]["Messages"] = self.spill.add("messages", held)
+        report["Seconds"] = round(time.monotonic() - start, 3)
+
+        self.helpers.logger.info("Shutdown report: " + json.dumps(report))
+
+        return report
+
+    def replay(self):
+        """Replays the writes, messages and rollup windows spilled at the
+        last shutdown
+
+        Writes that fail again are scheduled for retry, or moved to the
+        dead letter store when retry is disabled.
+        """
+
+        writes = self.spill.load("writes")
+        messages = self.spill.load("messages")
+        windows = self.spill.load("rollups")
+
+        if self.rollups is not None and windows:
+            self.helpers.logger.info(
+                "Restored " + str(self.rollups.restore(windows)) +
+                " spilled rollup windows.")
+
+        failed = 0
+        for record in writes:
+            try:
+                ok = self.retry.handlers[
+                    (record["backend"], record["operation"])](*record["args"])
+            except Exception as e:
+                self.helpers.logger.error(
+                    "Spilled " + record["operation"] + " error: " + str(e))
+                ok = False
+
+            if not ok:
+                failed += 1
+                if record["backend"] == "fastlane":
+                    # Its HIASCDI and HIASHDI writes were scheduled for
+                    # retry when they failed
+                    continue
+                if self.confs["agent"]["retry"]["enabled"]:
+                    self.retry.schedule(
+                        record["backend"], record["operation"],
+                        record["args"], record)
+                else:
+                    self.deadletter.add(record)
+
+        for message in messages:
+            self.dispatchers[message["channel"]](
+                message["topic"], base64.b64decode(message["payload"]))
+
+        if writes or messages:
+            self.helpers.logger.info(
+                "Replayed " + str(len(writes)) + " spilled writes (" +
+                str(failed) + " failed) and " + str(len(messages)) +
+                " spilled messages.")
+
+    def ready(self):
+        """Returns True when every dependency is ready. """
+
+        return len(self.readiness) > 0 and all(
+            status["Ready"] for status in self.readiness.values())
+
     def check_accepts_type(self, headers):
         """ Checks the request Accept types. """
 
@@ -224,16 +633,74 @@ class AbstractAgent(ABC):
 
         return rattrs
     
-    def parse_payload(self, payload, topic):
-        """Decodes the payload and splits the topic
+    def decode_payload(self, payload, topic, channel):
+        """Decodes the payload, validates it against its channel schema
+        and checks it is not a duplicate
 
         Args:
+            payload (:obj:`str`): The payload.
             topic (str): The topic the payload was sent to.
+            channel (str): The channel the payload was sent to.
+
+        Raises:
+            ValidationException: The payload is not valid JSON or does not
+                match the channel schema.
+            DuplicateException: The message was already processed.
+        """
+
+        with self.tracer.span("decode"):
+            try:
+                data = json.loads(payload.decode("utf-8"))
+            except ValueError:
+                raise ValidationException(
+                    channel + " payload is not valid JSON")
+
+        if self.confs["agent"]["validation"]["enabled"]:
+            with self.tracer.span("validate"):
+                validate(channel, data)
+
+        self.deduplicate(topic, payload, data)
+
+        return data
+
+    def deduplicate(self, topic, payload, data=None):
+        """Checks a message against the recently processed messages
+
+        Args:
+            topic (str): The topic the payload was sent to.
+            payload (:obj:`bytes`): The payload.
+            data (dict): The decoded payload, if it was decoded.
+
+        Raises:
+            DuplicateException: The message was already processed.
+        """
+
+        if self.dedup is None:
+            return
+
+        sequence = None
+        if type(data) is dict:
+            sequence = data.get(self.confs["agent"]["dedup"]["sequence"])
+
+        with self.tracer.span("dedup"):
+            duplicate = self.dedup.duplicate(topic, payload, sequence)
+
+        if duplicate:
+            raise DuplicateException(topic + " message already processed")
+
+    def parse_payload(self, payload, topic, channel):
+        """Decodes and validates the payload and splits the topic
+
+        Args:
             payload (:obj:`str`): The payload.
+            topic (str): The topic the payload was sent to.
+            channel (str): The channel the payload was sent to.
         """
 
-        data = json.loads(payload.decode("utf-8"))
-        split_topic = topic.split("/")
+        data = self.decode_payload(payload, topic, channel)
+
+        with self.tracer.span("topic"):
+            split_topic = topic.split("/")
 
         return data, split_topic
     
@@ -250,8 +717,9 @@ class AbstractAgent(ABC):
         self.helpers.logger.info(
             "Received " + entity_type  + " status data payload")
 
-        attrs = self.get_attributes(
-            entity_type, entity)
+        with self.tracer.span("get_attributes"):
+            attrs = self.get_attributes(
+                entity_type, entity)
 
         entity = attrs["id"]
         location = attrs["location"]
@@ -260,9 +728,158 @@ class AbstractAgent(ABC):
 
         return entity_type, entity, location, zone, bch
 
+    def dispatcher(self, channel, callback):
+        """Wraps a channel callback so each message it handles is traced
+
+        Messages that are invalid or duplicates, or that fail because a
+        backend is unavailable or timed out, are logged and dropped rather
+        than stopping the MQTT loop. Messages received while the agent is
+        shutting down are held to be spilled.
+
+        Args:
+            channel (str): The channel the callback handles.
+            callback (function): The channel callback.
+
+        Returns:
+            function: The wrapped callback.
+        """
+
+        import requests
+
+        def dispatch(topic, payload):
+            with self.inflight:
+                if self.draining:
+                    self.held.append({
+                        "channel": channel,
+                        "topic": topic,
+                        "payload": base64.b64encode(payload).decode("ascii")
+                    })
+                    return
+                self.handling += 1
+
+            try:
+                self.memory.admit()
+                handle(topic, payload)
+            finally:
+                with self.inflight:
+                    self.handling -= 1
+                    self.inflight.notify_all()
+
+        def handle(topic, payload):
+            self.tracer.begin(channel, topic)
+            if self.dedup is not None:
+                self.dedup.begin()
+            try:
+                callback(topic, payload)
+            except DuplicateException as e:
+                self.helpers.metrics.increment(
+                    "dedup_suppressed", {"channel": channel})
+                self.helpers.logger.info(
+                    channel + " " + topic + " duplicate suppressed")
+                self.tracer.finish(type(e).__name__)
+                return
+            except ValidationException as e:
+                self.helpers.metrics.increment(
+                    "payloads_rejected", {"channel": channel})
+                self.helpers.logger.warning(
+                    channel + " " + topic + " payload rejected: " + str(e))
+                self.tracer.finish(type(e).__name__)
+                return
+            except (CircuitOpenException, requests.exceptions.RequestException) as e:
+                self.helpers.logger.error(
+                    channel + " " + topic + " backend unavailable: " + str(e))
+                self.tracer.finish(type(e).__name__)
+                return
+            except Exception as e:
+                self.tracer.finish(type(e).__name__)
+                raise
+            if self.dedup is not None:
+                self.dedup.record()
+            self.tracer.finish()
+
+        self.dispatchers[channel] = dispatch
+
+        return dispatch
+
+    def retry_cdi_update(self, _id, typer, data, sent=None):
+        """Retries a failed HIASCDI entity update
+
+        Attributes written by a newer update since this one was sent are
+        left out, so a retry never overwrites newer context data.
+
+        Args:
+            _id (str): The entity id.
+            typer (str): The entity type.
+            data (dict): The attributes to update.
+            sent (float): The time the update was first sent.
+        """
+
+        if sent is not None:
+            data = self.hiascdi.unwritten(_id, data, sent)
+            if not data:
+                self.helpers.logger.info(
+                    typer + " " + _id + " retry superseded by a newer update")
+                return True
+
+        return self.hiascdi.send_update(_id, typer, data, False, sent)
+
+    def retry_hdi_insert(self, typeof, data):
+        """Retries a failed HIASHDI insert and publishes its integrity record
+
+        Args:
+            typeof (str): The HIASHDI data type.
+            data (dict): The data to insert.
+        """
+
+        _id = self.hiashdi.insert_data(typeof, data, False)
+
+        if _id == False:
+            return False
+
+        update_data = dict(data)
+        update_data["_id"] = _id
+        self.integrity(update_data)
+
+        return True
+
+    def integrity(self, data, message=None):
+        """Publishes the integrity record of a HIASHDI write
+
+        In merkle mode the record is added to the current integrity window
+        and only the window root is published.
+
+        Args:
+            data (dict): The HIASHDI record, including its _id.
+            message (dict): The record published in record mode, defaults
+                to the HIASHDI record.
+        """
+
+        if self.merkle is None:
+            return self.mqtt.publish(
+                "Integrity", data if message is None else message)
+
+        self.merkle.add(data)
+
+        return True
+
+    def integrity_root(self, window):
+        """Publishes the Merkle root of a closed integrity window
+
+        Args:
+            window (dict): The window, see modules.merkle.
+        """
+
+        record = {"Type": "MerkleRoot"}
+        record.update(window)
+
+        self.mqtt.publish("Integrity", record)
+
     def publish_life(self):
         """ Publishes entity statistics to HIAS. """
 
+        import psutil
+        import requests
+
         cpu = psutil.cpu_percent()
         mem = psutil.virtual_memory()[2]
         hdd = psutil.disk_usage('/hias').percent
@@ -295,9 +912,29 @@ class AbstractAgent(ABC):
         # Life thread
         threading.Timer(10.0, self.publish_life).start()
 
+        # BCI chunk thread
+        self.bci.start()
+
+        # Rollup thread
+        if self.rollups is not None:
+            self.rollups.start()
+
+        # Integrity window thread
+        if self.merkle is not None:
+            self.merkle.start()
+
+        # Retry threads
+        if self.confs["agent"]["retry"]["enabled"]:
+            self.retry.start()
+
+        # Memory budget thread
+        self.memory.start()
+
     def respond(self, responseCode, response, accepted):
         """ Builds the request response """
 
+        from flask import Response
+
         headers = {}
         if "application/json" in accepted:
             response =  Response(
@@ -393,3 +1030,36 @@ class AbstractAgent(ABC):
             topic (str): The topic the payload was sent to.
             payload (:obj:`str`): The payload.
         """
+            
+    @abstractmethod
+    def bci_chunk_callback(self, chunk):
+        """Called when a chunk of binary BCI frames is complete
+
+        Args:
+            chunk (dict): The chunk, see modules.bci.
+        """
+
+    @abstractmethod
+    def command_persist(self, entity, entity_type, location, zone, data,
+                        actuator_data):
+        """Writes a command that was already published to its device
+
+        Returns:
+            bool: False if a write failed.
+        """
+
+    @abstractmethod
+    def actuator_persist(self, entity, entity_type, location, zone, data):
+        """Writes an actuator state to HIASCDI and HIASHDI
+
+        Returns:
+            bool: False if a write failed.
+        """
+
+    @abstractmethod
+    def rollups_callback(self, records):
+        """Called with the rollups of closed sensor windows
+
+        Args:
+            records (list): The rollups, see modules.rollups.
+        """
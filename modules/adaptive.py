@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+""" HIAS Adaptive Batching Module
+
+Tunes the batch size and window of a batch writer from the backend
+latency, throughput and queue depth it observes.
+
+MIT License
+
+Copyright (c) 2023 Peter Moss Leukaemia MedTech Research CIC
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files(the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and / or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+
+Contributors:
+- Adam Milton-Barker
+
+"""
+
+
+import time
+
+
+class adaptive():
+    """ HIAS Adaptive Batching Module
+
+    After each batch request the writer reports the queue depth, the items
+    queued since the last request and how long the request took. The
+    batch size grows by step while the queue holds a full batch or more,
+    and is halved when a request alone takes longer than the SLO leaves
+    after the shortest window. The window is the time a batch takes to
+    fill at the observed rate, capped so that window plus request latency
+    stays within the SLO. Both stay within their configured bounds.
+    """
+
+    def __init__(self, helpers, writer, confs, size, window):
+        """ Initializes the class.
+
+        Args:
+            helpers (:obj:`helpers`): The agent helpers.
+            writer (str): The writer name, used as the metrics label.
+            confs (dict): The adaptive configuration of the writer.
+            size (int): The initial batch size.
+            window (float): The initial window in seconds.
+        """
+
+        self.helpers = helpers
+        self.writer = writer
+        self.confs = confs
+        self.program = "HIAS Adaptive Batching Module"
+
+        self.size = min(max(size, confs["minSize"]), confs["maxSize"])
+        self.window = min(max(window, confs["minWindow"]), confs["maxWindow"])
+
+        self.latency = None
+        self.rate = None
+        self.observed = time.monotonic()
+
+        self.helpers.logger.info(
+            self.program + " initialization complete (" + writer + ").")
+
+    def smooth(self, average, sample):
+        """ Returns the exponentially weighted moving average. """
+
+        if average is None:
+            return sample
+
+        return average + self.confs["smoothing"] * (sample - average)
+
+    def observe(self, depth, arrived, seconds):
+        """ Adjusts the batch size and window after a batch request.
+
+        Args:
+            depth (int): The items waiting when the batch was taken,
+                including the batch.
+            arrived (int): The items queued since the last request.
+            seconds (float): The time the request took.
+
+        Returns:
+            tuple: The new (size, window).
+        """
+
+        now = time.monotonic()
+        interval = max(now - self.observed, 0.001)
+        self.observed = now
+
+        self.rate = self.smooth(self.rate, arrived / interval)
+        self.latency = self.smooth(self.latency, seconds)
+
+        slo = self.confs["slo"]
+        size = self.size
+
+        if self.latency > slo - self.confs["minWindow"]:
+            size = max(self.confs["minSize"], size // 2)
+        elif depth >= size:
+            size = min(self.confs["maxSize"], size + self.confs["step"])
+
+        window = size / self.rate if self.rate else self.confs["maxWindow"]
+        window = min(window, slo - self.latency)
+        window = min(max(window, self.confs["minWindow"]),
+                     self.confs["maxWindow"])
+
+        if size != self.size:
+            self.helpers.metrics.increment("batch_adjustments", {
+                "writer": self.writer,
+                "direction": "up" if size > self.size else "down"})
+
+        self.size = size
+        self.window = window
+
+        labels = {"writer": self.writer}
+        self.helpers.metrics.gauge("batch_size", size, labels)
+        self.helpers.metrics.gauge("batch_window_seconds", window, labels)
+        self.helpers.metrics.gauge(
+            "batch_latency_seconds", self.latency, labels)
+        self.helpers.metrics.gauge("batch_rate", self.rate, labels)
+        self.helpers.metrics.gauge("batch_depth", depth, labels)
+
+        return size, window
@@ -0,0 +1,244 @@
+#!/usr/bin/env python3
+""" HIAS BCI Module
+
+This module decodes compact binary BCI payloads (packed float32 multi-channel
+frames) into NumPy arrays and collects them into chunked frame records for
+HIASHDI.
+
+Binary BCI payloads are little-endian and start with a 26 byte header:
+
+    magic      4s   b"HBCI"
+    version    u8   1
+    reserved   u8
+    channels   u16  number of channels
+    samples    u32  number of samples in the frame
+    rate       f32  sample rate in Hz
+    timestamp  f64  epoch time of the first sample
+    sensor     u16  length of the UTF-8 sensor name that follows
+
+followed by the sensor name and samples x channels float32 values, sample
+major (all channels of the first sample, then the second sample...).
+
+MIT License
+
+Copyright (c) 2023 Peter Moss Leukaemia MedTech Research CIC
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files(the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and / or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+
+Contributors:
+- Adam Milton-Barker
+
+"""
+
+
+import struct
+import threading
+import time
+
+MAGIC = b"HBCI"
+VERSION = 1
+HEADER = struct.Struct("<4sBBHIfdH")
+
+
+class BCIPayloadException(Exception):
+    """ Raised when a binary BCI payload is malformed. """
+
+
+def encode(sensor, samples, rate, timestamp):
+    """ Encodes a frame as a binary BCI payload.
+
+    Args:
+        sensor (str): The sensor name.
+        samples (:obj:`numpy.ndarray`): samples x channels values.
+        rate (float): The sample rate in Hz.
+        timestamp (float): Epoch time of the first sample.
+    """
+
+    import numpy as np
+
+    samples = np.ascontiguousarray(samples, dtype="<f4")
+    name = sensor.encode("utf-8")
+
+    return HEADER.pack(MAGIC, VERSION, 0, samples.shape[1],
+                       samples.shape[0], rate, timestamp, len(name)) + \
+        name + samples.tobytes()
+
+
+def decode(payload):
+    """ Decodes a binary BCI payload without copying its samples.
+
+    Args:
+        payload (bytes): The payload.
+
+    Returns:
+        dict: The frame header and a read-only samples x channels float32
+            array viewing the payload.
+    """
+
+    import numpy as np
+
+    if len(payload) < HEADER.size:
+        raise BCIPayloadException("Payload shorter than header")
+
+    magic, version, reserved, channels, samples, rate, timestamp, length = \
+        HEADER.unpack_from(payload)
+
+    if magic != MAGIC or version != VERSION:
+        raise BCIPayloadException("Unsupported BCI payload")
+
+    offset = HEADER.size + length
+    if len(payload) != offset + samples * channels * 4:
+        raise BCIPayloadException("Payload size does not match header")
+
+    return {
+        "Sensor": bytes(payload[HEADER.size:offset]).decode("utf-8"),
+        "Channels": channels,
+        "Rate": rate,
+        "Timestamp": timestamp,
+        "Samples": np.frombuffer(
+            payload, dtype="<f4", count=samples * channels,
+            offset=offset).reshape(samples, channels)
+    }
+
+
+class bci():
+    """ HIAS BCI Module
+
+    Frames are collected per entity and sensor into chunks. A chunk is
+    written when it holds the configured number of samples, when its
+    channel count or rate changes, or when it is older than the configured
+    age.
+    """
+
+    def __init__(self, helpers, writer):
+        """ Initializes the class.
+
+        Args:
+            helpers (:obj:`helpers`): The agent helpers.
+            writer (function): Called with each finished chunk.
+        """
+
+        self.helpers = helpers
+        self.writer = writer
+        self.program = "HIAS BCI Module"
+
+        self.confs = self.helpers.confs["agent"]["bci"]
+
+        self.chunks = {}
+        self.lock = threading.Lock()
+        self.running = False
+
+        self.helpers.logger.info(
+            self.program + " initialization complete.")
+
+    def start(self):
+        """ Starts the thread writing chunks that reached their age. """
+
+        self.running = True
+        threading.Thread(target=self.run, daemon=True).start()
+
+    def stop(self):
+        """ Stops the chunk thread and writes all open chunks.
+
+        Returns:
+            int: The number of chunks written.
+        """
+
+        self.running = False
+        return self.flush(0)
+
+    def run(self):
+        """ Writes chunks older than the configured age. """
+
+        while self.running:
+            time.sleep(self.confs["chunkSeconds"])
+            self.flush(self.confs["chunkSeconds"])
+
+    def add(self, entity, entity_type, location, zone, frame):
+        """ Adds a decoded frame to its entity's chunk.
+
+        Args:
+            entity (str): The entity id.
+            entity_type (str): The entity type.
+            location (str): The entity location.
+            zone (str): The entity zone.
+            frame (dict): A frame returned by decode.
+        """
+
+        key = (entity, frame["Sensor"])
+        ready = []
+
+        with self.lock:
+            chunk = self.chunks.get(key)
+
+            if chunk is not None and (
+                    chunk["Channels"] != frame["Channels"] or
+                    chunk["Rate"] != frame["Rate"]):
+                ready.append(self.chunks.pop(key))
+                chunk = None
+
+            if chunk is None:
+                chunk = self.chunks[key] = {
+                    "Entity": entity,
+                    "EntityType": entity_type,
+                    "Location": location,
+                    "Zone": zone,
+                    "Sensor": frame["Sensor"],
+                    "Channels": frame["Channels"],
+                    "Rate": frame["Rate"],
+                    "Start": frame["Timestamp"],
+                    "Created": time.monotonic(),
+                    "Count": 0,
+                    "Frames": []
+                }
+
+            chunk["Frames"].append(frame["Samples"])
+            chunk["Count"] += frame["Samples"].shape[0]
+
+            if chunk["Count"] >= self.confs["chunkSamples"]:
+                ready.append(self.chunks.pop(key))
+
+        for chunk in ready:
+            self.writer(self.finish(chunk))
+
+    def flush(self, age):
+        """ Writes the chunks older than age seconds. """
+
+        now = time.monotonic()
+
+        with self.lock:
+            keys = [key for key, chunk in self.chunks.items()
+                    if now - chunk["Created"] >= age]
+            ready = [self.chunks.pop(key) for key in keys]
+
+        for chunk in ready:
+            self.writer(self.finish(chunk))
+
+        return len(ready)
+
+    def finish(self, chunk):
+        """ Joins the frames of a chunk into one samples x channels array. """
+
+        import numpy as np
+
+        frames = chunk.pop("Frames")
+        chunk["Samples"] = frames[0] if len(frames) == 1 \
+            else np.concatenate(frames)
+
+        return chunk
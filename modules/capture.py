@@ -0,0 +1,245 @@
+#!/usr/bin/env python3
+""" HIAS Capture Module
+
+Records the MQTT messages the agent receives to a compact append-only
+binary log with an index, and replays captures back through the agent.
+
+MIT License
+
+Copyright (c) 2023 Peter Moss Leukaemia MedTech Research CIC
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files(the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and / or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+
+Contributors:
+- Adam Milton-Barker
+
+"""
+
+
+import os
+import struct
+import threading
+import time
+
+MAGIC = b"HIASCAP1"
+
+# Log record header: receive time, topic length, payload length
+RECORD = struct.Struct("<dHI")
+
+# Index entry: receive time, offset of the record in the log
+ENTRY = struct.Struct("<dQ")
+
+
+def read(path, start=None, end=None):
+    """ Yields the messages of a capture.
+
+    A record cut short by a crash ends the capture.
+
+    Args:
+        path (str): The capture log, the index is read from path.idx.
+        start (float): Skip messages received before this time.
+        end (float): Stop at messages received after this time.
+
+    Yields:
+        tuple: (receive time, topic, payload).
+    """
+
+    with open(path + ".idx", "rb") as index:
+        entries = index.read()
+    entries = ENTRY.iter_unpack(
+        entries[:len(entries) // ENTRY.size * ENTRY.size])
+
+    with open(path, "rb") as log:
+        if log.read(len(MAGIC)) != MAGIC:
+            raise ValueError(path + " is not a HIAS capture")
+
+        for received, offset in entries:
+            if start is not None and received < start:
+                continue
+            if end is not None and received > end:
+                break
+
+            log.seek(offset)
+            header = log.read(RECORD.size)
+            if len(header) < RECORD.size:
+                break
+            received, topic_size, payload_size = RECORD.unpack(header)
+            topic = log.read(topic_size)
+            payload = log.read(payload_size)
+            if len(payload) < payload_size:
+                break
+
+            yield received, topic.decode("utf-8"), payload
+
+
+def summary(path):
+    """ Returns the message count, first and last receive time and size of
+    a capture. """
+
+    count = 0
+    first = last = None
+    for received, topic, payload in read(path):
+        first = received if first is None else first
+        last = received
+        count += 1
+
+    return {
+        "File": path,
+        "Messages": count,
+        "First": first,
+        "Last": last,
+        "Seconds": round(last - first, 3) if count else 0,
+        "Bytes": os.path.getsize(path)
+    }
+
+
+def replay(path, deliver, speed=1.0, start=None, end=None):
+    """ Replays a capture.
+
+    Messages are delivered with the gaps they were received with, divided
+    by speed. A speed of 0 delivers them as fast as possible.
+
+    Args:
+        path (str): The capture log.
+        deliver (function): Called with the topic and payload of each
+            message.
+        speed (float): The replay speed, 1 is real time.
+        start (float): Skip messages received before this time.
+        end (float): Stop at messages received after this time.
+
+    Returns:
+        dict: Messages replayed, elapsed seconds and the largest delay
+            behind the captured schedule in seconds.
+    """
+
+    count = 0
+    behind = 0.0
+    began = time.perf_counter()
+    first = None
+
+    for received, topic, payload in read(path, start, end):
+        if first is None:
+            first = received
+
+        if speed:
+            due = began + (received - first) / speed
+            now = time.perf_counter()
+            if due > now:
+                time.sleep(due - now)
+            else:
+                behind = max(behind, now - due)
+
+        deliver(topic, payload)
+        count += 1
+
+    elapsed = time.perf_counter() - began
+
+    return {
+        "Messages": count,
+        "Seconds": round(elapsed, 3),
+        "Rate": round(count / elapsed, 1) if elapsed else 0,
+        "Behind": round(behind, 3)
+    }
+
+
+class capture():
+    """ HIAS Capture Module
+
+    Each received message is appended to the capture log as a fixed size
+    header followed by the topic and payload, and its receive time and
+    offset are appended to the index. Capturing stops when the log reaches
+    maxBytes.
+    """
+
+    def __init__(self, helpers):
+        """ Initializes the class. """
+
+        self.helpers = helpers
+        self.program = "HIAS Capture Module"
+
+        self.confs = self.helpers.confs["agent"]["capture"]
+        self.path = self.helpers.data("capture")
+
+        self.file = None
+        self.log = None
+        self.index = None
+
+        self.offset = len(MAGIC)
+        self.flushed = time.monotonic()
+        self.full = False
+        self.lock = threading.Lock()
+
+        self.helpers.logger.info(
+            self.program + " initialization complete.")
+
+    def open(self):
+        """ Opens the capture log and index on the first message. """
+
+        os.makedirs(self.path, exist_ok=True)
+        self.file = self.path + "%.6f" % time.time() + ".bin"
+        self.log = open(self.file, "ab")
+        self.log.write(MAGIC)
+        self.index = open(self.file + ".idx", "ab")
+
+        self.helpers.logger.info("Capturing to " + self.file)
+
+    def add(self, topic, payload):
+        """ Captures a received message.
+
+        Args:
+            topic (str): The MQTT topic.
+            payload (bytes): The MQTT payload.
+        """
+
+        received = time.time()
+        topic = topic.encode("utf-8")
+
+        with self.lock:
+            if self.full:
+                return
+            if self.log is None:
+                self.open()
+
+            size = RECORD.size + len(topic) + len(payload)
+            if self.offset + size > self.confs["maxBytes"]:
+                self.full = True
+                self.helpers.logger.warning(
+                    "Capture " + self.file + " reached maxBytes, "
+                    "capturing stopped.")
+                return
+
+            self.log.write(RECORD.pack(received, len(topic), len(payload)))
+            self.log.write(topic)
+            self.log.write(payload)
+            self.index.write(ENTRY.pack(received, self.offset))
+            self.offset += size
+
+            if time.monotonic() - self.flushed > self.confs["flush"]:
+                self.log.flush()
+                self.index.flush()
+                self.flushed = time.monotonic()
+
+    def stop(self):
+        """ Flushes and closes the capture. """
+
+        with self.lock:
+            self.full = True
+            if self.log is not None:
+                self.log.close()
+                self.index.close()
@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+""" HIAS Compression Module
+
+Compresses the request bodies the HIAS IoT Agents send to HIASCDI and
+records the bytes saved and the CPU time spent.
+
+MIT License
+
+Copyright (c) 2023 Peter Moss Leukaemia MedTech Research CIC
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files(the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and / or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+
+Contributors:
+- Adam Milton-Barker
+
+"""
+
+
+import gzip
+import time
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+class compression():
+    """ HIAS Compression Module
+
+    Bodies of at least minSize bytes are compressed with gzip or zstd and
+    sent with a Content-Encoding header. If the backend answers 415
+    Unsupported Media Type, compression is disabled for that backend and
+    the caller resends the body uncompressed.
+    """
+
+    def __init__(self, helpers, backend):
+        """ Initializes the class.
+
+        Args:
+            helpers (:obj:`helpers`): The agent helpers.
+            backend (str): The backend name, hiascdi.
+        """
+
+        self.helpers = helpers
+        self.backend = backend
+        self.program = "HIAS Compression Module"
+
+        self.confs = self.helpers.confs["agent"]["compression"][backend]
+
+        self.enabled = self.confs["enabled"]
+        self.algorithm = self.confs["algorithm"]
+        self.level = self.confs["level"]
+
+        if self.algorithm == "zstd" and zstandard is None:
+            self.helpers.logger.warning(
+                "zstandard is not installed, " + backend +
+                " bodies will be compressed with gzip.")
+            self.algorithm = "gzip"
+
+        if self.algorithm == "zstd":
+            self.compressor = zstandard.ZstdCompressor(level=self.level)
+
+    def compress(self, body):
+        """ Compresses a body with the configured algorithm. """
+
+        if self.algorithm == "zstd":
+            return self.compressor.compress(body)
+
+        return gzip.compress(body, compresslevel=self.level)
+
+    def encode(self, body):
+        """ Encodes a request body.
+
+        Args:
+            body (str): The JSON body.
+
+        Returns:
+            tuple: The body to send and the headers to add to the request.
+        """
+
+        body = body.encode("utf-8")
+
+        if not self.enabled or len(body) < self.confs["minSize"]:
+            return body, {}
+
+        labels = {"backend": self.backend, "algorithm": self.algorithm}
+
+        start = time.thread_time()
+        compressed = self.compress(body)
+        self.helpers.metrics.increment(
+            "compression_cpu_seconds", labels, time.thread_time() - start)
+
+        self.helpers.metrics.increment(
+            "compression_bytes_raw", labels, len(body))
+        self.helpers.metrics.increment(
+            "compression_bytes_sent", labels, len(compressed))
+
+        return compressed, {"Content-Encoding": self.algorithm}
+
+    def rejected(self, response, headers):
+        """ Disables compression if the backend rejected an encoded body.
+
+        Args:
+            response (:obj:`requests.Response`): The backend response.
+            headers (dict): The headers returned by encode.
+
+        Returns:
+            bool: True if the body must be resent uncompressed.
+        """
+
+        if "Content-Encoding" not in headers or response.status_code != 415:
+            return False
+
+        if self.enabled:
+            self.enabled = False
+            self.helpers.metrics.increment(
+                "compression_rejected", {"backend": self.backend})
+            self.helpers.logger.warning(
+                self.backend + " does not accept " + self.algorithm +
+                " bodies, compression disabled.")
+
+        return True
@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+""" HIAS Dead Letter Module
+
+This module stores the HIASCDI and HIASHDI writes that exhausted their retries
+so that they can be inspected and replayed later.
+
+MIT License
+
+Copyright (c) 2023 Peter Moss Leukaemia MedTech Research CIC
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files(the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and / or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+
+Contributors:
+- Adam Milton-Barker
+
+"""
+
+
+import json
+import os
+import threading
+
+
+class deadletter():
+    """ HIAS Dead Letter Module
+
+    Dead letters are appended as JSON lines to one file per backend in the
+    deadletter directory of the agent data path. Each file is bounded by the configured maximum
+    size, letters beyond it are dropped and counted.
+    """
+
+    def __init__(self, helpers):
+        """ Initializes the class. """
+
+        self.helpers = helpers
+        self.program = "HIAS Dead Letter Module"
+
+        self.confs = self.helpers.confs["agent"]["deadletter"]
+        self.path = self.helpers.data("deadletter")
+
+        self.lock = threading.Lock()
+
+    def file(self, backend):
+        """ Returns the dead letter file of a backend. """
+
+        return self.path + backend + ".jsonl"
+
+    def backends(self):
+        """ Returns the backends that have dead letters. """
+
+        if not os.path.isdir(self.path):
+            return []
+
+        return sorted(f[:-6] for f in os.listdir(self.path)
+                      if f.endswith(".jsonl"))
+
+    def add(self, record):
+        """ Stores a dead letter.
+
+        Args:
+            record (dict): The failed write, see retry.schedule.
+
+        Returns:
+            bool: False if the store is full and the letter was dropped.
+        """
+
+        line = json.dumps(record, default=str) + "\n"
+        path = self.file(record["backend"])
+
+        with self.lock:
+            size = os.path.getsize(path) if os.path.exists(path) else 0
+            if size + len(line) > self.confs["maxBytes"]:
+                self.helpers.metrics.increment(
+                    "deadletter_dropped", {"backend": record["backend"]})
+                self.helpers.logger.error(
+                    record["backend"] + " dead letter store full, " +
+                    record["operation"] + " dropped")
+                return False
+
+            os.makedirs(self.path, exist_ok=True)
+            with open(path, "a") as letters:
+                letters.write(line)
+
+        self.helpers.metrics.increment(
+            "deadletter_added", {"backend": record["backend"]})
+        self.helpers.logger.error(
+            record["backend"] + " " + record["operation"] +
+            " moved to dead letters after " + str(record["attempts"]) +
+            " attempts")
+
+        return True
+
+    def read(self, backend):
+        """ Returns the dead letters of a backend. """
+
+        path = self.file(backend)
+        if not os.path.exists(path):
+            return []
+
+        with self.lock:
+            with open(path) as letters:
+                return [json.loads(line) for line in letters if line.strip()]
+
+    def replay(self, backend, handler):
+        """ Replays the dead letters of a backend.
+
+        Letters the handler fails to write are stored again.
+
+        Args:
+            backend (str): The backend.
+            handler (function): Called with each letter, returns True when
+                the write succeeded.
+
+        Returns:
+            tuple: The number of letters replayed and failed.
+        """
+
+        path = self.file(backend)
+        replaying = path + ".replaying"
+
+        with self.lock:
+            if not os.path.exists(path):
+                return 0, 0
+            os.replace(path, replaying)
+
+        with open(replaying) as letters:
+            records = [json.loads(line) for line in letters if line.strip()]
+
+        replayed = failed = 0
+        for record in records:
+            if handler(record):
+                replayed += 1
+            else:
+                failed += 1
+                self.add(record)
+
+        os.remove(replaying)
+
+        return replayed, failed
+
+    def purge(self, backend):
+        """ Deletes the dead letters of a backend.
+
+        Returns:
+            int: The number of letters deleted.
+        """
+
+        count = len(self.read(backend))
+
+        with self.lock:
+            if os.path.exists(self.file(backend)):
+                os.remove(self.file(backend))
+
+        return count
@@ -0,0 +1,212 @@
+#!/usr/bin/env python3
+""" HIAS Deduplication Module
+
+Detects repeated iotJumpWay messages with a rotating Bloom filter of fixed
+size.
+
+MIT License
+
+Copyright (c) 2023 Peter Moss Leukaemia MedTech Research CIC
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files(the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and / or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+
+Contributors:
+- Adam Milton-Barker
+
+"""
+
+
+import hashlib
+import math
+import threading
+import time
+
+
+class DuplicateException(Exception):
+    """ Raised when a message has already been processed. """
+
+
+class bloom():
+    """ A Bloom filter over a fixed size bytearray.
+
+    Each key is hashed once with BLAKE2b and the two halves of the digest
+    generate the bit positions (double hashing).
+    """
+
+    def __init__(self, capacity, error_rate):
+        """ Initializes the filter.
+
+        Args:
+            capacity (int): The number of keys the filter is sized for.
+            error_rate (float): The false positive rate at capacity.
+        """
+
+        self.bits = max(8, int(math.ceil(
+            -capacity * math.log(error_rate) / math.log(2) ** 2)))
+        self.hashes = max(1, int(round(
+            self.bits / capacity * math.log(2))))
+        self.array = bytearray((self.bits + 7) // 8)
+        self.count = 0
+
+    def positions(self, digest):
+        """ Returns the byte index and bit mask of each key position. """
+
+        first = int.from_bytes(digest[:8], "little") % self.bits
+        second = (int.from_bytes(digest[8:], "little") | 1) % self.bits
+        bits = self.bits
+        positions = []
+
+        for _ in range(self.hashes):
+            positions.append((first >> 3, 1 << (first & 7)))
+            first = (first + second) % bits
+
+        return positions
+
+    def contains(self, positions):
+        """ Returns True if every position is set. """
+
+        array = self.array
+        for index, mask in positions:
+            if not array[index] & mask:
+                return False
+
+        return True
+
+    def add(self, positions):
+        """ Sets every position. """
+
+        array = self.array
+        for index, mask in positions:
+            array[index] |= mask
+
+        self.count += 1
+
+
+class dedup():
+    """ HIAS Deduplication Module
+
+    A message with a device sequence number is a duplicate if its topic and
+    sequence number were already handled. A message without one is only
+    checked when the broker marks it as a redelivery (the MQTT dup flag),
+    so a sensor repeating the same reading is never suppressed.
+
+    Keys are only remembered once their message has been handled, in the
+    current filter. Every window seconds, or when the current filter
+    reaches its capacity, it becomes the previous filter and a new one is
+    started, so a key is remembered for between one and two windows and
+    memory stays fixed at two filters.
+    """
+
+    def __init__(self, helpers):
+        """ Initializes the class. """
+
+        self.helpers = helpers
+        self.program = "HIAS Deduplication Module"
+
+        self.confs = self.helpers.confs["agent"]["dedup"]
+
+        self.current = self.filter()
+        self.previous = self.filter()
+        self.rotated = time.monotonic()
+        self.lock = threading.Lock()
+        self.local = threading.local()
+
+        self.helpers.logger.info(
+            self.program + " initialization complete.")
+
+    def filter(self):
+        """ Creates an empty filter. """
+
+        return bloom(self.confs["capacity"], self.confs["errorRate"])
+
+    def rotate(self, now):
+        """ Starts a new filter if the current one is full or too old. """
+
+        if now - self.rotated >= self.confs["window"] or \
+                self.current.count >= self.confs["capacity"]:
+            self.previous = self.current
+            self.current = self.filter()
+            self.rotated = now
+
+    def received(self, redelivery):
+        """ Notes whether the message this thread is about to handle was
+        redelivered by the broker.
+
+        Args:
+            redelivery (bool): The MQTT dup flag of the message.
+        """
+
+        self.local.redelivery = redelivery
+
+    def begin(self):
+        """ Forgets the key of the previous message handled by this thread. """
+
+        self.local.positions = None
+
+    def duplicate(self, topic, payload, sequence=None):
+        """ Checks a message. Its key is remembered by record() once the
+        message has been handled.
+
+        Args:
+            topic (str): The topic, which identifies the entity and channel.
+            payload (bytes): The raw payload.
+            sequence: A sequence number sent by the device, used instead of
+                the payload when present.
+
+        Returns:
+            bool: True if the message was already handled in the last
+                window.
+        """
+
+        redelivery = getattr(self.local, "redelivery", False)
+        self.local.redelivery = False
+
+        digest = hashlib.blake2b(topic.encode("utf-8"), digest_size=16)
+        digest.update(b"\0")
+        if sequence is not None:
+            digest.update(b"\1")
+            digest.update(str(sequence).encode("utf-8"))
+        else:
+            digest.update(b"\2")
+            digest.update(payload)
+
+        positions = self.current.positions(digest.digest())
+        self.local.positions = positions
+
+        if sequence is None and not redelivery:
+            return False
+
+        with self.lock:
+            self.rotate(time.monotonic())
+
+            return self.current.contains(positions) or \
+                self.previous.contains(positions)
+
+    def record(self):
+        """ Remembers the key of the message this thread has just handled. """
+
+        positions = getattr(self.local, "positions", None)
+        if positions is None:
+            return
+
+        self.local.positions = None
+
+        with self.lock:
+            self.rotate(time.monotonic())
+            self.current.add(positions)
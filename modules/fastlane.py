@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+""" HIAS Fast Lane Module
+
+Runs the HIASCDI, HIASHDI and Integrity writes of commands and actuator
+states after the device facing work is done, with failure tracking.
+
+MIT License
+
+Copyright (c) 2023 Peter Moss Leukaemia MedTech Research CIC
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files(the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and / or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+
+Contributors:
+- Adam Milton-Barker
+
+"""
+
+
+import itertools
+import threading
+import time
+
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+
+class fastlane():
+    """ HIAS Fast Lane Module
+
+    Writes run on lanes of one thread each. Writes with the same key, the
+    entity they update, always run on the same lane, so they are applied in
+    the order they were submitted. When queue writes are waiting on a lane
+    the caller waits for that lane, holding back the MQTT loop rather than
+    growing the queue. Writes still queued at shutdown are returned to be
+    spilled.
+    """
+
+    def __init__(self, helpers):
+        """ Initializes the class. """
+
+        self.helpers = helpers
+        self.program = "HIAS Fast Lane Module"
+
+        self.confs = self.helpers.confs["agent"]["fastlane"]
+
+        self.lanes = [ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix="FastLane")
+            for _ in range(self.confs["lanes"])]
+        self.waiting = [0] * len(self.lanes)
+        self.queued = {}
+        self.sequence = itertools.count()
+
+        self.pending = 0
+        self.completed = 0
+        self.failed = 0
+        self.failures = deque(maxlen=self.confs["failures"])
+        self.condition = threading.Condition()
+
+        self.helpers.logger.info(
+            self.program + " initialization complete.")
+
+    def submit(self, key, operation, function, *args):
+        """ Runs a write after the caller has returned.
+
+        Args:
+            key (str): The entity the write updates.
+            operation (str): The operation name, used in failures.
+            function (function): The write, failed if it raises or
+                returns False.
+            *args: The JSON serializable write arguments.
+        """
+
+        lane = hash(key) % len(self.lanes)
+        record = {
+            "backend": "fastlane",
+            "operation": operation,
+            "args": list(args),
+            "attempts": 0,
+            "created": time.time()
+        }
+
+        with self.condition:
+            if self.waiting[lane] >= self.confs["queue"]:
+                self.helpers.metrics.increment(
+                    "fastlane_saturated", {"operation": operation})
+                while self.waiting[lane] >= self.confs["queue"]:
+                    self.condition.wait()
+
+            self.waiting[lane] += 1
+            self.pending += 1
+            sequence = next(self.sequence)
+            self.queued[sequence] = (self.lanes[lane].submit(
+                self.run, sequence, lane, key, operation, function, args),
+                record)
+
+    def run(self, sequence, lane, key, operation, function, args):
+        """ Runs a write and records its outcome. """
+
+        error = None
+        try:
+            if function(*args) == False:
+                error = "Write failed"
+        except Exception as e:
+            error = type(e).__name__ + ": " + str(e)
+
+        with self.condition:
+            self.queued.pop(sequence, None)
+            self.waiting[lane] -= 1
+            self.pending -= 1
+            if error is None:
+                self.completed += 1
+            else:
+                self.failed += 1
+                self.failures.append({
+                    "Operation": operation,
+                    "Entity": key,
+                    "Error": error,
+                    "Time": time.time()
+                })
+            self.condition.notify_all()
+
+        self.helpers.metrics.increment("fastlane_writes", {
+            "operation": operation, "status": "OK" if error is None else "KO"})
+
+        if error is not None:
+            self.helpers.logger.error(
+                operation + " " + key + " write after publish KO: " + error)
+
+    def stop(self, deadline):
+        """ Waits for the queued writes until the deadline.
+
+        Args:
+            deadline (float): The time.monotonic() to stop waiting at.
+
+        Returns:
+            tuple: The number of writes that finished while waiting, and
+                the records of the writes that had not started.
+        """
+
+        with self.condition:
+            waiting = self.pending
+            while self.pending and time.monotonic() < deadline:
+                self.condition.wait(deadline - time.monotonic())
+
+            left = [record for future, record in self.queued.values()
+                    if future.cancel()]
+            self.pending -= len(left)
+            running = self.pending
+            self.queued = {}
+
+        for lane in self.lanes:
+            lane.shutdown(wait=False)
+
+        if running:
+            self.helpers.logger.error(
+                str(running) + " writes after publish unfinished at shutdown.")
+
+        return waiting - running - len(left), left
+
+    def report(self):
+        """ Returns the write counts and the most recent failures. """
+
+        with self.condition:
+            return {
+                "Pending": self.pending,
+                "Completed": self.completed,
+                "Failed": self.failed,
+                "Failures": list(self.failures)
+            }
@@ -39,6 +39,8 @@ import time
 
 from datetime import datetime
 
+from modules.metrics import metrics
+
 
 class helpers():
     """ Helper Class
@@ -53,6 +55,9 @@ class helpers():
         self.confs = {}
         self.load_confs()
 
+        # Shared agent metrics
+        self.metrics = metrics()
+
         # Sets system logging
         self.logger = logging.getLogger(ltype)
         self.logger.setLevel(logging.INFO)
@@ -94,3 +99,19 @@ class helpers():
 
         with open(os.path.dirname(os.path.abspath(__file__)) + '/../configuration/config.json') as confs:
             self.confs = json.loads(confs.read())
+
+    def data(self, name):
+        """ Returns the path of a directory in the agent data path.
+
+        The directory is not created, the caller creates it when it first
+        writes to it.
+
+        Args:
+            name (str): The directory name.
+        """
+
+        path = self.confs["agent"]["data"]
+        if not os.path.isabs(path):
+            path = os.path.dirname(os.path.abspath(__file__)) + '/../' + path
+
+        return os.path.join(path, name, '')
@@ -36,7 +36,8 @@ import sys
 import time
 
 from requests.auth import HTTPBasicAuth
-from web3 import Web3
+
+from modules.resilience import resilience
 
 
 class hiasbch():
@@ -53,26 +54,59 @@ class hiasbch():
         self.confs = self.helpers.confs
         self.credentials = self.helpers.credentials
 
+        self.batch = None
+        self.mirror = None
+        self.resilience = resilience(self.helpers, "hiasbch")
+
         self.helpers.logger.info("HIASBCH Class initialization complete.")
 
     def start(self):
         """ Connects to HIASBCH. """
 
+        self.endpoint = "http://" + self.credentials["server"]["host"] + \
+            self.credentials["hiasbch"]["endpoint"]
+
+        from web3 import Web3
+
         self.w3 = Web3(Web3.HTTPProvider(
-            "http://" + self.credentials["server"]["host"] + self.credentials["hiasbch"]["endpoint"], request_kwargs={
+            self.endpoint, request_kwargs={
                         'auth': HTTPBasicAuth(self.credentials["iotJumpWay"]["entity"],
-                                              self.confs["agent"]["proxy"]["up"])}))
+                                              self.confs["agent"]["proxy"]["up"]),
+                        'timeout': self.resilience.timeout("default")}))
         self.iotContract = self.w3.eth.contract(
             self.w3.toChecksumAddress(self.credentials["hiasbch"]["contracts"]["iotJumpWay"]["contract"]),
             abi=json.dumps(self.credentials["hiasbch"]["contracts"]["iotJumpWay"]["abi"]))
         self.helpers.logger.info("HIASBCH connections started")
 
+    def ping(self):
+        """ Checks that the HIASBCH node is answering. """
+
+        return self.resilience.call("ping", self.w3.isConnected)
+
     def iotjumpway_access_check(self, address):
-        """ Checks sender is allowed access to the iotJumpWay Smart Contract """
+        """ Checks sender is allowed access to the iotJumpWay Smart Contract
+
+        When a mirror is attached the check is answered from the local
+        access list. When a batch module is attached the check is sent with
+        the next JSON-RPC batch, otherwise the contract is called now.
+        """
 
         self.helpers.logger.info("HIASBCH checking " + address)
-        if not self.iotContract.functions.accessAllowed(
-                    self.w3.toChecksumAddress(address)).call({
+
+        if self.mirror is not None:
+            return self.mirror.check(address)
+
+        if self.batch is not None:
+            return self.batch.check(address)
+
+        return self.contract_access_check(address)
+
+    def contract_access_check(self, address):
+        """ Calls the iotJumpWay Smart Contract accessAllowed function """
+
+        if not self.resilience.call(
+                "access_check", self.iotContract.functions.accessAllowed(
+                    self.w3.toChecksumAddress(address)).call, {
                         'from': self.w3.toChecksumAddress(self.credentials["hiasbch"]["un"])}):
             return False
         else:
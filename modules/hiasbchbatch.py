@@ -0,0 +1,247 @@
+#!/usr/bin/env python3
+""" HIASBCH Batch Module
+
+This module collects concurrent iotJumpWay accessAllowed checks over a short
+window and sends them to HIASBCH as one JSON-RPC batch of eth_call requests.
+
+MIT License
+
+Copyright (c) 2023 Peter Moss Leukaemia MedTech Research CIC
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files(the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and / or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+
+Contributors:
+- Adam Milton-Barker
+
+"""
+
+
+import json
+import requests
+import threading
+import time
+
+from requests.auth import HTTPBasicAuth
+
+from modules.resilience import CircuitOpenException
+
+
+class hiasbchbatch():
+    """ HIASBCH Batch Module
+
+    A check waiting alone is sent at once. Checks from concurrent
+    messages, those that arrive together or while a batch is being sent,
+    are collected for at most a short window, checks for the same address
+    are shared, and all of them are sent as one JSON-RPC batch. If the
+    batch fails, or one of its calls returns an error, the affected checks
+    fall back to single contract calls.
+    """
+
+    def __init__(self, helpers, hiasbch):
+        """ Initializes the class. """
+
+        self.helpers = helpers
+        self.hiasbch = hiasbch
+        self.program = "HIASBCH Batch Module"
+
+        self.confs = self.helpers.confs["agent"]["hiasbch"]["batch"]
+        self.window = self.confs["window"]
+        self.size = self.confs["size"]
+
+        self.auth = HTTPBasicAuth(
+            self.helpers.credentials["iotJumpWay"]["entity"],
+            self.helpers.confs["agent"]["proxy"]["up"])
+
+        self.pending = {}
+        self.lock = threading.Lock()
+        self.wakeup = threading.Event()
+        self.full = threading.Event()
+        self.running = False
+
+        self.helpers.logger.info(
+            self.program + " initialization complete.")
+
+    def start(self):
+        """ Starts the batch flush thread. """
+
+        self.running = True
+        threading.Thread(target=self.run, daemon=True).start()
+
+        self.helpers.logger.info(
+            self.program + " started.")
+
+    def stop(self):
+        """ Stops the batch flush thread and sends the pending checks.
+
+        Returns:
+            int: The number of addresses checked.
+        """
+
+        self.running = False
+        self.wakeup.set()
+        self.full.set()
+
+        return self.flush()
+
+    def check(self, address):
+        """ Checks an address is allowed access, waiting for its batch.
+
+        Args:
+            address (str): The blockchain address of the entity.
+
+        Returns:
+            bool: True if the address is allowed access.
+        """
+
+        with self.lock:
+            entry = self.pending.get(address)
+            if entry is None:
+                entry = self.pending[address] = {
+                    "event": threading.Event(),
+                    "allowed": False,
+                    "deadline": 0
+                }
+                if len(self.pending) == 1:
+                    self.wakeup.set()
+                if len(self.pending) >= self.size:
+                    self.full.set()
+
+        # Until its batch is sent, the check may wait for the window and a
+        # batch already being sent. Once it is being sent, the deadline set
+        # by flush covers the batch call and the single call fallback of
+        # every address.
+        deadline = time.monotonic() + self.window + \
+            self.hiasbch.resilience.timeout("access_check") * (self.size + 1)
+        while not entry["event"].wait(max(0, deadline - time.monotonic())):
+            if entry["deadline"] <= deadline:
+                self.helpers.logger.error(
+                    "HIASBCH batched access check timed out for " + address)
+                return False
+            deadline = entry["deadline"]
+
+        return entry["allowed"]
+
+    def run(self):
+        """ Sends the pending checks, at once if only one is waiting,
+        otherwise when the batch is full or after the window.
+        """
+
+        while self.running:
+            self.wakeup.wait()
+            self.wakeup.clear()
+            with self.lock:
+                lingering = 1 < len(self.pending) < self.size
+            if lingering:
+                self.full.wait(self.window)
+            self.full.clear()
+            self.flush()
+
+    def flush(self):
+        """ Sends all pending access checks as one JSON-RPC batch. """
+
+        with self.lock:
+            if not self.pending:
+                return 0
+            pending = self.pending
+            self.pending = {}
+            if self.running:
+                self.wakeup.clear()
+
+        addresses = list(pending.keys())
+        deadline = time.monotonic() + \
+            self.hiasbch.resilience.timeout("access_check") * (
+                len(addresses) + 1)
+        for entry in pending.values():
+            entry["deadline"] = deadline
+        results = self.send(addresses)
+
+        for i, address in enumerate(addresses):
+            allowed = results.get(i)
+            if allowed is None:
+                try:
+                    allowed = self.hiasbch.contract_access_check(address)
+                except Exception as e:
+                    self.helpers.logger.error(
+                        "HIASBCH access check failed for " + address + ": " + str(e))
+                    allowed = False
+            pending[address]["allowed"] = allowed
+            pending[address]["event"].set()
+
+        self.helpers.metrics.increment("hiasbch_batches")
+        self.helpers.metrics.increment(
+            "hiasbch_batched_checks", value=len(addresses))
+
+        return len(addresses)
+
+    def send(self, addresses):
+        """ Sends one JSON-RPC batch of accessAllowed calls.
+
+        Args:
+            addresses (list): The addresses to check.
+
+        Returns:
+            dict: The result of each successful call by request id.
+        """
+
+        sender = self.hiasbch.w3.toChecksumAddress(
+            self.helpers.credentials["hiasbch"]["un"])
+        contract = self.hiasbch.iotContract.address
+
+        batch = []
+        for i, address in enumerate(addresses):
+            try:
+                data = self.hiasbch.iotContract.encodeABI(
+                    fn_name="accessAllowed",
+                    args=[self.hiasbch.w3.toChecksumAddress(address)])
+            except ValueError:
+                continue
+            batch.append({
+                "jsonrpc": "2.0",
+                "id": i,
+                "method": "eth_call",
+                "params": [{"from": sender, "to": contract, "data": data}, "latest"]
+            })
+
+        if not batch:
+            return {}
+
+        try:
+            response = self.hiasbch.resilience.call(
+                "access_check", requests.post, self.hiasbch.endpoint,
+                data=json.dumps(batch),
+                headers={"content-type": "application/json"}, auth=self.auth,
+                timeout=self.hiasbch.resilience.timeout("access_check"))
+            replies = response.json()
+        except (CircuitOpenException, requests.exceptions.RequestException,
+                ValueError) as e:
+            self.helpers.logger.error(
+                "HIASBCH batch access check failed: " + str(e))
+            return {}
+
+        if not isinstance(replies, list):
+            self.helpers.logger.error(
+                "HIASBCH batch access check rejected: " + response.text)
+            return {}
+
+        results = {}
+        for reply in replies:
+            if "result" in reply and reply["result"] not in (None, "0x"):
+                results[reply["id"]] = int(reply["result"], 16) != 0
+
+        return results
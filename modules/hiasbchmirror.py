@@ -0,0 +1,195 @@
+#!/usr/bin/env python3
+""" HIASBCH Mirror Module
+
+This module keeps a local mirror of the addresses allowed access by the
+iotJumpWay Smart Contract, built from its grant and revoke events, so that
+access checks can be answered from memory.
+
+MIT License
+
+Copyright (c) 2023 Peter Moss Leukaemia MedTech Research CIC
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files(the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and / or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+
+Contributors:
+- Adam Milton-Barker
+
+"""
+
+
+import threading
+import time
+
+
+class hiasbchmirror():
+    """ HIASBCH Mirror Module
+
+    The mirror is built by scanning the contract's grant and revoke event
+    logs from the configured block, pageSize blocks at a time, then kept
+    current by fetching the event logs of each new block. Addresses the
+    mirror does not know are checked with a live contract call, and so is
+    every address while the mirror has not synced for maxLag seconds.
+    """
+
+    def __init__(self, helpers, hiasbch):
+        """ Initializes the class. """
+
+        self.helpers = helpers
+        self.hiasbch = hiasbch
+        self.program = "HIASBCH Mirror Module"
+
+        self.confs = self.helpers.confs["agent"]["hiasbch"]["mirror"]
+
+        self.allowed = set()
+        self.revoked = set()
+        self.block = None
+        self.synced = None
+        self.lock = threading.Lock()
+        self.running = False
+
+        self.helpers.logger.info(
+            self.program + " initialization complete.")
+
+    def start(self):
+        """ Builds the mirror and starts following new blocks. """
+
+        latest = self.hiasbch.w3.eth.block_number
+        self.sync(self.confs["fromBlock"], latest)
+
+        self.helpers.logger.info(
+            self.program + " mirrored " + str(len(self.allowed)) +
+            " allowed addresses up to block " + str(latest))
+
+        self.running = True
+        threading.Thread(target=self.run, daemon=True).start()
+
+    def stop(self):
+        """ Stops following new blocks. """
+
+        self.running = False
+
+    def run(self):
+        """ Applies the grant and revoke events of new blocks. """
+
+        while self.running:
+            time.sleep(self.confs["poll"])
+            try:
+                latest = self.hiasbch.w3.eth.block_number
+                if latest > self.block:
+                    self.sync(self.block + 1, latest)
+                else:
+                    with self.lock:
+                        self.synced = time.monotonic()
+            except Exception as e:
+                self.helpers.logger.error(
+                    self.program + " sync failed: " + str(e))
+
+    def sync(self, from_block, to_block):
+        """ Applies the grant and revoke events of a range of blocks, one
+        page at a time.
+
+        Args:
+            from_block (int): The first block.
+            to_block (int): The last block.
+        """
+
+        for start in range(from_block, to_block + 1, self.confs["pageSize"]):
+            self.page(start, min(to_block, start + self.confs["pageSize"] - 1))
+
+        with self.lock:
+            self.block = to_block
+            self.synced = time.monotonic()
+
+        self.helpers.metrics.gauge("hiasbch_mirror_block", to_block)
+
+    def page(self, from_block, to_block):
+        """ Applies the grant and revoke events of a page of blocks. """
+
+        events = self.hiasbch.iotContract.events
+        logs = []
+
+        for name, granted in [(self.confs["grantEvent"], True),
+                              (self.confs["revokeEvent"], False)]:
+            for log in events[name].getLogs(
+                    fromBlock=from_block, toBlock=to_block):
+                logs.append((log["blockNumber"], log["logIndex"], granted,
+                             log["args"][self.confs["addressArg"]]))
+
+        logs.sort()
+
+        with self.lock:
+            for block, index, granted, address in logs:
+                address = address.lower()
+                if granted:
+                    self.allowed.add(address)
+                    self.revoked.discard(address)
+                else:
+                    self.allowed.discard(address)
+                    self.revoked.add(address)
+            self.block = to_block
+        self.helpers.metrics.gauge("hiasbch_mirror_allowed", len(self.allowed))
+
+    def stale(self):
+        """ Returns True if the mirror has not synced for maxLag seconds. """
+
+        return self.synced is None or \
+            time.monotonic() - self.synced > self.confs["maxLag"]
+
+    def live(self, address):
+        """ Checks an address with a live contract call. """
+
+        if self.hiasbch.batch is not None:
+            return self.hiasbch.batch.check(address)
+
+        return self.hiasbch.contract_access_check(address)
+
+    def check(self, address):
+        """ Checks an address is allowed access.
+
+        Args:
+            address (str): The blockchain address of the entity.
+
+        Returns:
+            bool: True if the address is allowed access.
+        """
+
+        key = address.lower()
+
+        if self.stale():
+            self.helpers.metrics.increment("hiasbch_mirror_stale")
+            return self.live(address)
+
+        if key in self.allowed:
+            self.helpers.metrics.increment("hiasbch_mirror_hits")
+            return True
+
+        if key in self.revoked:
+            self.helpers.metrics.increment("hiasbch_mirror_hits")
+            return False
+
+        self.helpers.metrics.increment("hiasbch_mirror_misses")
+
+        allowed = self.live(address)
+
+        if allowed:
+            with self.lock:
+                if key not in self.revoked:
+                    self.allowed.add(key)
+
+        return allowed
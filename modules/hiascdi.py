@@ -33,9 +33,14 @@ Contributors:
 
 import json
 import requests
+import threading
+import time
 
 from datetime import datetime
 
+from modules.compression import compression
+from modules.resilience import CircuitOpenException, resilience
+
 class hiascdi():
     """ HIASCDI Helper Module
 
@@ -57,8 +62,30 @@ class hiascdi():
         self.auth = (self.helpers.credentials["hiascdi"]["un"],
                     self.helpers.confs["agent"]["proxy"]["up"])
 
+        self.batch = None
+        self.retry = None
+        self.written = {}
+        self.lock = threading.Lock()
+
+        self.delta = self.helpers.confs["agent"]["hiascdi"]["delta"]
+        self.metadata = {}
+        self.resilience = resilience(self.helpers, "hiascdi")
+        self.compression = compression(self.helpers, "hiascdi")
+
         self.helpers.logger.info("HIASCDI initialization complete.")
 
+    def ping(self):
+        """ Checks that HIASCDI is answering. """
+
+        api_url = "http://" + self.helpers.credentials["server"]["host"] + "/" + \
+                    self.helpers.credentials["hiascdi"]["endpoint"]
+
+        response = self.resilience.call(
+            "ping", requests.get, api_url, headers=self.headers,
+            auth=self.auth, timeout=self.resilience.timeout("ping"))
+
+        return response.status_code < 500
+
     def get_attributes(self, entity_type, entity):
         """ Gets required attributes. """
 
@@ -72,7 +99,9 @@ class hiascdi():
         api_endpoint = "/entities/" + entity + "?type=" + entity_type + params
         api_url = api_host + api_endpoint
 
-        response = requests.get(api_url, headers=self.headers, auth=self.auth)
+        response = self.resilience.hedged(
+            "get_attributes", requests.get, api_url, headers=self.headers,
+            auth=self.auth, timeout=self.resilience.timeout("get_attributes"))
 
         return json.loads(response.text)
 
@@ -84,25 +113,236 @@ class hiascdi():
         api_endpoint = "/entities/" + entity + "?type=" + entity_type
         api_url = api_host + api_endpoint
 
-        response = requests.get(api_url, headers=self.headers, auth=self.auth)
+        response = self.resilience.hedged(
+            "get_entity", requests.get, api_url, headers=self.headers,
+            auth=self.auth, timeout=self.resilience.timeout("get_entity"))
 
         return json.loads(response.text)
 
     def update_entity(self, _id, typer, data):
-        """ Updates an entity. """
+        """ Updates an entity.
+
+        When a batch writer is attached the update is queued and sent
+        with the next NGSI v2 batch update, otherwise it is sent now.
+        """
+
+        if self.batch is not None:
+            return self.batch.queue(_id, typer, data)
+
+        return self.send_update(_id, typer, data)
+
+    def send_update(self, _id, typer, data, retry=True, sent=None):
+        """ Sends a single entity update to HIASCDI.
+
+        Failed updates are scheduled for retry when a retry scheduler is
+        attached and retry is True. sent is the time the update was first
+        sent, for retries.
+        """
+
+        if sent is None:
+            sent = time.time()
 
         api_url = "http://" + self.helpers.credentials["server"]["host"] + "/" + \
                     self.helpers.credentials["hiascdi"]["endpoint"] + \
                     "/entities/" + _id + "/attrs?type=" + typer
 
-        response = requests.post(api_url, data=json.dumps(
-            data), headers=self.headers, auth=self.auth)
+        try:
+            response = self.post("update_entity", api_url, json.dumps(data))
+        except (CircuitOpenException, requests.exceptions.RequestException) as e:
+            self.helpers.logger.error(
+                "HIASCDI update failed: " + str(e))
+            response = None
+
+        if response is not None and response.status_code == 204:
+            self.wrote(_id, data, sent)
+            return True
+
+        if retry and self.retry is not None:
+            self.retry.schedule(
+                "hiascdi", "update_entity", [_id, typer, data, sent])
+
+        return False
+
+    def wrote(self, _id, data, sent):
+        """ Remembers when the attributes written to an entity were sent. """
+
+        with self.lock:
+            for name in data:
+                key = (_id, name)
+                if self.written.get(key, 0) < sent:
+                    self.written[key] = sent
+
+    def unwritten(self, _id, data, sent):
+        """ Returns the attributes of an update sent at sent that no newer
+        update has written since.
+        """
+
+        with self.lock:
+            return {name: value for name, value in data.items()
+                    if self.written.get((_id, name), 0) <= sent}
+
+    def unmodified(self, _id, typer, data, sent):
+        """ Returns the attributes of an update sent at sent that HIASCDI
+        has not modified since.
+
+        Each attribute is compared with its timestamp metadata, or with the
+        entity's dateModified if it has none.
+        """
+
+        entity = self.get_entity(typer, _id)
+        modified = self.modified(entity.get("dateModified"))
+
+        kept = {}
+        for name, value in data.items():
+            attribute = entity.get(name.split(".")[0])
+            stamp = modified
+            if isinstance(attribute, dict):
+                stamp = self.modified(
+                    attribute.get("metadata", {}).get("timestamp"), stamp)
+            if stamp is None or stamp <= sent:
+                kept[name] = value
+
+        return kept
+
+    def modified(self, attribute, default=None):
+        """ Returns the time of a DateTime attribute, or default. """
+
+        try:
+            return datetime.fromisoformat(attribute["value"]).timestamp()
+        except (KeyError, TypeError, ValueError):
+            return default
+
+    def post(self, operation, api_url, body):
+        """ Posts a JSON body to HIASCDI, compressed when enabled.
+
+        If HIASCDI rejects the compressed body it is resent uncompressed.
+        """
+
+        data, encoding = self.compression.encode(body)
+
+        response = self.resilience.call(
+            operation, requests.post, api_url, data=data,
+            headers=dict(self.headers, **encoding), auth=self.auth,
+            timeout=self.resilience.timeout(operation))
+
+        if self.compression.rejected(response, encoding):
+            response = self.resilience.call(
+                operation, requests.post, api_url, data=body.encode("utf-8"),
+                headers=self.headers, auth=self.auth,
+                timeout=self.resilience.timeout(operation))
+
+        return response
+
+    def batch_update(self, entities, action="append"):
+        """ Updates many entities with one NGSI v2 batch operation.
+
+        Args:
+            entities (list): NGSI v2 entities, each with id, type and the
+                attributes to update.
+            action (str): The batch actionType, append or update.
+        """
+
+        api_url = "http://" + self.helpers.credentials["server"]["host"] + "/" + \
+                    self.helpers.credentials["hiascdi"]["endpoint"] + \
+                    "/op/update"
+        sent = time.time()
+
+        try:
+            response = self.post("batch_update", api_url, json.dumps({
+                "actionType": action,
+                "entities": entities
+            }))
+        except (CircuitOpenException, requests.exceptions.RequestException) as e:
+            self.helpers.logger.error(
+                "HIASCDI batch update failed: " + str(e))
+            return False
 
         if response.status_code == 204:
+            for entity in entities:
+                self.wrote(entity["id"], [name for name in entity
+                                          if name not in ("id", "type")], sent)
             return True
         else:
             return False
 
+    def metadata_cached(self, entity_type, entity, name):
+        """ Returns the cached type and metadata of an entity attribute.
+
+        Returns None when delta patches are disabled, or the attribute is
+        not cached or was cached more than ttl seconds ago.
+
+        Args:
+            entity_type (str): The entity type.
+            entity (str): The entity id.
+            name: The attribute key.
+        """
+
+        if not self.delta["enabled"]:
+            return None
+
+        cached = self.metadata.get((entity_type, entity, name))
+        if cached is None or \
+                time.monotonic() - cached["cached"] > self.delta["ttl"]:
+            return None
+
+        return cached
+
+    def metadata_evict(self):
+        """ Empties the metadata cache.
+
+        Returns:
+            int: The number of attributes evicted.
+        """
+
+        evicted = len(self.metadata)
+        self.metadata = {}
+
+        return evicted
+
+    def metadata_changed(self, entity_type, entity, name, attribute):
+        """ Caches the type and metadata of an entity attribute.
+
+        Args:
+            entity_type (str): The entity type.
+            entity (str): The entity id.
+            name: The attribute key.
+            attribute (dict): The full attribute patch.
+
+        Returns:
+            bool: True if delta patches are disabled, or the type or
+                metadata (ignoring the timestamp) differ from the cache.
+        """
+
+        if not self.delta["enabled"]:
+            return True
+
+        metadata = {key: value for key, value in
+                    attribute["metadata"].items() if key != "timestamp"}
+        key = (entity_type, entity, name)
+        cached = self.metadata.get(key)
+
+        self.metadata[key] = {
+            "type": attribute["type"],
+            "metadata": metadata,
+            "cached": time.monotonic()
+        }
+
+        return cached is None or cached["type"] != attribute["type"] or \
+            cached["metadata"] != metadata
+
+    def entity_value_data(self, attribute, value):
+        """ Builds an attribute patch with only its value and timestamp. """
+
+        return {
+            "value": value,
+            "type": attribute["type"],
+            "metadata": {
+                "timestamp": {
+                    "value": datetime.now().isoformat()
+                }
+            }
+        }
+
     def get_sensors(self, _id, typeof):
         """ Gets sensor list. """
 
@@ -110,7 +350,9 @@ class hiascdi():
                     self.helpers.credentials["hiascdi"]["endpoint"] + \
                     "/entities/" + _id + "?type=" + typeof + "&attrs=sensors"
 
-        response = requests.get(api_url, headers=self.headers, auth=self.auth)
+        response = self.resilience.call(
+            "get_sensors", requests.get, api_url, headers=self.headers,
+            auth=self.auth, timeout=self.resilience.timeout("get_sensors"))
 
         return json.loads(response.text)
 
@@ -121,7 +363,9 @@ class hiascdi():
                     self.helpers.credentials["hiascdi"]["endpoint"] + \
                     "/entities/" + _id + "?type=" + typeof + "&attrs=actuators"
 
-        response = requests.get(api_url, headers=self.headers, auth=self.auth)
+        response = self.resilience.call(
+            "get_actuators", requests.get, api_url, headers=self.headers,
+            auth=self.auth, timeout=self.resilience.timeout("get_actuators"))
 
         return json.loads(response.text)
 
@@ -132,7 +376,9 @@ class hiascdi():
                     self.helpers.credentials["hiascdi"]["endpoint"] + \
                     "/entities/" + _id + "?type=" + typeof + "&attrs=models"
 
-        response = requests.get(api_url, headers=self.headers, auth=self.auth)
+        response = self.resilience.call(
+            "get_ai_models", requests.get, api_url, headers=self.headers,
+            auth=self.auth, timeout=self.resilience.timeout("get_ai_models"))
 
         return json.loads(response.text)
     
@@ -0,0 +1,183 @@
+#!/usr/bin/env python3
+""" HIASCDI Batch Module
+
+This module collects HIASCDI entity updates over a short window and sends
+them to the HIASCDI Context Data Interface as one NGSI v2 batch update.
+
+MIT License
+
+Copyright (c) 2023 Peter Moss Leukaemia MedTech Research CIC
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files(the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and / or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+
+Contributors:
+- Adam Milton-Barker
+
+"""
+
+
+import threading
+import time
+
+from modules.adaptive import adaptive
+
+
+class hiascdibatch():
+    """ HIASCDI Batch Module
+
+    This module collects HIASCDI entity updates over a short window and
+    sends them to HIASCDI as one NGSI v2 batch update, falling back to
+    single entity updates if the batch update fails.
+    """
+
+    def __init__(self, helpers, hiascdi):
+        """ Initializes the class. """
+
+        self.helpers = helpers
+        self.hiascdi = hiascdi
+        self.program = "HIASCDI Batch Module"
+
+        self.confs = self.helpers.confs["agent"]["hiascdi"]["batch"]
+        self.action = self.confs["action"]
+        self.window = self.confs["window"]
+        self.size = self.confs["size"]
+
+        self.adaptive = None
+        if self.confs["adaptive"]["enabled"]:
+            self.adaptive = adaptive(
+                self.helpers, "hiascdi", self.confs["adaptive"],
+                self.size, self.window)
+            self.size = self.adaptive.size
+            self.window = self.adaptive.window
+
+        self.pending = {}
+        self.arrived = 0
+        self.lock = threading.Lock()
+        self.wakeup = threading.Event()
+        self.running = False
+
+        self.helpers.logger.info(
+            self.program + " initialization complete.")
+
+    def start(self):
+        """ Starts the batch flush thread. """
+
+        self.running = True
+        threading.Thread(target=self.run, daemon=True).start()
+
+        self.helpers.logger.info(
+            self.program + " started.")
+
+    def stop(self):
+        """ Stops the batch flush thread and flushes pending updates.
+
+        Returns:
+            int: The number of entities sent.
+        """
+
+        self.running = False
+        self.wakeup.set()
+        return self.flush()
+
+    def queue(self, _id, typer, data):
+        """ Queues an entity update for the next batch.
+
+        Updates for the same entity within a window are merged, later
+        attribute values replace earlier ones.
+
+        Args:
+            _id (str): The entity id.
+            typer (str): The entity type.
+            data (dict): The attributes to update.
+        """
+
+        with self.lock:
+            self.arrived += 1
+            key = (typer, _id)
+            if key in self.pending:
+                self.pending[key].update(data)
+            else:
+                self.pending[key] = dict(data)
+            full = len(self.pending) >= self.size
+
+        if full:
+            self.wakeup.set()
+
+        return True
+
+    def run(self):
+        """ Flushes pending updates every window or when a batch is full. """
+
+        while self.running:
+            self.wakeup.wait(self.window)
+            self.wakeup.clear()
+            self.flush()
+
+    def flush(self):
+        """ Sends all pending updates to HIASCDI.
+
+        Returns:
+            int: The number of entities sent.
+        """
+
+        with self.lock:
+            if not self.pending:
+                return 0
+            pending = self.pending
+            self.pending = {}
+
+        entities = []
+        for (typer, _id), attrs in pending.items():
+            entity = {"id": _id, "type": typer}
+            entity.update(attrs)
+            entities.append(entity)
+
+        sent = 0
+        while sent < len(entities):
+            chunk = entities[sent:sent + self.size]
+            sent += len(chunk)
+            start = time.monotonic()
+
+            ok = self.hiascdi.batch_update(chunk, self.action)
+
+            if self.adaptive is not None:
+                with self.lock:
+                    arrived = self.arrived
+                    self.arrived = 0
+                self.size, self.window = self.adaptive.observe(
+                    len(entities) - sent + len(chunk), arrived,
+                    time.monotonic() - start)
+
+            if ok:
+                self.helpers.logger.info(
+                    "HIASCDI batch update OK (" + str(len(chunk)) + " entities)")
+                continue
+
+            self.helpers.logger.warning(
+                "HIASCDI batch update KO, falling back to single updates")
+
+            for entity in chunk:
+                attrs = dict(entity)
+                _id = attrs.pop("id")
+                typer = attrs.pop("type")
+                if not self.hiascdi.send_update(_id, typer, attrs):
+                    self.helpers.logger.error(
+                        typer + " " + _id + " batched update KO")
+
+        return len(entities)
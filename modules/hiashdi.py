@@ -31,11 +31,14 @@ Contributors:
 
 """
 
+import base64
 import json
 import requests
 
 from datetime import datetime
 
+from modules.resilience import CircuitOpenException, resilience
+
 
 class hiashdi():
     """ HIASHDI Helper Module
@@ -58,23 +61,52 @@ class hiashdi():
         self.auth = (self.helpers.credentials["hiashdi"]["un"],
                     self.helpers.confs["agent"]["proxy"]["up"])
 
+        self.retry = None
+        self.resilience = resilience(self.helpers, "hiashdi")
+
         self.helpers.logger.info("HIASHDI initialization complete.")
 
-    def insert_data(self, typeof, data):
-        """ Inserts data into HIASHDI. """
+    def ping(self):
+        """ Checks that HIASHDI is answering. """
+
+        api_url = "http://" + self.helpers.credentials["server"]["host"] + "/" + \
+                    self.helpers.credentials["hiashdi"]["endpoint"]
+
+        response = self.resilience.call(
+            "ping", requests.get, api_url, headers=self.headers,
+            auth=self.auth, timeout=self.resilience.timeout("ping"))
+
+        return response.status_code < 500
+
+    def insert_data(self, typeof, data, retry=True):
+        """ Inserts data into HIASHDI.
+
+        Failed inserts are scheduled for retry when a retry scheduler is
+        attached and retry is True.
+        """
 
         api_host = "http://" + self.helpers.credentials["server"]["host"] + "/" + \
                     self.helpers.credentials["hiashdi"]["endpoint"]
         api_endpoint = "/data?type=" + typeof
         api_url = api_host + api_endpoint
 
-        response = requests.post(api_url, data=json.dumps(
-            data), headers=self.headers, auth=self.auth)
+        try:
+            response = self.resilience.call(
+                "insert_data", requests.post, api_url, data=json.dumps(
+                    data), headers=self.headers, auth=self.auth,
+                timeout=self.resilience.timeout("insert_data"))
+        except (CircuitOpenException, requests.exceptions.RequestException) as e:
+            self.helpers.logger.error(
+                "HIASHDI insert failed: " + str(e))
+            response = None
 
-        if response.status_code == 201:
+        if response is not None and response.status_code == 201:
             return response.headers["Id"]
-        else:
-            return False
+
+        if retry and self.retry is not None:
+            self.retry.schedule("hiashdi", "insert_data", [typeof, data])
+
+        return False
         
     def entity_status_data(self, entity, entity_type, location, zone, status):
         
@@ -266,4 +298,60 @@ class hiashdi():
             "Value": data["Value"],
             "Message": data["Message"],
             "Time": datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-        }
\ No newline at end of file
+        }
+        
+    def entity_bci_frames_data(self, entity, entity_type, location, zone, chunk):
+        return {
+            "Use": entity_type,
+            "Location": location,
+            "Zone": zone,
+            "HIASBCH": entity if entity_type == "HIASBCH" else "NA",
+            "HIASCDI": entity if entity_type == "HIASCDI" else "NA",
+            "HIASHDI": entity if entity_type == "HIASHDI" else "NA",
+            "Agent": entity if entity_type == "Agent" else "NA",
+            "AiAgent": entity if entity_type == "AiAgent" else "NA",
+            "Application": entity if entity_type == "Application" else "NA",
+            "Device": entity if entity_type == "Device" else "NA",
+            "Staff": entity if entity_type == "Staff" else "NA",
+            "Robotics": entity if entity_type == "Robotics" else "NA",
+            "Sensor": chunk["Sensor"],
+            "Type": "Frames",
+            "Channels": chunk["Channels"],
+            "Rate": chunk["Rate"],
+            "Start": chunk["Start"],
+            "Samples": int(chunk["Samples"].shape[0]),
+            "Encoding": "float32le",
+            "Data": base64.b64encode(chunk["Samples"].astype(
+                "<f4", copy=False).tobytes()).decode("ascii"),
+            "Time": datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        }
+
+    def entity_rollup_data(self, rollup):
+
+        entity = rollup["Entity"]
+        entity_type = rollup["EntityType"]
+
+        return {
+            "Use": entity_type,
+            "Location": rollup["Location"],
+            "Zone": rollup["Zone"],
+            "HIASBCH": entity if entity_type == "HIASBCH" else "NA",
+            "HIASCDI": entity if entity_type == "HIASCDI" else "NA",
+            "HIASHDI": entity if entity_type == "HIASHDI" else "NA",
+            "Agent": entity if entity_type == "Agent" else "NA",
+            "AiAgent": entity if entity_type == "AiAgent" else "NA",
+            "Application": entity if entity_type == "Application" else "NA",
+            "Device": entity if entity_type == "Device" else "NA",
+            "Staff": entity if entity_type == "Staff" else "NA",
+            "Robotics": entity if entity_type == "Robotics" else "NA",
+            "Sensor": rollup["Sensor"],
+            "Type": rollup["Type"],
+            "Resolution": rollup["Resolution"],
+            "Start": datetime.fromtimestamp(rollup["Start"]).strftime('%Y-%m-%d %H:%M:%S'),
+            "End": datetime.fromtimestamp(rollup["End"]).strftime('%Y-%m-%d %H:%M:%S'),
+            "Min": rollup["Min"],
+            "Max": rollup["Max"],
+            "Mean": rollup["Mean"],
+            "Count": rollup["Count"],
+            "Time": datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        }
@@ -0,0 +1,318 @@
+#!/usr/bin/env python3
+""" HIAS Memory Module
+
+Accounts for the memory held by the agent's caches, queues and buffers
+and keeps it within a budget.
+
+MIT License
+
+Copyright (c) 2023 Peter Moss Leukaemia MedTech Research CIC
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files(the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and / or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+
+Contributors:
+- Adam Milton-Barker
+
+"""
+
+
+import itertools
+import sys
+import threading
+import time
+import tracemalloc
+
+
+def deep(obj, seen=None):
+    """ Returns the size in bytes of an object and everything it holds. """
+
+    if seen is None:
+        seen = set()
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+
+    size = sys.getsizeof(obj)
+
+    if hasattr(obj, "nbytes") and hasattr(obj, "base"):
+        # numpy arrays report their buffer as nbytes, views share the
+        # buffer of the array or bytes they were made from
+        base = obj.base
+        if base is None:
+            return size + obj.nbytes
+        while getattr(base, "base", None) is not None:
+            base = base.base
+        return size + deep(base, seen)
+    if isinstance(obj, memoryview):
+        return size + obj.nbytes
+    if isinstance(obj, dict):
+        size += sum(deep(key, seen) + deep(value, seen)
+                    for key, value in obj.items())
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        size += sum(deep(item, seen) for item in obj)
+
+    return size
+
+
+def estimate(container, sample=32):
+    """ Estimates the size of a container from a sample of its items.
+
+    Args:
+        container (dict|list|set): The container.
+        sample (int): The number of items measured.
+
+    Returns:
+        tuple: (bytes, items).
+    """
+
+    items = len(container)
+    if not items:
+        return sys.getsizeof(container), 0
+
+    values = container.items() if isinstance(container, dict) else container
+    sampled = list(itertools.islice(values, sample))
+    measured = sum(deep(item) for item in sampled)
+
+    return sys.getsizeof(container) + measured * items // len(sampled), items
+
+
+def combine(*sizes):
+    """ Adds up (bytes, items) sizes. """
+
+    return sum(size[0] for size in sizes), sum(size[1] for size in sizes)
+
+
+class memory():
+    """ HIAS Memory Module
+
+    Caches, queues and buffers register a function returning their
+    estimated size and item count, and optionally a function that frees
+    memory (clearing a cache or flushing a buffer early). Every interval
+    seconds the sizes are measured. Over budget, the largest components
+    that can be evicted are evicted until the total is back under budget.
+    If it is still over, messages are held back until it is not, for at
+    most backpressure seconds each.
+    """
+
+    def __init__(self, helpers):
+        """ Initializes the class. """
+
+        self.helpers = helpers
+        self.program = "HIAS Memory Module"
+
+        self.confs = self.helpers.confs["agent"]["memory"]
+
+        self.components = {}
+        self.sizes = {}
+        self.total = 0
+        self.pressure = False
+        self.relieved = threading.Event()
+        self.relieved.set()
+        self.lock = threading.Lock()
+        self.checking = threading.Lock()
+        self.running = False
+
+        if self.confs["tracemalloc"] and not tracemalloc.is_tracing():
+            tracemalloc.start(self.confs["frames"])
+
+        self.helpers.logger.info(
+            self.program + " initialization complete.")
+
+    def register(self, name, size, evict=None):
+        """ Registers a cache, queue or buffer.
+
+        Args:
+            name (str): The component name.
+            size (function): Returns the (bytes, items) of the component.
+            evict (function): Frees memory held by the component and
+                returns the number of items freed.
+        """
+
+        with self.lock:
+            self.components[name] = (size, evict)
+
+    def start(self):
+        """ Starts the thread checking the budget. """
+
+        self.running = True
+        threading.Thread(target=self.run, daemon=True).start()
+
+    def stop(self):
+        """ Stops the budget thread and releases held messages. """
+
+        self.running = False
+        self.relieved.set()
+
+    def run(self):
+        """ Checks the budget every interval seconds. """
+
+        while self.running:
+            time.sleep(self.confs["interval"])
+            self.check()
+
+    def measure(self, name):
+        """ Measures one component, keeping its last size on error. """
+
+        size = self.components[name][0]
+
+        try:
+            self.sizes[name] = size()
+        except RuntimeError:
+            # Changed size while being measured
+            pass
+
+        return self.sizes.get(name, (0, 0))
+
+    def measure_all(self):
+        """ Measures every component.
+
+        Returns:
+            int: The estimated bytes held by the components.
+        """
+
+        with self.lock:
+            for name in self.components:
+                self.measure(name)
+
+            return sum(size for size, items in self.sizes.values())
+
+    def check(self):
+        """ Measures every component and enforces the budget.
+
+        Evictions flush buffers to the backends, so they run outside the
+        lock, one check at a time.
+
+        Returns:
+            int: The estimated bytes held by the components.
+        """
+
+        with self.checking:
+            total = self.measure_all()
+            budget = self.confs["budget"]
+
+            if budget and total > budget:
+                with self.lock:
+                    evictable = sorted(
+                        ((name, evict) for name, (size, evict)
+                         in self.components.items()
+                         if evict is not None and self.sizes[name][1]),
+                        key=lambda entry: self.sizes[entry[0]][0],
+                        reverse=True)
+
+                for name, evict in evictable:
+                    freed = evict()
+                    with self.lock:
+                        before = self.sizes[name][0]
+                        total += self.measure(name)[0] - before
+
+                    self.helpers.metrics.increment(
+                        "memory_evictions", {"component": name})
+                    self.helpers.logger.warning(
+                        "Memory over budget, evicted " + str(freed) +
+                        " items from " + name)
+
+                    if total <= budget:
+                        break
+
+            with self.lock:
+                self.total = total
+                pressure = bool(budget) and total > budget
+
+                for name, (size, items) in self.sizes.items():
+                    self.helpers.metrics.gauge(
+                        "memory_bytes", size, {"component": name})
+                self.helpers.metrics.gauge("memory_bytes_total", total)
+
+            if pressure != self.pressure:
+                self.pressure = pressure
+                if pressure:
+                    self.relieved.clear()
+                    self.helpers.logger.warning(
+                        "Memory over budget after eviction (" + str(total) +
+                        " bytes), holding back messages.")
+                else:
+                    self.relieved.set()
+                    self.helpers.logger.info(
+                        "Memory back under budget (" + str(total) +
+                        " bytes).")
+
+        return total
+
+    def admit(self):
+        """ Waits while the agent is over its memory budget.
+
+        Returns:
+            bool: False if the wait timed out.
+        """
+
+        if self.relieved.is_set():
+            return True
+
+        self.helpers.metrics.increment("memory_backpressure")
+
+        return self.relieved.wait(self.confs["backpressure"])
+
+    def report(self, top=None):
+        """ Returns the memory breakdown. The components are measured but
+        nothing is evicted.
+
+        Args:
+            top (int): The number of tracemalloc allocation sites to
+                include, when tracemalloc is tracing.
+
+        Returns:
+            dict: The budget, the size and item count of each component,
+                the process RSS and the top allocation sites.
+        """
+
+        import psutil
+
+        total = self.measure_all()
+
+        with self.lock:
+            components = {
+                name: {"Bytes": size, "Items": items,
+                       "Evictable": self.components[name][1] is not None}
+                for name, (size, items) in sorted(
+                    self.sizes.items(), key=lambda entry: -entry[1][0])}
+
+        report = {
+            "Budget": self.confs["budget"],
+            "Total": total,
+            "Pressure": self.pressure,
+            "Components": components,
+            "Process": {"RSS": psutil.Process().memory_info().rss},
+            "Tracemalloc": None
+        }
+
+        if tracemalloc.is_tracing():
+            current, peak = tracemalloc.get_traced_memory()
+            report["Tracemalloc"] = {
+                "Current": current,
+                "Peak": peak,
+                "Top": [{
+                    "Site": str(stat.traceback),
+                    "Bytes": stat.size,
+                    "Count": stat.count
+                } for stat in tracemalloc.take_snapshot().filter_traces([
+                    tracemalloc.Filter(False, tracemalloc.__file__)
+                ]).statistics("lineno")[:top or self.confs["top"]]]
+            }
+
+        return report
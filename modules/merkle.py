@@ -0,0 +1,388 @@
+#!/usr/bin/env python3
+""" HIAS Merkle Integrity Module
+
+Batches the integrity records of HIASHDI writes into a Merkle tree per time
+window, publishing only the window's root, and proves that a record was
+included in a window.
+
+MIT License
+
+Copyright (c) 2023 Peter Moss Leukaemia MedTech Research CIC
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files(the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and / or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+
+Contributors:
+- Adam Milton-Barker
+
+"""
+
+
+import hashlib
+import json
+import os
+import threading
+import time
+
+
+def canonical(record):
+    """ Returns the canonical serialization of a record. """
+
+    return json.dumps(record, sort_keys=True, separators=(",", ":"),
+                      ensure_ascii=False, default=str).encode("utf-8")
+
+
+def identifier(record):
+    """ Returns the _id of a record as a string.
+
+    Records exported from HIASHDI as extended JSON hold their id as
+    {"$oid": id}.
+    """
+
+    _id = record.get("_id")
+    if isinstance(_id, dict) and "$oid" in _id:
+        _id = _id["$oid"]
+
+    return str(_id)
+
+
+def leaf(record):
+    """ Returns the leaf hash of a record, with its _id normalized. """
+
+    if "_id" in record:
+        record = dict(record, _id=identifier(record))
+
+    return hashlib.sha256(b"\x00" + canonical(record)).digest()
+
+
+def node(left, right):
+    """ Returns the hash of an inner node. """
+
+    return hashlib.sha256(b"\x01" + left + right).digest()
+
+
+def levels(leaves):
+    """ Returns every level of the tree, from the leaves to the root.
+
+    A node without a sibling is carried up to the next level unchanged.
+    """
+
+    tree = [list(leaves)]
+    while len(tree[-1]) > 1:
+        level = tree[-1]
+        tree.append([node(level[i], level[i + 1]) if i + 1 < len(level)
+                     else level[i] for i in range(0, len(level), 2)])
+
+    return tree
+
+
+def root(leaves):
+    """ Returns the root of a list of leaf hashes. """
+
+    if not leaves:
+        return hashlib.sha256(b"").digest()
+
+    return levels(leaves)[-1][0]
+
+
+def proof(leaves, index):
+    """ Returns the inclusion proof of a leaf.
+
+    Args:
+        leaves (list): The leaf hashes of the window.
+        index (int): The leaf index.
+
+    Returns:
+        list: [side, sibling hash hex] pairs from the leaf to the root,
+            side is L when the sibling is on the left.
+    """
+
+    path = []
+    for level in levels(leaves)[:-1]:
+        sibling = index ^ 1
+        if sibling < len(level):
+            path.append(["L" if sibling < index else "R",
+                         level[sibling].hex()])
+        index //= 2
+
+    return path
+
+
+def verify(leaf_hash, path, expected):
+    """ Checks an inclusion proof.
+
+    Args:
+        leaf_hash (bytes): The record's leaf hash.
+        path (list): The proof returned by proof.
+        expected (bytes): The window root.
+    """
+
+    current = leaf_hash
+    for side, sibling in path:
+        sibling = bytes.fromhex(sibling)
+        current = node(sibling, current) if side == "L" \
+            else node(current, sibling)
+
+    return current == expected
+
+
+class merkle():
+    """ HIAS Merkle Integrity Module
+
+    Integrity records are hashed as they are written. Every window seconds
+    the window's leaves are stored in the integrity data directory and the
+    window root, its leaf count and the record ids in leaf order are
+    published instead of the records themselves.
+
+    An index maps each record id to its window, sharded by the first byte
+    of the id's hash. Windows older than retention days are deleted.
+    """
+
+    def __init__(self, helpers, publisher=None):
+        """ Initializes the class.
+
+        Args:
+            helpers (:obj:`helpers`): The agent helpers.
+            publisher (function): Called with each window root record.
+        """
+
+        self.helpers = helpers
+        self.publisher = publisher
+        self.program = "HIAS Merkle Integrity Module"
+
+        self.confs = self.helpers.confs["agent"]["integrity"]
+        self.path = self.helpers.data("integrity")
+        self.index = self.path + 'index/'
+
+        self.leaves = []
+        self.ids = []
+        self.opened = time.time()
+        self.lock = threading.Lock()
+        self.running = False
+
+        self.helpers.logger.info(
+            self.program + " initialization complete.")
+
+    def start(self):
+        """ Starts the thread closing windows. """
+
+        self.running = True
+        threading.Thread(target=self.run, daemon=True).start()
+
+    def stop(self):
+        """ Stops the window thread and closes the current window.
+
+        Returns:
+            int: The number of records in the closed window.
+        """
+
+        self.running = False
+        return self.close()
+
+    def run(self):
+        """ Closes a window every window seconds. """
+
+        while self.running:
+            time.sleep(self.confs["window"])
+            if self.running:
+                self.close()
+
+    def add(self, record):
+        """ Adds an integrity record to the current window.
+
+        Args:
+            record (dict): The HIASHDI record, including its _id.
+
+        Returns:
+            int: The record's leaf index in the window.
+        """
+
+        digest = leaf(record)
+
+        with self.lock:
+            self.leaves.append(digest)
+            self.ids.append(identifier(record))
+            return len(self.leaves) - 1
+
+    def close(self):
+        """ Stores and publishes the root of the current window. """
+
+        with self.lock:
+            leaves = self.leaves
+            ids = self.ids
+            start = self.opened
+            self.leaves = []
+            self.ids = []
+            self.opened = time.time()
+
+        if not leaves:
+            return 0
+
+        window = {
+            "Window": "%.6f" % start,
+            "Start": start,
+            "End": self.opened,
+            "Root": root(leaves).hex(),
+            "Count": len(leaves),
+            "Ids": ids
+        }
+
+        stored = dict(window)
+        stored["Leaves"] = [digest.hex() for digest in leaves]
+        os.makedirs(self.index, exist_ok=True)
+        with open(self.file(window["Window"]), "w") as tree:
+            json.dump(stored, tree)
+
+        self.update(ids, window["Window"])
+        self.prune()
+
+        if self.publisher is not None:
+            self.publisher(window)
+
+        self.helpers.metrics.increment(
+            "integrity_records", value=len(leaves))
+        self.helpers.logger.info(
+            "Integrity window " + window["Window"] + " root " +
+            window["Root"] + " (" + str(len(leaves)) + " records)")
+
+        return len(leaves)
+
+    def file(self, window):
+        """ Returns the leaf file of a window. """
+
+        return self.path + window + ".json"
+
+    def shard(self, _id):
+        """ Returns the index file holding a record id. """
+
+        return self.index + hashlib.sha256(
+            _id.encode("utf-8")).hexdigest()[:2] + ".json"
+
+    def shards(self, ids):
+        """ Groups record ids by index file. """
+
+        shards = {}
+        for _id in ids:
+            shards.setdefault(self.shard(_id), []).append(_id)
+
+        return shards
+
+    def load(self, shard):
+        """ Returns an index file, {id: window}. """
+
+        if not os.path.exists(shard):
+            return {}
+
+        with open(shard) as index:
+            return json.load(index)
+
+    def save(self, shard, index):
+        """ Replaces an index file, or removes it when it is empty. """
+
+        if not index:
+            if os.path.exists(shard):
+                os.remove(shard)
+            return
+
+        with open(shard + ".tmp", "w") as saving:
+            json.dump(index, saving)
+        os.replace(shard + ".tmp", shard)
+
+    def update(self, ids, window):
+        """ Indexes the record ids of a window. """
+
+        for shard, members in self.shards(ids).items():
+            index = self.load(shard)
+            index.update(dict.fromkeys(members, window))
+            self.save(shard, index)
+
+    def prune(self):
+        """ Deletes the windows older than the retention and their index
+        entries.
+
+        Returns:
+            int: The number of windows deleted.
+        """
+
+        if not self.confs["retention"]:
+            return 0
+
+        oldest = time.time() - self.confs["retention"] * 86400
+        pruned = 0
+
+        for window in self.windows():
+            if float(window) >= oldest:
+                break
+
+            stored = self.read(window)
+            if stored is not None:
+                for shard, members in self.shards(stored["Ids"]).items():
+                    index = self.load(shard)
+                    for _id in members:
+                        if index.get(_id) == window:
+                            del index[_id]
+                    self.save(shard, index)
+
+            os.remove(self.file(window))
+            pruned += 1
+
+        if pruned:
+            self.helpers.logger.info(
+                "Deleted " + str(pruned) + " expired integrity windows")
+
+        return pruned
+
+    def windows(self):
+        """ Returns the stored windows, oldest first. """
+
+        if not os.path.isdir(self.path):
+            return []
+
+        return sorted(f[:-5] for f in os.listdir(self.path)
+                      if f.endswith(".json"))
+
+    def read(self, window):
+        """ Returns a stored window, or None if it does not exist. """
+
+        if not os.path.exists(self.file(window)):
+            return None
+
+        with open(self.file(window)) as tree:
+            return json.load(tree)
+
+    def find(self, _id, window=None):
+        """ Finds the window and leaf index of a record id.
+
+        Args:
+            _id (str): The record id.
+            window (str): The window, looked up in the index when None.
+
+        Returns:
+            tuple: The stored window and the leaf index, or None, None.
+        """
+
+        if window is None:
+            window = self.load(self.shard(_id)).get(_id)
+            if window is None:
+                return None, None
+
+        stored = self.read(window)
+        if stored is not None and _id in stored["Ids"]:
+            return stored, stored["Ids"].index(_id)
+
+        return None, None
@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+""" HIAS Metrics Module
+
+This module keeps the counters and gauges reported by the HIAS IoT Agent
+North Port Metrics API endpoint.
+
+MIT License
+
+Copyright (c) 2023 Peter Moss Leukaemia MedTech Research CIC
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files(the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and / or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+
+Contributors:
+- Adam Milton-Barker
+
+"""
+
+
+import threading
+
+
+class metrics():
+    """ HIAS Metrics Module
+
+    Thread safe counters and gauges identified by a name and optional
+    labels, for example breaker_transitions{backend="HIASCDI",to="open"}.
+    """
+
+    def __init__(self):
+        """ Initializes the class. """
+
+        self.counters = {}
+        self.gauges = {}
+        self.lock = threading.Lock()
+
+    def key(self, name, labels=None):
+        """ Builds the key of a metric from its name and labels. """
+
+        if not labels:
+            return name
+
+        return name + "{" + ",".join(
+            k + '="' + str(v) + '"' for k, v in sorted(labels.items())) + "}"
+
+    def increment(self, name, labels=None, value=1):
+        """ Increments a counter.
+
+        Args:
+            name (str): The counter name.
+            labels (dict): The counter labels.
+            value (int): The amount to add.
+        """
+
+        key = self.key(name, labels)
+
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def gauge(self, name, value, labels=None):
+        """ Sets a gauge.
+
+        Args:
+            name (str): The gauge name.
+            value (float): The gauge value.
+            labels (dict): The gauge labels.
+        """
+
+        key = self.key(name, labels)
+
+        with self.lock:
+            self.gauges[key] = value
+
+    def snapshot(self):
+        """ Returns a copy of all counters and gauges. """
+
+        with self.lock:
+            return {
+                "Counters": dict(self.counters),
+                "Gauges": dict(self.gauges)
+            }
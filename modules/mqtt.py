@@ -33,8 +33,6 @@ Contributors:
 
 import json
 
-import paho.mqtt.client as pmqtt
-
 class mqtt():
     """HIAS iotJumpWay MQTT Module
 
@@ -58,6 +56,10 @@ class mqtt():
         self.mqtt_config = {}
         self.module_topics = {}
 
+        self.ratelimit = None
+        self.capture = None
+        self.dedup = None
+
         self.agent = [
             'host',
             'port',
@@ -119,6 +121,8 @@ class mqtt():
         Starts the HIAS iotJumpWay MQTT connection.
         """
 
+        import paho.mqtt.client as pmqtt
+
         self.m_client = pmqtt.Client(
             client_id=self.client_id, clean_session=True)
         
@@ -203,6 +207,12 @@ class mqtt():
         On message callback.
         """
 
+        if self.capture is not None:
+            self.capture.add(msg.topic, msg.payload)
+
+        if self.dedup is not None:
+            self.dedup.received(msg.dup)
+
         split_topic = msg.topic.split("/")
         conn_type = split_topic[1]
 
@@ -227,88 +237,103 @@ class mqtt():
         elif conn_type == "Staff":
             topic = split_topic[3]
 
-        self.helpers.logger.info(msg.payload)
+        if self.ratelimit is not None:
+            entity = split_topic[2] if conn_type in [
+                "Applications", "Robotics", "Staff"] else split_topic[3]
+            if not self.ratelimit.allow(
+                    conn_type, entity, topic, msg.topic, msg.payload):
+                return
+
+        self.route(conn_type, topic, msg.topic, msg.payload)
+
+    def route(self, conn_type, topic, path, payload):
+        """ Route
+
+        Passes a message to its channel callback.
+        """
+
+        self.helpers.logger.info(payload)
         self.helpers.logger.info(
-            "iotJumpWay " + conn_type + " " + msg.topic  + " communication received.")
+            "iotJumpWay " + conn_type + " " + path  + " communication received.")
 
         if topic == 'Actuators':
             if self.actuators_callback == None:
                 self.helpers.logger.info(
                     conn_type + " actuators callback required (actuators_callback)!")
             else:
-                self.actuator_state_callback(msg.topic, msg.payload)
+                self.actuators_callback(path, payload)
         elif topic == 'AiAgent':
             if self.ai_agent_callback == None:
                 self.helpers.logger.info(
                     conn_type + " AI Agent callback required (ai_agent_callback)!")
             else:
-                self.ai_agent_callback(msg.topic, msg.payload)
+                self.ai_agent_callback(path, payload)
         elif topic == 'AiModel':
             if self.ai_model_callback == None:
                 self.helpers.logger.info(
                     conn_type + " AI Model callback required (ai_model_callback)!")
             else:
-                self.ai_model_callback(msg.topic, msg.payload)
+                self.ai_model_callback(path, payload)
         elif topic == 'BCI':
             if self.bci_callback == None:
                 self.helpers.logger.info(
                     conn_type + " BCI callback required (bci_callback)!")
             else:
-                self.bci_callback(msg.topic, msg.payload)
+                self.bci_callback(path, payload)
         elif topic == 'Classification':
             if self.classification_callback == None:
                 self.helpers.logger.info(
                     conn_type + " classification callback required (classification_callback)!")
             else:
-                self.classification_callback(msg.topic, msg.payload)
+                self.classification_callback(path, payload)
         elif topic == 'Commands':
             if self.comands_callback == None:
                 self.helpers.logger.info(
                     conn_type + " comands callback required (comands_callback)!")
             else:
-                self.comands_callback(msg.topic, msg.payload)
+                self.comands_callback(path, payload)
         elif topic == 'Integrity':
             if self.integrityCallback == None:
                 self.helpers.logger.info(
                     conn_type + " Integrity callback required (integrityCallback)!")
             else:
-                self.integrityCallback(msg.topic, msg.payload)
+                self.integrityCallback(path, payload)
         elif topic == 'Life':
             if self.life_callback == None:
                 self.helpers.logger.info(
                     conn_type + " life callback required (life_callback)!")
             else:
-                self.life_callback(msg.topic, msg.payload)
+                self.life_callback(path, payload)
         elif topic == 'Notifications':
             if self.notifications_callback == None:
                 self.helpers.logger.info(
                     conn_type + " notifications callback required (notifications_callback)!")
             else:
-                self.notifications_callback(msg.topic, msg.payload)
+                self.notifications_callback(path, payload)
         elif topic == 'Sensors':
             if self.sensors_callback == None:
                 self.helpers.logger.info(
                     conn_type + " status callback required (sensors_callback)!")
             else:
-                self.sensors_callback(msg.topic, msg.payload)
+                self.sensors_callback(path, payload)
         elif topic == 'State':
             if self.state_callback == None:
                 self.helpers.logger.info(
                     conn_type + " state callback required (state_callback)!")
             else:
-                self.state_callback(msg.topic, msg.payload)
+                self.state_callback(path, payload)
         elif topic == 'Status':
             if self.status_callback == None:
                 self.helpers.logger.info(
                     conn_type + " status callback required (status_callback)!")
             else:
-                self.status_callback(msg.topic, msg.payload)
+                self.status_callback(path, payload)
         elif topic == 'Zone':
             if self.zoneCallback == None:
                 self.helpers.logger.info(
                     conn_type + " status callback required (zoneCallback)!")
             else:
-                self.zoneCallback(msg.topic, msg.payload)
+                self.zoneCallback(path, payload)
 
     def publish(self, channel, data, channel_path = ""):
         """ Publish
@@ -342,6 +367,19 @@ class mqtt():
             "Agent subscribed to all channels")
         return True
 
+    def unsubscribe(self):
+        """ Unsubscribe
+
+        Unsubscribes from the iotJumpWay MQTT channels.
+        """
+
+        channel = '%s/#' % (self.configs['location'])
+        self.m_client.unsubscribe(channel)
+
+        self.helpers.logger.info(
+            "Agent unsubscribed from all channels")
+        return True
+
     def on_publish(self, client, obj, mid):
         """ On publish
 
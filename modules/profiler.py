@@ -0,0 +1,266 @@
+#!/usr/bin/env python3
+""" HIAS Profiler Module
+
+This module starts and stops CPU (cProfile) and memory (tracemalloc)
+profiling sessions inside the running HIAS IoT Agent for a bounded duration.
+
+MIT License
+
+Copyright (c) 2023 Peter Moss Leukaemia MedTech Research CIC
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files(the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and / or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+
+Contributors:
+- Adam Milton-Barker
+
+"""
+
+
+import cProfile
+import pstats
+import threading
+import time
+import tracemalloc
+
+
+class profiler():
+    """ HIAS Profiler Module
+
+    Runs CPU and memory profiling sessions inside the running agent. Each
+    session stops itself after its duration, and its results are kept
+    until the next session starts.
+    """
+
+    def __init__(self, helpers):
+        """ Initializes the class. """
+
+        self.helpers = helpers
+        self.program = "HIAS Profiler Module"
+
+        self.confs = self.helpers.confs["agent"]["profiler"]
+
+        self.lock = threading.Lock()
+
+        self.cpu = None
+        self.cpu_timer = None
+        self.cpu_started = None
+        self.cpu_result = None
+
+        self.memory = None
+        self.memory_timer = None
+        self.memory_started = None
+        self.memory_result = None
+
+        self.helpers.logger.info(
+            self.program + " initialization complete.")
+
+    def duration(self, duration):
+        """ Bounds a requested session duration. """
+
+        if duration is None or duration <= 0:
+            duration = self.confs["duration"]
+
+        return min(duration, self.confs["maxDuration"])
+
+    def cpu_start(self, duration=None):
+        """ Starts a CPU profiling session.
+
+        Args:
+            duration (float): Seconds to profile for.
+
+        Returns:
+            float: The session duration, or False if a session is running.
+        """
+
+        with self.lock:
+            if self.cpu is not None:
+                return False
+
+            duration = self.duration(duration)
+
+            self.cpu = cProfile.Profile()
+            self.cpu_started = time.time()
+            self.cpu.enable()
+
+            self.cpu_timer = threading.Timer(duration, self.cpu_stop)
+            self.cpu_timer.daemon = True
+            self.cpu_timer.start()
+
+        self.helpers.logger.info(
+            "CPU profiling started for " + str(duration) + " seconds")
+
+        return duration
+
+    def cpu_stop(self, top=None, sort="cumulative"):
+        """ Stops the CPU profiling session.
+
+        Args:
+            top (int): The number of functions to report.
+            sort (str): cumulative or tottime.
+
+        Returns:
+            dict: The top functions of the session, or of the last session
+                if none is running.
+        """
+
+        with self.lock:
+            if self.cpu is not None:
+                self.cpu.disable()
+                self.cpu_timer.cancel()
+                profile = self.cpu
+                self.cpu = None
+
+                self.cpu_result = {
+                    "Started": self.cpu_started,
+                    "Seconds": round(time.time() - self.cpu_started, 3),
+                    "Stats": pstats.Stats(profile).stats
+                }
+
+                self.helpers.logger.info("CPU profiling stopped")
+
+        return self.cpu_report(top, sort)
+
+    def cpu_report(self, top=None, sort="cumulative"):
+        """ Reports the top functions of the last CPU profiling session. """
+
+        if self.cpu_result is None:
+            return {"Running": self.cpu is not None, "Functions": []}
+
+        if sort not in ["cumulative", "tottime"]:
+            sort = "cumulative"
+
+        functions = []
+        for (filename, line, name), (cc, nc, tt, ct, callers) in \
+                self.cpu_result["Stats"].items():
+            functions.append({
+                "function": name,
+                "file": filename,
+                "line": line,
+                "calls": nc,
+                "primitiveCalls": cc,
+                "tottime": round(tt, 6),
+                "cumulative": round(ct, 6)
+            })
+
+        functions.sort(key=lambda f: f[sort], reverse=True)
+
+        return {
+            "Running": self.cpu is not None,
+            "Started": self.cpu_result["Started"],
+            "Seconds": self.cpu_result["Seconds"],
+            "Sort": sort,
+            "Functions": functions[:top or self.confs["top"]]
+        }
+
+    def memory_start(self, duration=None, frames=None):
+        """ Starts a tracemalloc session.
+
+        Args:
+            duration (float): Seconds to trace allocations for.
+            frames (int): Number of frames stored per allocation.
+
+        Returns:
+            float: The session duration, or False if a session is running.
+        """
+
+        with self.lock:
+            if self.memory is not None:
+                return False
+
+            duration = self.duration(duration)
+
+            started = not tracemalloc.is_tracing()
+            if started:
+                tracemalloc.start(frames or self.confs["frames"])
+
+            self.memory = {
+                "baseline": tracemalloc.take_snapshot(),
+                "started": started
+            }
+            self.memory_started = time.time()
+
+            self.memory_timer = threading.Timer(duration, self.memory_stop)
+            self.memory_timer.daemon = True
+            self.memory_timer.start()
+
+        self.helpers.logger.info(
+            "Memory profiling started for " + str(duration) + " seconds")
+
+        return duration
+
+    def memory_stop(self, top=None):
+        """ Stops the tracemalloc session.
+
+        Args:
+            top (int): The number of allocation sites to report.
+
+        Returns:
+            dict: The top allocation sites of the session, or of the last
+                session if none is running.
+        """
+
+        with self.lock:
+            if self.memory is not None:
+                self.memory_timer.cancel()
+                snapshot = tracemalloc.take_snapshot()
+                current, peak = tracemalloc.get_traced_memory()
+
+                if self.memory["started"]:
+                    tracemalloc.stop()
+
+                self.memory_result = {
+                    "Started": self.memory_started,
+                    "Seconds": round(time.time() - self.memory_started, 3),
+                    "Current": current,
+                    "Peak": peak,
+                    "Growth": snapshot.compare_to(
+                        self.memory["baseline"], "lineno"),
+                    "Sites": snapshot.statistics("lineno")
+                }
+                self.memory = None
+
+                self.helpers.logger.info("Memory profiling stopped")
+
+        return self.memory_report(top)
+
+    def memory_report(self, top=None):
+        """ Reports the top allocation sites of the last memory session. """
+
+        if self.memory_result is None:
+            return {"Running": self.memory is not None, "Sites": []}
+
+        top = top or self.confs["top"]
+
+        return {
+            "Running": self.memory is not None,
+            "Started": self.memory_result["Started"],
+            "Seconds": self.memory_result["Seconds"],
+            "Current": self.memory_result["Current"],
+            "Peak": self.memory_result["Peak"],
+            "Sites": [{
+                "site": str(stat.traceback),
+                "size": stat.size,
+                "count": stat.count
+            } for stat in self.memory_result["Sites"][:top]],
+            "Growth": [{
+                "site": str(stat.traceback),
+                "size": stat.size_diff,
+                "count": stat.count_diff
+            } for stat in self.memory_result["Growth"][:top]]
+        }
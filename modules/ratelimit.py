@@ -0,0 +1,249 @@
+#!/usr/bin/env python3
+""" HIAS Rate Limit Module
+
+Limits the rate of iotJumpWay messages accepted from each entity and entity
+type with token buckets.
+
+MIT License
+
+Copyright (c) 2023 Peter Moss Leukaemia MedTech Research CIC
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files(the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and / or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+
+Contributors:
+- Adam Milton-Barker
+
+"""
+
+
+import threading
+import time
+
+from collections import OrderedDict
+
+
+class ratelimit():
+    """ HIAS Rate Limit Module
+
+    Each entity, and each entity type, has a token bucket refilled at its
+    configured rate up to its burst size. A message is accepted when both
+    buckets have a token. Messages over the limit are dropped, or in
+    coalesce mode the latest message of each topic is kept and delivered
+    once its entity has tokens again, unless a newer message of the topic
+    was accepted first. Coalesced messages are delivered by the flush
+    thread, at the same time as the MQTT callbacks handle new messages.
+    Throttling statistics are kept for the tracked most recently throttled
+    entities.
+    """
+
+    def __init__(self, helpers):
+        """ Initializes the class. """
+
+        self.helpers = helpers
+        self.program = "HIAS Rate Limit Module"
+
+        self.confs = self.helpers.confs["agent"]["ratelimit"]
+        self.coalesce = self.confs["mode"] == "coalesce"
+        self.exempt = set(self.confs["exempt"])
+
+        self.entities = {}
+        self.types = {}
+        self.throttled = OrderedDict()
+        self.coalesced = {}
+        self.deliver = None
+
+        self.lock = threading.Lock()
+        self.running = False
+
+        self.helpers.logger.info(
+            self.program + " initialization complete.")
+
+    def start(self, deliver):
+        """ Starts the thread delivering coalesced messages.
+
+        Args:
+            deliver (function): Called with the arguments given to allow
+                for each coalesced message that is delivered.
+        """
+
+        self.deliver = deliver
+        if self.coalesce:
+            self.running = True
+            threading.Thread(target=self.run, daemon=True).start()
+
+    def stop(self):
+        """ Stops the coalesced message thread.
+
+        Returns:
+            list: The coalesced messages that were not delivered.
+        """
+
+        self.running = False
+
+        with self.lock:
+            waiting = list(self.coalesced.values())
+            self.coalesced = {}
+
+        return waiting
+
+    def limits(self, entity_type):
+        """ Returns the rate and burst of an entity type. """
+
+        types = self.confs["types"]
+        return types.get(entity_type, types["default"])
+
+    def take(self, buckets, key, limits, now):
+        """ Refills a bucket and returns it if it has a token. """
+
+        bucket = buckets.get(key)
+        if bucket is None:
+            bucket = buckets[key] = [float(limits["burst"]), now]
+        else:
+            bucket[0] = min(limits["burst"],
+                            bucket[0] + (now - bucket[1]) * limits["rate"])
+            bucket[1] = now
+
+        return bucket if bucket[0] >= 1 else None
+
+    def evict(self):
+        """ Forgets the entities whose buckets have refilled.
+
+        A refilled bucket would be recreated full, so forgetting it does
+        not change any limit.
+
+        Returns:
+            int: The number of entity buckets evicted.
+        """
+
+        now = time.monotonic()
+        limits = self.confs["entity"]
+
+        with self.lock:
+            idle = [key for key, (tokens, updated) in self.entities.items()
+                    if tokens + (now - updated) * limits["rate"] >=
+                    limits["burst"]]
+            for key in idle:
+                del self.entities[key]
+
+        return len(idle)
+
+    def allow(self, entity_type, entity, channel, topic, payload,
+              recheck=False):
+        """ Checks a message against its entity and entity type limits.
+
+        Args:
+            entity_type (str): The entity type, from the topic.
+            entity (str): The entity id, from the topic.
+            channel (str): The channel, from the topic.
+            topic (str): The topic.
+            payload (bytes): The payload.
+            recheck (bool): True for a coalesced message that was already
+                counted as throttled.
+
+        Returns:
+            bool: True if the message can be handled now.
+        """
+
+        if channel in self.exempt:
+            return True
+
+        now = time.monotonic()
+        key = (entity_type, entity)
+
+        with self.lock:
+            bucket = self.take(
+                self.entities, key, self.confs["entity"], now)
+            kind = self.take(
+                self.types, entity_type, self.limits(entity_type), now)
+
+            if bucket is not None and kind is not None:
+                bucket[0] -= 1
+                kind[0] -= 1
+                # A coalesced message of the topic is older than this one
+                self.coalesced.pop(topic, None)
+                return True
+
+            stats = self.throttled.get(key)
+            if stats is None:
+                if len(self.throttled) >= self.confs["tracked"]:
+                    self.throttled.popitem(last=False)
+                stats = self.throttled[key] = {
+                    "Type": entity_type,
+                    "Entity": entity,
+                    "Dropped": 0,
+                    "Coalesced": 0,
+                    "Limit": None,
+                    "Last": None
+                }
+            else:
+                self.throttled.move_to_end(key)
+
+            stats["Last"] = time.time()
+            stats["Limit"] = "Entity" if bucket is None else "Type"
+
+            if self.coalesce:
+                if topic in self.coalesced:
+                    if recheck:
+                        # A newer message was coalesced while this one
+                        # was checked again
+                        return False
+                    stats["Coalesced"] += 1
+                self.coalesced[topic] = (
+                    entity_type, entity, channel, topic, payload)
+            else:
+                stats["Dropped"] += 1
+
+        if not recheck:
+            self.helpers.metrics.increment(
+                "ratelimit_throttled", {"type": entity_type})
+
+        return False
+
+    def run(self):
+        """ Delivers coalesced messages once their entity has tokens. """
+
+        while self.running:
+            time.sleep(self.confs["interval"])
+
+            with self.lock:
+                waiting = list(self.coalesced.items())
+
+            for topic, message in waiting:
+                with self.lock:
+                    if self.coalesced.get(topic) is not message:
+                        continue
+                    del self.coalesced[topic]
+
+                if self.allow(*message, recheck=True):
+                    self.deliver(*message)
+
+    def report(self):
+        """ Returns the throttled entities, most throttled first. """
+
+        with self.lock:
+            stats = [dict(entry) for entry in self.throttled.values()]
+            waiting = len(self.coalesced)
+
+        stats.sort(key=lambda entry: -(entry["Dropped"] + entry["Coalesced"]))
+
+        return {
+            "Mode": self.confs["mode"],
+            "Waiting": waiting,
+            "Entities": stats
+        }
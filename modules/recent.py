@@ -0,0 +1,215 @@
+#!/usr/bin/env python3
+""" HIAS Recent Readings Module
+
+Keeps the last readings of each entity sensor in memory so recent
+values can be served without querying HIASHDI.
+
+MIT License
+
+Copyright (c) 2023 Peter Moss Leukaemia MedTech Research CIC
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files(the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and / or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+
+Contributors:
+- Adam Milton-Barker
+
+"""
+
+
+import math
+import threading
+import time
+
+import numpy as np
+
+
+class recent():
+    """ HIAS Recent Readings Module
+
+    Each entity, sensor and type owns one row of a times array and a
+    values array, used as a ring buffer of the last readings. Rows are
+    allocated as new series arrive, up to the configured number of series;
+    after that the least recently updated series gives up its row. Memory
+    is therefore bounded by series x readings x 16 bytes. Values that are
+    not finite numbers are not kept.
+    """
+
+    def __init__(self, helpers):
+        """ Initializes the class. """
+
+        self.helpers = helpers
+        self.program = "HIAS Recent Readings Module"
+
+        self.confs = self.helpers.confs["agent"]["recent"]
+        self.readings = self.confs["readings"]
+
+        self.rows = {}
+        self.keys = []
+        self.entities = {}
+        self.capacity = 0
+        self.allocate(min(64, self.confs["series"]))
+
+        self.lock = threading.Lock()
+
+        self.helpers.logger.info(
+            self.program + " initialization complete.")
+
+    def allocate(self, capacity):
+        """ Allocates, or grows, the arrays to capacity series. """
+
+        times = np.zeros((capacity, self.readings))
+        values = np.zeros((capacity, self.readings))
+        heads = np.zeros(capacity, dtype=np.int64)
+        counts = np.zeros(capacity, dtype=np.int64)
+        updated = np.zeros(capacity)
+
+        if self.capacity:
+            used = self.capacity
+            times[:used] = self.times
+            values[:used] = self.values
+            heads[:used] = self.heads
+            counts[:used] = self.counts
+            updated[:used] = self.updated
+
+        self.times = times
+        self.values = values
+        self.heads = heads
+        self.counts = counts
+        self.updated = updated
+        self.capacity = capacity
+
+    def row(self, key):
+        """ Assigns a row to a new entity, sensor and type. """
+
+        if len(self.keys) < self.capacity:
+            row = len(self.keys)
+            self.keys.append(key)
+        elif self.capacity < self.confs["series"]:
+            self.allocate(min(self.capacity * 2, self.confs["series"]))
+            row = len(self.keys)
+            self.keys.append(key)
+        else:
+            row = int(np.argmin(self.updated))
+            evicted = self.keys[row]
+            del self.rows[evicted]
+            self.entities[evicted[0]].discard(row)
+            if not self.entities[evicted[0]]:
+                del self.entities[evicted[0]]
+            self.keys[row] = key
+            self.heads[row] = 0
+            self.counts[row] = 0
+
+        self.rows[key] = row
+        self.entities.setdefault(key[0], set()).add(row)
+
+        return row
+
+    def add(self, entity, sensor, typeof, value):
+        """ Keeps a sensor reading.
+
+        Args:
+            entity (str): The entity id.
+            sensor (str): The sensor name.
+            typeof (str): The sensor type.
+            value: The sensor value.
+        """
+
+        try:
+            value = float(value)
+        except (TypeError, ValueError):
+            return False
+
+        if not math.isfinite(value):
+            return False
+
+        key = (entity, sensor, typeof)
+
+        with self.lock:
+            now = time.time()
+
+            row = self.rows.get(key)
+            if row is None:
+                row = self.row(key)
+
+            head = self.heads[row]
+            self.times[row, head] = now
+            self.values[row, head] = value
+            self.heads[row] = (head + 1) % self.readings
+            if self.counts[row] < self.readings:
+                self.counts[row] += 1
+            self.updated[row] = now
+
+        return True
+
+    def query(self, entity, sensor=None, typeof=None, since=None,
+              until=None, limit=None):
+        """ Returns the recent readings of an entity.
+
+        Args:
+            entity (str): The entity id.
+            sensor (str): Only this sensor.
+            typeof (str): Only this sensor type.
+            since (float): Only readings at or after this time.
+            until (float): Only readings at or before this time.
+            limit (int): Only the latest limit readings of each series.
+
+        Returns:
+            list: A series per sensor and type, with Times and Values
+                columns oldest first, or None if the entity is unknown.
+        """
+
+        with self.lock:
+            if entity not in self.entities:
+                return None
+
+            series = []
+            for row in sorted(self.entities[entity]):
+                key = self.keys[row]
+                if sensor is not None and key[1] != sensor:
+                    continue
+                if typeof is not None and key[2] != typeof:
+                    continue
+
+                count = self.counts[row]
+                order = (self.heads[row] - count +
+                         np.arange(count)) % self.readings
+                times = self.times[row, order]
+                values = self.values[row, order]
+
+                start = 0 if since is None else \
+                    int(np.searchsorted(times, since, "left"))
+                end = count if until is None else \
+                    int(np.searchsorted(times, until, "right"))
+                if limit is not None:
+                    start = max(start, end - limit)
+
+                series.append({
+                    "Sensor": key[1],
+                    "Type": key[2],
+                    "Times": times[start:end].tolist(),
+                    "Values": values[start:end].tolist()
+                })
+
+        return series
+
+    def size(self):
+        """ Returns the (bytes, series) held. """
+
+        return (self.times.nbytes + self.values.nbytes + self.heads.nbytes +
+                self.counts.nbytes + self.updated.nbytes, len(self.rows))
@@ -0,0 +1,267 @@
+#!/usr/bin/env python3
+""" HIAS Resilience Module
+
+This module protects the HIAS IoT Agent from slow or failing backends with
+per-operation timeouts, circuit breakers and hedged duplicate reads.
+
+MIT License
+
+Copyright (c) 2023 Peter Moss Leukaemia MedTech Research CIC
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files(the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and / or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+
+Contributors:
+- Adam Milton-Barker
+
+"""
+
+
+import queue
+import threading
+import time
+
+from collections import deque
+
+
+class CircuitOpenException(Exception):
+    """ Raised when a backend call is refused by an open circuit breaker. """
+
+
+class breaker():
+    """ HIAS Circuit Breaker
+
+    Opens after a number of consecutive failures, failing calls fast
+    while the backend is unhealthy. After the reset period one probe call
+    is allowed through (half-open); its outcome closes or reopens the
+    breaker.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    STATES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+    def __init__(self, helpers, backend, confs):
+        """ Initializes the class. """
+
+        self.helpers = helpers
+        self.backend = backend
+
+        self.threshold = confs["failures"]
+        self.reset = confs["reset"]
+
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened = 0
+        self.probing = False
+        self.lock = threading.Lock()
+
+        self.helpers.metrics.gauge(
+            "breaker_state", self.STATES[self.state], {"backend": backend})
+
+    def transition(self, state):
+        """ Moves the breaker to a new state. Called with the lock held. """
+
+        self.helpers.metrics.increment("breaker_transitions", {
+            "backend": self.backend, "from": self.state, "to": state})
+        self.helpers.metrics.gauge(
+            "breaker_state", self.STATES[state], {"backend": self.backend})
+
+        self.helpers.logger.warning(
+            self.backend + " circuit breaker " + self.state + " -> " + state)
+
+        self.state = state
+
+    def allow(self):
+        """ Checks whether a call may be made to the backend. """
+
+        with self.lock:
+            if self.state == self.CLOSED:
+                return True
+
+            if self.state == self.OPEN:
+                if time.monotonic() - self.opened < self.reset:
+                    return False
+                self.transition(self.HALF_OPEN)
+
+            if self.probing:
+                return False
+
+            self.probing = True
+            return True
+
+    def success(self):
+        """ Records a successful call. """
+
+        with self.lock:
+            self.failures = 0
+            if self.state == self.HALF_OPEN:
+                self.probing = False
+                self.transition(self.CLOSED)
+
+    def failure(self):
+        """ Records a failed call. """
+
+        with self.lock:
+            self.failures += 1
+            if self.state == self.HALF_OPEN:
+                self.probing = False
+                self.opened = time.monotonic()
+                self.transition(self.OPEN)
+            elif self.state == self.CLOSED and self.failures >= self.threshold:
+                self.opened = time.monotonic()
+                self.transition(self.OPEN)
+
+
+class resilience():
+    """ HIAS Resilience Module
+
+    Wraps the calls made to one backend with its per-operation timeouts
+    and circuit breaker, and optionally hedges slow reads by sending a
+    duplicate request once a read takes longer than the configured
+    percentile of recent read latencies.
+    """
+
+    def __init__(self, helpers, backend):
+        """ Initializes the class. """
+
+        self.helpers = helpers
+        self.backend = backend
+
+        self.confs = self.helpers.confs["agent"]["resilience"][backend]
+        self.timeouts = self.confs["timeouts"]
+        self.hedging = self.confs["hedging"]
+
+        self.breaker = breaker(self.helpers, backend, self.confs["breaker"])
+
+        self.latencies = deque(maxlen=self.hedging["samples"])
+        self.hedge_delay = None
+        self.calls = 0
+
+    def timeout(self, operation):
+        """ Returns the timeout in seconds of a backend operation. """
+
+        return self.timeouts.get(operation, self.timeouts["default"])
+
+    def call(self, operation, fn, *args, **kwargs):
+        """ Calls the backend through the circuit breaker.
+
+        Calls raising an exception, or returning an HTTP response with a
+        5xx status, count as failures.
+
+        Args:
+            operation (str): The backend operation name.
+            fn (function): The function making the call.
+
+        Raises:
+            CircuitOpenException: The breaker is open.
+        """
+
+        if not self.breaker.allow():
+            self.helpers.metrics.increment("breaker_rejected", {
+                "backend": self.backend, "operation": operation})
+            raise CircuitOpenException(
+                self.backend + " unavailable (circuit open)")
+
+        start = time.monotonic()
+
+        try:
+            response = fn(*args, **kwargs)
+        except Exception:
+            self.breaker.failure()
+            self.helpers.metrics.increment("backend_errors", {
+                "backend": self.backend, "operation": operation})
+            raise
+
+        self.record(time.monotonic() - start)
+
+        if getattr(response, "status_code", 200) >= 500:
+            self.breaker.failure()
+            self.helpers.metrics.increment("backend_errors", {
+                "backend": self.backend, "operation": operation})
+        else:
+            self.breaker.success()
+
+        return response
+
+    def record(self, latency):
+        """ Records a call latency and refreshes the hedge delay. """
+
+        self.latencies.append(latency)
+        self.calls += 1
+
+        if self.calls % 50 == 0 and \
+                len(self.latencies) >= self.hedging["samples"]:
+            latencies = sorted(self.latencies)
+            index = int(len(latencies) * self.hedging["percentile"] / 100.0)
+            self.hedge_delay = max(
+                self.hedging["minDelay"],
+                latencies[min(index, len(latencies) - 1)])
+            self.helpers.metrics.gauge(
+                "hedge_delay", round(self.hedge_delay, 4),
+                {"backend": self.backend})
+
+    def hedged(self, operation, fn, *args, **kwargs):
+        """ Calls a read operation, hedging it if it is slow.
+
+        When hedging is enabled and enough latencies have been recorded, a
+        duplicate request is sent if the first has not answered within the
+        hedge delay, and the first response to arrive is returned.
+
+        Args:
+            operation (str): The backend operation name.
+            fn (function): The function making the call.
+        """
+
+        if not self.hedging["enabled"] or self.hedge_delay is None:
+            return self.call(operation, fn, *args, **kwargs)
+
+        results = queue.Queue()
+
+        def attempt(hedge):
+            try:
+                results.put((hedge, True, self.call(
+                    operation, fn, *args, **kwargs)))
+            except Exception as e:
+                results.put((hedge, False, e))
+
+        threading.Thread(target=attempt, args=(False,), daemon=True).start()
+
+        try:
+            hedge, ok, result = results.get(timeout=self.hedge_delay)
+            sent = 1
+        except queue.Empty:
+            self.helpers.metrics.increment("hedges_sent", {
+                "backend": self.backend, "operation": operation})
+            threading.Thread(target=attempt, args=(True,), daemon=True).start()
+            hedge, ok, result = results.get()
+            sent = 2
+
+        if not ok and sent == 2:
+            hedge, ok, result = results.get()
+
+        if ok and hedge:
+            self.helpers.metrics.increment("hedges_won", {
+                "backend": self.backend, "operation": operation})
+
+        if not ok:
+            raise result
+
+        return result
@@ -0,0 +1,292 @@
+#!/usr/bin/env python3
+""" HIAS Retry Module
+
+This module retries failed HIASCDI and HIASHDI writes off the ingest path
+with exponential backoff and jitter, moving writes that exhaust their retries
+to the dead letter store.
+
+MIT License
+
+Copyright (c) 2023 Peter Moss Leukaemia MedTech Research CIC
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files(the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and / or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+
+Contributors:
+- Adam Milton-Barker
+
+"""
+
+
+import heapq
+import itertools
+import random
+import threading
+import time
+
+
+class retry():
+    """ HIAS Retry Module
+
+    Failed writes are scheduled on a heap ordered by their next attempt
+    time and retried by worker threads, so transient backend errors do not
+    slow down the MQTT callbacks. Each backend has a budget of pending
+    retries; writes beyond it, and writes that exhaust their attempts, go
+    to the dead letter store. Writes that fail once the queue has been
+    drained at shutdown are kept to be spilled.
+    """
+
+    def __init__(self, helpers, deadletter):
+        """ Initializes the class. """
+
+        self.helpers = helpers
+        self.deadletter = deadletter
+        self.program = "HIAS Retry Module"
+
+        self.confs = self.helpers.confs["agent"]["retry"]
+
+        self.handlers = {}
+        self.heap = []
+        self.pending = {}
+        self.sequence = itertools.count()
+        self.condition = threading.Condition()
+        self.running = False
+        self.attempting = 0
+        self.drained = False
+        self.late = []
+
+        self.helpers.logger.info(
+            self.program + " initialization complete.")
+
+    def register(self, backend, operation, handler):
+        """ Registers the function that retries an operation.
+
+        Args:
+            backend (str): The backend, hiascdi or hiashdi.
+            operation (str): The operation name.
+            handler (function): Called with the operation arguments,
+                returns True when the write succeeded.
+        """
+
+        self.handlers[(backend, operation)] = handler
+
+    def start(self):
+        """ Starts the retry worker threads. """
+
+        self.running = True
+        for i in range(self.confs["workers"]):
+            threading.Thread(target=self.run, daemon=True).start()
+
+        self.helpers.logger.info(
+            self.program + " started.")
+
+    def stop(self):
+        """ Stops the retry worker threads. """
+
+        with self.condition:
+            self.running = False
+            self.condition.notify_all()
+
+    def backoff(self, attempts):
+        """ Returns the delay before the next attempt, with full jitter. """
+
+        return random.uniform(0, min(
+            self.confs["maxDelay"], self.confs["baseDelay"] * 2 ** attempts))
+
+    def schedule(self, backend, operation, args, record=None):
+        """ Schedules a failed write for retry.
+
+        Args:
+            backend (str): The backend, hiascdi or hiashdi.
+            operation (str): The operation name.
+            args (list): The JSON serializable operation arguments.
+            record (dict): The record of a write already retried.
+        """
+
+        if record is None:
+            record = {
+                "backend": backend,
+                "operation": operation,
+                "args": args,
+                "attempts": 0,
+                "created": time.time()
+            }
+
+        with self.condition:
+            if self.drained:
+                if self.late is not None:
+                    self.late.append(record)
+                    return True
+                budget = None
+            elif self.pending.get(backend, 0) >= self.confs["budget"][backend]:
+                budget = True
+            else:
+                budget = False
+                self.pending[backend] = self.pending.get(backend, 0) + 1
+                heapq.heappush(self.heap, (
+                    time.monotonic() + self.backoff(record["attempts"]),
+                    next(self.sequence), record))
+                self.condition.notify()
+
+        if budget is None:
+            # Failed after the late writes were spilled
+            self.deadletter.add(record)
+            return False
+
+        if budget:
+            self.helpers.metrics.increment(
+                "retry_budget_exhausted", {"backend": backend})
+            self.deadletter.add(record)
+            return False
+
+        self.helpers.metrics.increment(
+            "retry_scheduled", {"backend": backend})
+
+        return True
+
+    def next(self):
+        """ Waits for and returns the next record due for retry. """
+
+        with self.condition:
+            while self.running:
+                if not self.heap:
+                    self.condition.wait()
+                    continue
+
+                delay = self.heap[0][0] - time.monotonic()
+                if delay > 0:
+                    self.condition.wait(delay)
+                    continue
+
+                record = heapq.heappop(self.heap)[2]
+                self.pending[record["backend"]] -= 1
+                self.attempting += 1
+                return record
+
+        return None
+
+    def run(self):
+        """ Retries scheduled writes until stopped. """
+
+        while self.running:
+            record = self.next()
+            if record is None:
+                return
+            try:
+                self.attempt(record)
+            finally:
+                with self.condition:
+                    self.attempting -= 1
+                    self.condition.notify_all()
+
+    def attempt(self, record):
+        """ Attempts a scheduled write once. """
+
+        backend = record["backend"]
+        record["attempts"] += 1
+
+        try:
+            ok = self.handlers[(backend, record["operation"])](*record["args"])
+        except Exception as e:
+            self.helpers.logger.error(
+                backend + " " + record["operation"] + " retry error: " + str(e))
+            ok = False
+
+        if ok:
+            self.helpers.metrics.increment(
+                "retry_succeeded", {"backend": backend})
+            self.helpers.logger.info(
+                backend + " " + record["operation"] + " retry OK after " +
+                str(record["attempts"]) + " attempts")
+            return True
+
+        self.helpers.metrics.increment(
+            "retry_failed", {"backend": backend})
+
+        if record["attempts"] >= self.confs["attempts"]:
+            self.deadletter.add(record)
+        else:
+            self.schedule(backend, record["operation"], record["args"], record)
+
+        return False
+
+    def drain(self, deadline):
+        """ Stops the workers and attempts every queued write once.
+
+        Retries the workers are still attempting are waited for, so those
+        that fail are queued first.
+
+        Args:
+            deadline (float): The time.monotonic() deadline.
+
+        Returns:
+            tuple: The number of writes that succeeded, and the records of
+                the writes that failed or were not attempted in time.
+        """
+
+        self.stop()
+
+        with self.condition:
+            while self.attempting and time.monotonic() < deadline:
+                self.condition.wait(deadline - time.monotonic())
+            records = [entry[2] for entry in sorted(self.heap)]
+            self.heap = []
+            self.pending = {}
+            self.drained = True
+
+        succeeded = 0
+        left = []
+        for record in records:
+            if time.monotonic() >= deadline:
+                left.append(record)
+                continue
+
+            backend = record["backend"]
+            record["attempts"] += 1
+            try:
+                ok = self.handlers[(backend, record["operation"])](
+                    *record["args"])
+            except Exception as e:
+                self.helpers.logger.error(
+                    backend + " " + record["operation"] + " drain error: " +
+                    str(e))
+                ok = False
+
+            if ok:
+                succeeded += 1
+            else:
+                left.append(record)
+
+        return succeeded, left
+
+    def leftover(self):
+        """ Returns the writes that failed after the drain. Writes failing
+        later go to the dead letter store.
+        """
+
+        with self.condition:
+            late = self.late
+            self.late = None
+
+        return late
+
+    def queued(self):
+        """ Returns the records waiting for retry. """
+
+        with self.condition:
+            return [entry[2] for entry in self.heap]
@@ -0,0 +1,383 @@
+#!/usr/bin/env python3
+""" HIAS Rollups Module
+
+Keeps windowed min, max, mean and count statistics of numeric sensor values
+per entity and sensor, and emits one rollup record per window and
+resolution when the window closes.
+
+MIT License
+
+Copyright (c) 2023 Peter Moss Leukaemia MedTech Research CIC
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files(the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and / or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+
+Contributors:
+- Adam Milton-Barker
+
+"""
+
+
+import math
+import threading
+import time
+
+import numpy as np
+
+
+class rollups():
+    """ HIAS Rollups Module
+
+    Statistics are kept in slots x resolutions numpy arrays, one slot per
+    entity, sensor and type, so a value updates every resolution with one
+    vectorized operation. Windows are aligned to multiples of their
+    resolution. When a window has closed, its active slots are turned into
+    rollup records, the window is reset, and the records are handed to the
+    writer on the rollup thread.
+
+    At shutdown the open windows are returned to be spilled instead of
+    written, and restored at the next start, so a window is only written
+    once, when it has closed. Series with no values in any open window for
+    idle seconds are dropped and their slots reused.
+    """
+
+    def __init__(self, helpers, writer):
+        """ Initializes the class.
+
+        Args:
+            helpers (:obj:`helpers`): The agent helpers.
+            writer (function): Called with each list of closed rollups.
+        """
+
+        self.helpers = helpers
+        self.writer = writer
+        self.program = "HIAS Rollups Module"
+
+        self.confs = self.helpers.confs["agent"]["rollups"]
+
+        self.resolutions = np.array(self.confs["resolutions"], dtype=np.int64)
+        self.capacity = self.confs["capacity"]
+
+        self.slots = {}
+        self.keys = []
+        self.free = []
+        self.allocate(self.capacity)
+
+        now = time.time()
+        self.starts = (now // self.resolutions) * self.resolutions
+        self.next = float((self.starts + self.resolutions).min())
+
+        self.pending = []
+        self.lock = threading.Lock()
+        self.wake = threading.Event()
+        self.running = False
+
+        self.helpers.logger.info(
+            self.program + " initialization complete.")
+
+    def allocate(self, capacity):
+        """ Allocates, or grows, the statistic arrays to capacity slots. """
+
+        shape = (capacity, len(self.resolutions))
+        arrays = {
+            "min": np.full(shape, np.inf),
+            "max": np.full(shape, -np.inf),
+            "sum": np.zeros(shape),
+            "count": np.zeros(shape, dtype=np.int64)
+        }
+        last = np.full(capacity, np.inf)
+
+        if hasattr(self, "min"):
+            used = self.min.shape[0]
+            arrays["min"][:used] = self.min
+            arrays["max"][:used] = self.max
+            arrays["sum"][:used] = self.sum
+            arrays["count"][:used] = self.count
+            last[:used] = self.last
+
+        self.min = arrays["min"]
+        self.max = arrays["max"]
+        self.sum = arrays["sum"]
+        self.count = arrays["count"]
+        self.last = last
+        self.capacity = capacity
+
+    def start(self):
+        """ Starts the thread closing windows and writing rollups. """
+
+        self.running = True
+        threading.Thread(target=self.run, daemon=True).start()
+
+    def stop(self):
+        """ Stops the rollup thread, writes the closed windows and returns
+        the open ones.
+
+        Returns:
+            tuple: The number of rollups written, and the state of the open
+                windows, see restore.
+        """
+
+        self.running = False
+        self.wake.set()
+
+        with self.lock:
+            self.close(time.time())
+            records = self.take()
+            state = self.state()
+
+        if len(records):
+            self.writer(records)
+
+        return len(records), state
+
+    def state(self):
+        """ Returns the open windows of every series. Must hold the lock. """
+
+        state = []
+        for row in range(len(self.resolutions)):
+            for slot in np.nonzero(self.count[:, row])[0].tolist():
+                record = dict(self.keys[slot])
+                record.update({
+                    "Resolution": int(self.resolutions[row]),
+                    "Start": float(self.starts[row]),
+                    "Min": float(self.min[slot, row]),
+                    "Max": float(self.max[slot, row]),
+                    "Sum": float(self.sum[slot, row]),
+                    "Count": int(self.count[slot, row])
+                })
+                state.append(record)
+
+        return state
+
+    def restore(self, state):
+        """ Restores the open windows returned by stop.
+
+        Windows that are still open are merged into the current windows,
+        those that closed while the agent was stopped are written.
+
+        Args:
+            state (list): The open windows.
+
+        Returns:
+            int: The number of windows restored.
+        """
+
+        rows = {int(resolution): row
+                for row, resolution in enumerate(self.resolutions)}
+        records = []
+
+        with self.lock:
+            now = time.time()
+            for window in state:
+                row = rows.get(window["Resolution"])
+                if row is None:
+                    continue
+
+                if window["Start"] != self.starts[row]:
+                    record = {name: window[name] for name in [
+                        "Entity", "EntityType", "Location", "Zone", "Sensor",
+                        "Type", "Resolution", "Start", "Min", "Max", "Count"]}
+                    record["End"] = window["Start"] + window["Resolution"]
+                    record["Mean"] = window["Sum"] / window["Count"]
+                    records.append(record)
+                    continue
+
+                key = (window["Entity"], window["Sensor"], window["Type"])
+                slot = self.slots.get(key)
+                if slot is None:
+                    slot = self.slot(key, window["EntityType"],
+                                     window["Location"], window["Zone"])
+
+                self.min[slot, row] = min(self.min[slot, row], window["Min"])
+                self.max[slot, row] = max(self.max[slot, row], window["Max"])
+                self.sum[slot, row] += window["Sum"]
+                self.count[slot, row] += window["Count"]
+                self.last[slot] = now
+
+        if len(records):
+            self.writer(records)
+
+        return len(state)
+
+    def run(self):
+        """ Closes windows on time and writes the closed rollups. """
+
+        while self.running:
+            self.wake.wait(self.confs["interval"])
+            self.wake.clear()
+
+            with self.lock:
+                now = time.time()
+                self.close(now)
+                records = self.take()
+                self.prune(now - self.confs["idle"])
+
+            if len(records):
+                self.writer(records)
+
+    def add(self, entity, entity_type, location, zone, sensor, typeof, value):
+        """ Adds a sensor value to every resolution of its rollup.
+
+        Values that are not finite numbers are ignored.
+
+        Args:
+            entity (str): The entity id.
+            entity_type (str): The entity type.
+            location (str): The entity location.
+            zone (str): The entity zone.
+            sensor (str): The sensor name.
+            typeof (str): The sensor type.
+            value: The sensor value.
+        """
+
+        try:
+            value = float(value)
+        except (TypeError, ValueError):
+            return False
+
+        if not math.isfinite(value):
+            return False
+
+        key = (entity, sensor, typeof)
+
+        with self.lock:
+            now = time.time()
+            if now >= self.next and self.close(now):
+                self.wake.set()
+
+            slot = self.slots.get(key)
+            if slot is None:
+                slot = self.slot(key, entity_type, location, zone)
+
+            np.minimum(self.min[slot], value, out=self.min[slot])
+            np.maximum(self.max[slot], value, out=self.max[slot])
+            self.sum[slot] += value
+            self.count[slot] += 1
+            self.last[slot] = now
+
+        return True
+
+    def slot(self, key, entity_type, location, zone):
+        """ Assigns a free slot to a new entity, sensor and type. """
+
+        keys = {
+            "Entity": key[0],
+            "EntityType": entity_type,
+            "Location": location,
+            "Zone": zone,
+            "Sensor": key[1],
+            "Type": key[2]
+        }
+
+        if self.free:
+            slot = self.free.pop()
+            self.keys[slot] = keys
+        else:
+            slot = len(self.keys)
+            if slot == self.capacity:
+                self.allocate(self.capacity * 2)
+            self.keys.append(keys)
+
+        self.slots[key] = slot
+
+        return slot
+
+    def prune(self, older):
+        """ Drops the series with no values in any open window and none
+        added since older. Must hold the lock.
+
+        Returns:
+            int: The number of series dropped.
+        """
+
+        used = len(self.keys)
+        idle = np.nonzero((self.count[:used].sum(axis=1) == 0) &
+                          (self.last[:used] < older))[0].tolist()
+
+        for slot in idle:
+            keys = self.keys[slot]
+            del self.slots[(keys["Entity"], keys["Sensor"], keys["Type"])]
+            self.keys[slot] = None
+            self.last[slot] = np.inf
+            self.free.append(slot)
+
+        return len(idle)
+
+    def evict(self):
+        """ Drops every series with no values in any open window.
+
+        Returns:
+            int: The number of series dropped.
+        """
+
+        with self.lock:
+            return self.prune(np.inf)
+
+    def close(self, now):
+        """ Closes the windows that ended before now.
+
+        Must be called holding the lock. The rollups of the closed windows
+        are added to the pending records.
+
+        Args:
+            now (float): The current epoch time.
+        """
+
+        ends = self.starts + self.resolutions
+        closing = np.nonzero(ends <= now)[0]
+
+        for row in closing:
+            slots = np.nonzero(self.count[:, row])[0]
+
+            if len(slots):
+                count = self.count[slots, row]
+                mean = self.sum[slots, row] / count
+                end = min(ends[row], now)
+
+                for i, slot in enumerate(slots.tolist()):
+                    record = dict(self.keys[slot])
+                    record.update({
+                        "Resolution": int(self.resolutions[row]),
+                        "Start": float(self.starts[row]),
+                        "End": float(end),
+                        "Min": float(self.min[slot, row]),
+                        "Max": float(self.max[slot, row]),
+                        "Mean": float(mean[i]),
+                        "Count": int(count[i])
+                    })
+                    self.pending.append(record)
+
+            self.min[:, row] = np.inf
+            self.max[:, row] = -np.inf
+            self.sum[:, row] = 0
+            self.count[:, row] = 0
+
+            self.starts[row] = (now // self.resolutions[row]) * \
+                self.resolutions[row]
+
+        self.next = float((self.starts + self.resolutions).min())
+
+        return len(closing)
+
+    def take(self):
+        """ Returns and clears the pending records. Must hold the lock. """
+
+        records = self.pending
+        self.pending = []
+
+        return records
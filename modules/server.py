@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+""" HIAS North Port Server Module
+
+This module serves the HIAS IoT Agent North Port API using the gevent WSGI
+server, with bounded concurrency, keep-alive, request timeouts and a
+bounded accept backlog.
+
+MIT License
+
+Copyright (c) 2023 Peter Moss Leukaemia MedTech Research CIC
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files(the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and / or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+
+Contributors:
+- Adam Milton-Barker
+
+"""
+
+
+import json
+
+from gevent import Timeout
+from gevent.pool import Pool
+from gevent.pywsgi import WSGIHandler, WSGIServer
+
+
+class handler(WSGIHandler):
+    """ North Port Request Handler
+
+    Closes idle keep-alive connections after the keep-alive timeout, or
+    after every request when keep-alive is disabled.
+    """
+
+    keepalive = 5
+
+    def handle(self):
+        """ Handles the requests sent on one connection. """
+
+        if self.keepalive:
+            self.socket.settimeout(self.keepalive)
+
+        super().handle()
+
+    def read_request(self, raw_requestline):
+        """ Reads a request and applies the keep-alive setting. """
+
+        response = super().read_request(raw_requestline)
+
+        if not self.keepalive:
+            self.close_connection = True
+
+        return response
+
+
+class server():
+    """ HIAS North Port Server Module
+
+    This module serves the HIAS IoT Agent North Port API using the gevent
+    WSGI server.
+    """
+
+    def __init__(self, helpers, app):
+        """ Initializes the class. """
+
+        self.helpers = helpers
+        self.app = app
+        self.program = "HIAS North Port Server Module"
+
+        self.confs = self.helpers.confs["agent"]["server"]
+        self.timeout = self.confs["timeout"]
+
+        self.wsgi = None
+
+        self.helpers.logger.info(
+            self.program + " initialization complete.")
+
+    def application(self, environ, start_response):
+        """ Runs a request, responding 504 if it exceeds the timeout. """
+
+        timer = Timeout(self.timeout)
+        timer.start()
+
+        try:
+            return self.app(environ, start_response)
+        except Timeout as t:
+            if t is not timer:
+                raise
+            self.helpers.logger.error(
+                environ["PATH_INFO"] + " request timed out")
+            start_response("504 Gateway Timeout", [
+                ("Content-Type", "application/json")])
+            return [json.dumps(
+                self.helpers.confs["errorMessages"]["504"]).encode("utf-8")]
+        finally:
+            timer.close()
+
+    def serve(self, host, port):
+        """ Starts the server and serves requests until stopped.
+
+        Args:
+            host (str): The North Port host.
+            port (int): The North Port port.
+        """
+
+        handler.keepalive = self.confs["keepalive"]
+
+        self.wsgi = WSGIServer(
+            (host, int(port)), self.application,
+            backlog=self.confs["backlog"],
+            spawn=Pool(self.confs["concurrency"]),
+            handler_class=handler)
+
+        self.helpers.logger.info(
+            "North Port serving on " + host + ":" + str(port) + " (" +
+            str(self.confs["concurrency"]) + " concurrent requests)")
+
+        self.wsgi.serve_forever()
+
+    def stop(self, timeout=None):
+        """ Stops the server. """
+
+        if self.wsgi is not None:
+            self.wsgi.stop(timeout)
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+""" HIAS Spill Module
+
+Stores the work left when the agent shuts down, so that it can be replayed
+when the agent next starts.
+
+MIT License
+
+Copyright (c) 2023 Peter Moss Leukaemia MedTech Research CIC
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files(the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and / or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+
+Contributors:
+- Adam Milton-Barker
+
+"""
+
+
+import json
+import os
+import threading
+
+
+class spill():
+    """ HIAS Spill Module
+
+    Spilled work is appended as JSON lines to one file per kind (writes,
+    messages, rollups) in the spill directory of the agent data path.
+    Loading a kind removes its file, so each record is replayed once.
+    """
+
+    def __init__(self, helpers):
+        """ Initializes the class. """
+
+        self.helpers = helpers
+        self.program = "HIAS Spill Module"
+
+        self.path = self.helpers.data("spill")
+
+        self.lock = threading.Lock()
+
+    def file(self, kind):
+        """ Returns the spill file of a kind of work. """
+
+        return self.path + kind + ".jsonl"
+
+    def add(self, kind, records):
+        """ Spills records.
+
+        Args:
+            kind (str): The kind of work, writes or messages.
+            records (list): The JSON serializable records.
+
+        Returns:
+            int: The number of records spilled.
+        """
+
+        if not records:
+            return 0
+
+        with self.lock:
+            os.makedirs(self.path, exist_ok=True)
+            with open(self.file(kind), "a") as spilled:
+                for record in records:
+                    spilled.write(json.dumps(record, default=str) + "\n")
+
+        return len(records)
+
+    def load(self, kind):
+        """ Returns and removes the spilled records of a kind. """
+
+        path = self.file(kind)
+
+        with self.lock:
+            if not os.path.exists(path):
+                return []
+            with open(path) as spilled:
+                records = [json.loads(line) for line in spilled
+                           if line.strip()]
+            os.remove(path)
+
+        return records
@@ -0,0 +1,200 @@
+#!/usr/bin/env python3
+""" HIAS Stages Module
+
+Runs the stages of a callback as a dependency graph, so stages that do
+not depend on each other run at the same time.
+
+MIT License
+
+Copyright (c) 2023 Peter Moss Leukaemia MedTech Research CIC
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files(the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and / or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+
+Contributors:
+- Adam Milton-Barker
+
+"""
+
+
+import threading
+
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+
+class graph():
+    """ The stages of one message.
+
+    A stage is a function called with the results of the stages it
+    depends on. A stage that returns False or raises is failed, and the
+    stages that depend on it are skipped.
+    """
+
+    def __init__(self, stages):
+        """ Initializes the graph.
+
+        Args:
+            stages (:obj:`stages`): The stage runner.
+        """
+
+        self.stages = stages
+        self.order = []
+        self.functions = {}
+        self.after = {}
+
+    def add(self, name, function, after=()):
+        """ Adds a stage.
+
+        Args:
+            name (str): The stage name, also its trace span name.
+            function (function): Called with the results dict.
+            after (tuple): The names of the stages it depends on.
+        """
+
+        self.order.append(name)
+        self.functions[name] = function
+        self.after[name] = tuple(after)
+
+        return self
+
+    def run(self):
+        """ Runs the stages.
+
+        Returns:
+            dict: The result of each stage that ran.
+
+        Raises:
+            Exception: The first exception raised by a stage, once the
+                stages already running have finished.
+        """
+
+        return self.stages.run(self)
+
+
+class stages():
+    """ HIAS Stages Module
+
+    Every stage whose dependencies have finished is started at once, so a
+    message takes as long as its longest chain of stages rather than the
+    sum of all of them. When only one stage can run it runs in the calling
+    thread. The pool threads are greenlets when the agent is monkey
+    patched by gevent. When disabled, stages run one by one in the order
+    they were added.
+    """
+
+    def __init__(self, helpers, tracer):
+        """ Initializes the class. """
+
+        self.helpers = helpers
+        self.tracer = tracer
+        self.program = "HIAS Stages Module"
+
+        self.confs = self.helpers.confs["agent"]["stages"]
+
+        self.pool = None
+        self.lock = threading.Lock()
+
+        self.helpers.logger.info(
+            self.program + " initialization complete.")
+
+    def graph(self):
+        """ Returns an empty stage graph. """
+
+        return graph(self)
+
+    def executor(self):
+        """ Returns the thread pool, created on first use. """
+
+        with self.lock:
+            if self.pool is None:
+                self.pool = ThreadPoolExecutor(
+                    max_workers=self.confs["workers"],
+                    thread_name_prefix="Stage")
+
+        return self.pool
+
+    def call(self, name, function, results, trace):
+        """ Runs a stage inside its trace span. """
+
+        self.tracer.local.trace = trace
+        try:
+            with self.tracer.span(name):
+                return function(results)
+        finally:
+            self.tracer.local.trace = None
+
+    def run(self, stages):
+        """ Runs the stages of a graph. """
+
+        results = {}
+
+        if not self.confs["enabled"]:
+            for name in stages.order:
+                if all(results.get(before, False) is not False
+                       for before in stages.after[name]):
+                    with self.tracer.span(name):
+                        results[name] = stages.functions[name](results)
+            return results
+
+        trace = getattr(self.tracer.local, "trace", None)
+        waiting = list(stages.order)
+        running = {}
+        error = None
+
+        while waiting or running:
+            ready = []
+            unfinished = set(waiting) | set(running.values())
+            for name in list(waiting):
+                after = stages.after[name]
+                if any(before in unfinished for before in after):
+                    continue
+                waiting.remove(name)
+                if error is None and all(
+                        results.get(before, False) is not False
+                        for before in after):
+                    ready.append(name)
+
+            if len(ready) == 1 and not running:
+                name = ready[0]
+                try:
+                    with self.tracer.span(name):
+                        results[name] = stages.functions[name](results)
+                except Exception as e:
+                    error = e
+                continue
+
+            for name in ready:
+                running[self.executor().submit(
+                    self.call, name, stages.functions[name],
+                    results, trace)] = name
+
+            if not running:
+                continue
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                name = running.pop(future)
+                try:
+                    results[name] = future.result()
+                except Exception as e:
+                    error = error or e
+
+        if error is not None:
+            raise error
+
+        return results
@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+""" HIAS Tracer Module
+
+This module records per-message stage timings (spans) for the HIAS IoT Agent
+callbacks, keeping recent traces in memory and optionally in a rotating file.
+
+MIT License
+
+Copyright (c) 2023 Peter Moss Leukaemia MedTech Research CIC
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files(the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and / or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+
+Contributors:
+- Adam Milton-Barker
+
+"""
+
+
+import json
+import logging
+import logging.handlers as handlers
+import os
+import random
+import threading
+import time
+
+from collections import deque
+
+
+class nospan():
+    """ Span used when a message is not traced. """
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+NOSPAN = nospan()
+
+
+class span():
+    """ Records the duration of one stage of a traced message. """
+
+    __slots__ = ("trace", "name", "start")
+
+    def __init__(self, trace, name):
+        self.trace = trace
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        end = time.perf_counter()
+        self.trace["spans"].append({
+            "name": self.name,
+            "start": round((self.start - self.trace["t0"]) * 1000, 3),
+            "ms": round((end - self.start) * 1000, 3),
+            "error": exc_type.__name__ if exc_type is not None else None
+        })
+        return False
+
+
+class tracer():
+    """ HIAS Tracer Module
+
+    Each sampled message gets a trace id, and each stage of its callback
+    records a span. Finished traces are kept in an in-memory ring and can
+    be exported to a rotating file.
+    """
+
+    def __init__(self, helpers):
+        """ Initializes the class. """
+
+        self.helpers = helpers
+        self.program = "HIAS Tracer Module"
+
+        self.confs = self.helpers.confs["agent"]["tracing"]
+        self.enabled = self.confs["enabled"]
+        self.sample = self.confs["sample"]
+
+        self.local = threading.local()
+        self.ring = deque(maxlen=self.confs["ring"])
+
+        self.exporter = None
+        if self.enabled and self.confs["file"]:
+            self.exporter = logging.getLogger("Traces")
+            self.exporter.setLevel(logging.INFO)
+            self.exporter.propagate = False
+            traceHandler = handlers.TimedRotatingFileHandler(
+                os.path.dirname(os.path.abspath(__file__)) + '/../logs/traces.log',
+                when='H', interval=1, backupCount=self.confs["backups"])
+            traceHandler.setFormatter(logging.Formatter('%(message)s'))
+            self.exporter.addHandler(traceHandler)
+
+        self.helpers.logger.info(
+            self.program + " initialization complete.")
+
+    def begin(self, channel, topic):
+        """ Starts tracing a message if it is sampled.
+
+        Args:
+            channel (str): The channel the message was received on.
+            topic (str): The topic the message was sent to.
+        """
+
+        if not self.enabled or random.random() >= self.sample:
+            self.local.trace = None
+            return
+
+        self.local.trace = {
+            "id": os.urandom(8).hex(),
+            "channel": channel,
+            "topic": topic,
+            "time": time.time(),
+            "t0": time.perf_counter(),
+            "spans": []
+        }
+
+    def span(self, name):
+        """ Returns a context manager recording a stage of the current trace.
+
+        Args:
+            name (str): The stage name.
+        """
+
+        if not self.enabled:
+            return NOSPAN
+
+        trace = getattr(self.local, "trace", None)
+        if trace is None:
+            return NOSPAN
+
+        return span(trace, name)
+
+    def finish(self, status="OK"):
+        """ Finishes the current trace and exports it.
+
+        Args:
+            status (str): The outcome of the message.
+        """
+
+        if not self.enabled:
+            return
+
+        trace = getattr(self.local, "trace", None)
+        if trace is None:
+            return
+
+        self.local.trace = None
+
+        trace["ms"] = round((time.perf_counter() - trace.pop("t0")) * 1000, 3)
+        trace["status"] = status
+
+        self.ring.append(trace)
+
+        if self.exporter is not None:
+            self.exporter.info(json.dumps(trace))
+
+    def recent(self, limit=100):
+        """ Returns the most recent finished traces, newest first.
+
+        Args:
+            limit (int): The maximum number of traces to return.
+        """
+
+        traces = list(self.ring)
+        traces.reverse()
+
+        return traces[:limit]
@@ -0,0 +1,188 @@
+#!/usr/bin/env python3
+""" HIAS Validation Module
+
+Validates decoded iotJumpWay payloads against the fields each channel
+callback uses, before any backend is called.
+
+MIT License
+
+Copyright (c) 2023 Peter Moss Leukaemia MedTech Research CIC
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files(the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and / or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+
+Contributors:
+- Adam Milton-Barker
+
+"""
+
+
+NUMBER = (int, float)
+
+# Fields of each channel. A trailing ? marks an optional field. str fields
+# must be strings, number fields numbers or numeric strings and any fields
+# only need to be present.
+SCHEMAS = {
+    "Sensors": {
+        "Sensor": "str", "Type": "str", "Value": "any", "Message": "any"
+    },
+    "Actuators": {
+        "Name": "str", "Type": "str", "Property": "str", "Value": "any",
+        "Message": "any"
+    },
+    "Commands": {
+        "Use": "str", "To": "str", "Zone": "str", "Property": "str",
+        "Type": "str", "Value": "any", "Message": "any"
+    },
+    "State": {
+        "State": "str", "Type": "str", "Message": "any"
+    },
+    "Classification": {
+        "Model": "str", "Message": "any", "State": "str?", "Type": "str?",
+        "Value": "any?"
+    },
+    "BCI": {
+        "Sensor": "str", "Type": "str", "Value": "any", "Message": "any"
+    },
+    "Life": {
+        "CPU": "number", "Memory": "number", "Diskspace": "number",
+        "Temperature": "number", "Latitude": "number", "Longitude": "number"
+    },
+    "Notifications": {
+        "Use": "str", "From": "str", "FromType": "str", "To": "str",
+        "Message": "any"
+    }
+}
+
+# Fields that require another field, and groups of which at least one
+# field must be present.
+REQUIRES = {
+    "Classification": {"Type": "Value"}
+}
+
+ANY_OF = {
+    "Classification": [("Value", "State")]
+}
+
+
+class ValidationException(Exception):
+    """ Raised when a payload does not match its channel schema. """
+
+
+def numeric(value):
+    """ Returns True if a string holds a number. """
+
+    if type(value) is not str:
+        return False
+
+    try:
+        float(value)
+    except ValueError:
+        return False
+
+    return True
+
+
+def generate(channel):
+    """ Generates the source of the validator of a channel.
+
+    The validator is straight line code, one check per field, so that a
+    valid payload costs a few attribute lookups rather than a walk over
+    the schema.
+    """
+
+    lines = [
+        "def validate(data):",
+        "    if type(data) is not dict:",
+        "        raise ValidationException(%r)" % (
+            channel + " payload is not a JSON object")
+    ]
+
+    for field, kind in SCHEMAS[channel].items():
+        optional = kind.endswith("?")
+        kind = kind.rstrip("?")
+
+        if kind == "any":
+            if not optional:
+                lines.append("    if %r not in data:" % field)
+                lines.append("        raise ValidationException(%r)" % (
+                    channel + " payload is missing " + field))
+            continue
+
+        if kind == "str":
+            check = "type(value) is not str"
+            error = channel + " " + field + " must be a string"
+        else:
+            check = "type(value) not in NUMBER and not numeric(value)"
+            error = channel + " " + field + " must be a number"
+
+        indent = "    "
+        if optional:
+            lines.append("    if %r in data:" % field)
+            indent = "        "
+
+        lines.append(indent + "value = data.get(%r)" % field)
+        lines.append(indent + "if " + check + ":")
+        lines.append(indent + "    raise ValidationException(%r)" % error)
+
+    for field, required in REQUIRES.get(channel, {}).items():
+        lines.append("    if %r in data and %r not in data:" % (
+            field, required))
+        lines.append("        raise ValidationException(%r)" % (
+            channel + " payload with " + field + " is missing " + required))
+
+    for fields in ANY_OF.get(channel, []):
+        lines.append("    if " + " and ".join(
+            "%r not in data" % field for field in fields) + ":")
+        lines.append("        raise ValidationException(%r)" % (
+            channel + " payload needs one of " + ", ".join(fields)))
+
+    return "\n".join(lines) + "\n"
+
+
+def compile_validator(channel):
+    """ Compiles the validator of a channel. """
+
+    scope = {
+        "NUMBER": NUMBER,
+        "ValidationException": ValidationException,
+        "numeric": numeric
+    }
+    exec(compile(generate(channel), "<validator " + channel + ">", "exec"),
+         scope)
+
+    return scope["validate"]
+
+
+validators = {channel: compile_validator(channel) for channel in SCHEMAS}
+
+
+def validate(channel, data):
+    """ Validates the decoded payload of a channel.
+
+    Args:
+        channel (str): The channel, for example Sensors.
+        data: The decoded payload.
+
+    Raises:
+        ValidationException: The payload is invalid.
+    """
+
+    validator = validators.get(channel)
+    if validator is not None:
+        validator(data)
@@ -9,9 +9,11 @@ if [ "$proceed" = "Y" -o "$proceed" = "y" ]; then
     echo "- Installing HIAS MQTT IoT Agent"
     conda install -c anaconda bcrypt
     conda install flask
+    conda install numpy
     conda install -c conda-forge paho-mqtt
     conda install psutil
     conda install requests
+    conda install zstandard
     conda install -c conda-forge web3
     printf -- '\033[32m SUCCESS: HIAS MQTT IoT Agent installed! \033[0m\n';
 else
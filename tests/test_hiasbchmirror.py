@@ -0,0 +1,149 @@
+""" Tests the HIASBCH Mirror Module against an eth-tester chain.
+
+Requires eth-tester with the py-evm backend:
+
+    pip3 install "eth-tester[py-evm]==0.6.0b7"
+    python3 -m pytest tests
+
+"""
+
+import logging
+import os
+import sys
+import time
+import types
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+pytest.importorskip("eth_tester")
+
+from web3 import EthereumTesterProvider, Web3
+
+from modules.hiasbchmirror import hiasbchmirror
+from modules.metrics import metrics
+
+# Stores calldata word 2 at key word 1 and logs LOG2(word 0, word 1), or
+# returns the stored value of an accessAllowed(address) call.
+RUNTIME = "60243614601a57604035602035556020356000356000600" + \
+    "0a2005b6004355460005260206000f3"
+ABI = [{
+    "type": "event", "name": name, "anonymous": False,
+    "inputs": [{"name": "entity", "type": "address", "indexed": True}]
+} for name in ["AccessGranted", "AccessRevoked"]] + [{
+    "type": "function", "name": "accessAllowed", "stateMutability": "view",
+    "inputs": [{"name": "entity", "type": "address"}],
+    "outputs": [{"name": "", "type": "bool"}]
+}]
+
+
+class events():
+    """ Records the block range of each getLogs call. """
+
+    def __init__(self, contract):
+        self.contract = contract
+        self.ranges = []
+
+    def __getitem__(self, name):
+        event = self.contract.events[name]
+
+        def getLogs(fromBlock, toBlock):
+            self.ranges.append((fromBlock, toBlock))
+            return event.getLogs(fromBlock=fromBlock, toBlock=toBlock)
+
+        return types.SimpleNamespace(getLogs=getLogs)
+
+
+@pytest.fixture
+def chain():
+    w3 = Web3(EthereumTesterProvider())
+    owner = w3.eth.accounts[0]
+
+    runtime = bytes.fromhex(RUNTIME)
+    deploy = bytes.fromhex("60%02x80600b6000396000f3" % len(runtime))
+    receipt = w3.eth.wait_for_transaction_receipt(w3.eth.send_transaction({
+        "from": owner, "data": deploy + runtime}))
+    contract = w3.eth.contract(address=receipt.contractAddress, abi=ABI)
+
+    def emit(event, address, allowed):
+        w3.eth.send_transaction({
+            "from": owner, "to": contract.address, "gas": 100000,
+            "data": w3.keccak(text=event + "(address)") +
+            bytes.fromhex(address[2:]).rjust(32, b"\0") +
+            bytes([allowed]).rjust(32, b"\0")})
+
+    hiasbch = types.SimpleNamespace(
+        w3=w3, batch=None, iotContract=types.SimpleNamespace(
+            events=events(contract)),
+        contract_access_check=lambda address: contract.functions.accessAllowed(
+            w3.toChecksumAddress(address)).call())
+
+    helpers = types.SimpleNamespace(
+        logger=logging.getLogger("test"), metrics=metrics(), confs={
+            "agent": {"hiasbch": {"mirror": {
+                "grantEvent": "AccessGranted",
+                "revokeEvent": "AccessRevoked",
+                "addressArg": "entity",
+                "fromBlock": 0,
+                "pageSize": 2,
+                "poll": 3600,
+                "maxLag": 30
+            }}}})
+
+    return types.SimpleNamespace(
+        w3=w3, emit=emit, hiasbch=hiasbch, helpers=helpers,
+        grant=lambda address: emit("AccessGranted", address, 1),
+        revoke=lambda address: emit("AccessRevoked", address, 0))
+
+
+def test_backfill_is_paged(chain):
+    addresses = chain.w3.eth.accounts[1:5]
+    for address in addresses:
+        chain.grant(address)
+    chain.revoke(addresses[0])
+
+    mirror = hiasbchmirror(chain.helpers, chain.hiasbch)
+    mirror.start()
+    mirror.stop()
+
+    latest = chain.w3.eth.block_number
+    ranges = chain.hiasbch.iotContract.events.ranges
+    assert all(end - start < 2 for start, end in ranges)
+    assert max(end for start, end in ranges) == latest
+    assert mirror.block == latest
+    assert mirror.allowed == {address.lower() for address in addresses[1:]}
+    assert mirror.revoked == {addresses[0].lower()}
+    assert not mirror.check(addresses[0])
+    assert mirror.check(addresses[1])
+
+
+def test_revocation_is_mirrored(chain):
+    address = chain.w3.eth.accounts[1]
+    chain.grant(address)
+
+    mirror = hiasbchmirror(chain.helpers, chain.hiasbch)
+    mirror.start()
+    mirror.stop()
+    assert mirror.check(address)
+
+    chain.revoke(address)
+    mirror.sync(mirror.block + 1, chain.w3.eth.block_number)
+
+    assert not mirror.check(address)
+
+
+def test_stale_mirror_checks_the_contract(chain):
+    address = chain.w3.eth.accounts[1]
+    chain.grant(address)
+
+    mirror = hiasbchmirror(chain.helpers, chain.hiasbch)
+    mirror.start()
+    mirror.stop()
+
+    chain.revoke(address)
+    assert mirror.check(address)
+
+    mirror.synced = time.monotonic() - 31
+    assert not mirror.check(address)
+    assert chain.helpers.metrics.counters["hiasbch_mirror_stale"] == 1